@@ -1,30 +1,79 @@
-import sounddevice as sd
 import numpy as np
 import threading
 import time
+from .ringbuffer import RingBuffer
+from .stft import StftEngine
+from .snapshot import FeatureSnapshot
+from .discovery import DiscoveryProgress, rank_microphones
+
+try:
+    import sounddevice as sd
+except OSError as e:
+    # PortAudio missing (headless box / CI): file replay and mock mode still work
+    print(f"AudioSensor: sounddevice unavailable ({e})")
+    sd = None
 
 # Constants
 SAMPLE_RATE = 44100
-BLOCK_SIZE = 4096
+BLOCK_SIZE = 4096  # FFT window length
+HOP_SIZE = 1024    # New samples per analysis (~23 ms)
+# ~3 s of audio between the callback and the analysis worker
+RING_CAPACITY = BLOCK_SIZE * 32
 
 class AudioSensor:
-    def __init__(self):
+    def __init__(self, n_fft=BLOCK_SIZE, hop=HOP_SIZE, window="hann", sample_rate=SAMPLE_RATE, source=None, device_cache=None, device=None):
         self.stream = None
+        # Explicit input device (index or name); skips auto-selection
+        self.device = device
+        # discovery.DeviceCache remembering the last working microphone (optional)
+        self.device_cache = device_cache
+        self.discovery = DiscoveryProgress()
+        self.sample_rate = sample_rate
+        # Optional file-backed or synthetic source (replay.WavSource,
+        # synthetic.SyntheticAudioSource) used instead of a device
+        self.source = source
         self.running = False
         self.latest_features = {
             "rms": 0.0,
             "db": 0.0,
             "low_energy": 0.0,
             "mid_energy": 0.0,
-            "high_energy": 0.0
+            "high_energy": 0.0,
+            "spectral_centroid": 0.0,
+            "spectral_rolloff": 0.0,
+            "spectral_flux": 0.0,
+            "zcr": 0.0
         }
         self.lock = threading.Lock()
+        # Immutable, sequence-numbered view of latest_features (see snapshot.py)
+        self.snapshot = FeatureSnapshot(0, time.time(), self.latest_features)
+        # Called (on the analysis thread) after every feature update
+        self.listeners = []
+
+        # Window, band plan and output buffers are built once here
+        if source is not None:
+            self.sample_rate = source.sample_rate
+        self.engine = StftEngine(self.sample_rate, n_fft=n_fft, hop=hop, window=window)
+
+        # Callback -> worker hand-off. Everything is preallocated so the
+        # realtime thread only copies samples.
+        self.ring = RingBuffer(RING_CAPACITY)
+        self._block = np.zeros(hop, dtype=np.float32)
+        self.input_overflows = 0
+        self.blocks_analyzed = 0
+        self.blocks_per_second = 0.0
+        self._rate_window_start = time.time()
+        self._rate_window_blocks = 0
+        self._last_status = None
+        # Analyze every Nth hop (set by the governor; 1 = every hop)
+        self.analysis_stride = 1
+        self._hops_read = 0
 
     def start(self):
         if self.running:
             return
         self.running = True
-        self.thread = threading.Thread(target=self._process_loop)
+        self.thread = threading.Thread(target=self._process_loop, name="audio-analysis")
         self.thread.start()
 
     def stop(self):
@@ -33,130 +82,161 @@ class AudioSensor:
             self.thread.join()
 
     def _process_loop(self):
-        # Auto-select input device
+        if self.source is not None:
+            self._run_source_loop()
+            return
+        if sd is None:
+            self.discovery.finish(None)
+            self._run_mock_loop()
+            return
+
+        # Auto-select input device: one ranked pass, then open candidates in
+        # order until one succeeds
         try:
-            devices = sd.query_devices()
-            device_idx = None
-            
-            # 1. Prefer "Realtek" or "Microphone Array" (Built-in)
-            # Skip "Camo" or "DroidCam" as they might be silent virtual drivers
-            for i, dev in enumerate(devices):
-                if dev['max_input_channels'] > 0:
-                    name = dev['name']
-                    # Skip virtual cams for audio
-                    if "Camo" in name or "DroidCam" in name:
-                        continue
-                        
-                    if "Realtek" in name or "Array" in name or "Internal" in name:
-                        device_idx = i
-                        print(f"AudioSensor: Found preferred hardware mic: {name} (Index {i})")
-                        break
-            
-            # 1b. If no specific hardware mic found, try any "Microphone" but still skip virtuals if possible
-            if device_idx is None:
-                for i, dev in enumerate(devices):
-                    if dev['max_input_channels'] > 0:
-                        name = dev['name']
-                        if "Camo" in name or "DroidCam" in name:
-                            continue
-                        if "Microphone" in name or "Mic" in name:
-                            device_idx = i
-                            print(f"AudioSensor: Found generic mic: {name} (Index {i})")
-                            break
-            
-            # 2. Fallback to any input
-            if device_idx is None:
-                for i, dev in enumerate(devices):
-                    if dev['max_input_channels'] > 0:
-                        device_idx = i
-                        print(f"AudioSensor: Fallback to input: {dev['name']} (Index {i})")
-                        break
-            
-            if device_idx is None:
-                device_idx = sd.default.device[0]
-                print(f"AudioSensor: Using default device index {device_idx}")
+            cached = self.device_cache.get("microphone") if self.device_cache else None
+            if self.device is not None:
+                candidates = [(self.device, str(self.device))]
+            else:
+                candidates = rank_microphones(sd.query_devices(), cached)
+            if not candidates:
+                default = sd.default.device[0]
+                print(f"AudioSensor: Using default device index {default}")
+                candidates = [(default, f"default ({default})")]
+        except Exception as e:
+            print(f"AudioSensor Init Error: {e}. Switching to Mock Mode.")
+            self.discovery.finish(None)
+            self._run_mock_loop()
+            return
 
+        self.discovery.begin([name for _, name in candidates])
+        stream = None
+        for device_idx, name in candidates:
+            if not self.running:
+                break
+            self.discovery.update(name, "trying")
             try:
-                with sd.InputStream(device=device_idx, channels=1, samplerate=SAMPLE_RATE, blocksize=BLOCK_SIZE, callback=self._audio_callback):
-                    while self.running:
-                        sd.sleep(100)
+                stream = sd.InputStream(device=device_idx, channels=1, samplerate=self.sample_rate,
+                                        blocksize=self.engine.hop, callback=self._audio_callback)
             except Exception as e:
-                print(f"AudioSensor: Stream failed ({e}). Switching to Mock Mode.")
-                self._run_mock_loop()
-                
+                print(f"AudioSensor: {name} (Index {device_idx}) failed ({e})")
+                self.discovery.update(name, f"failed: {e}")
+                stream = None
+                continue
+            self.discovery.update(name, "ok")
+            self.discovery.finish(name)
+            print(f"AudioSensor: Using {name} (Index {device_idx})")
+            if self.device_cache:
+                self.device_cache.set("microphone", name)
+            break
+
+        if stream is None:
+            self.discovery.finish(None)
+            print("AudioSensor: No input stream could be opened. Switching to Mock Mode.")
+            self._run_mock_loop()
+            return
+
+        try:
+            with stream:
+                self._analysis_loop()
         except Exception as e:
-            print(f"AudioSensor Init Error: {e}. Switching to Mock Mode.")
+            print(f"AudioSensor: Stream failed ({e}). Switching to Mock Mode.")
             self._run_mock_loop()
 
-    def _run_mock_loop(self):
-        print("AudioSensor: Running MOCK DATA loop for demo.")
-        while self.running:
-            # Simulate "Quiet Room" with occasional speech
-            t = time.time()
-            
-            # Base ambient noise (Low)
-            rms = 0.001 + 0.0005 * np.random.rand()
-            
-            # Occasional speech spike (every 5-10 seconds)
-            if int(t) % 8 == 0:
-                rms += 0.05 + 0.02 * np.random.rand()  # Speaking volume
-            
-            db = 20 * np.log10(rms) if rms > 0 else -60
-            db = max(-60, db + 60) # Normalize roughly to 0-60+ range for display
-            
-            # Frequencies
-            low = rms * 0.5
-            mid = rms * 0.3
-            high = rms * 0.1
-            
-            with self.lock:
-                self.latest_features = {
-                    "rms": float(rms),
-                    "db": float(db),
-                    "low_energy": float(low),
-                    "mid_energy": float(mid),
-                    "high_energy": float(high)
-                }
-            time.sleep(0.1)
+    def _run_source_loop(self):
+        # Recorded audio goes straight to analysis; the source does any pacing
+        print(f"AudioSensor: Replaying {self.source.path}")
+        for _, block in self.source.blocks(self.engine.hop):
+            if not self.running:
+                break
+            self._compute_features(block)
+            self.blocks_analyzed += 1
+            self._update_rates()
+        print("AudioSensor: Replay finished")
 
+    def _run_mock_loop(self):
+        # No microphone: a seeded synthetic scenario (see synthetic.py) at the
+        # live rate, through the same stride / STFT path as captured audio
+        from .synthetic import SyntheticAudioSource
+        source = SyntheticAudioSource(sample_rate=self.sample_rate)
+        print(f"AudioSensor: Running MOCK DATA loop ({source.path}).")
+        for _, block in source.blocks(self.engine.hop):
+            if not self.running:
+                break
+            self._consume(block)
 
     def _audio_callback(self, indata, frames, time_info, status):
         # indata is numpy array (frames, channels)
+        # Runs on the PortAudio thread: no printing, no analysis, just copy
         if status:
-            print(f"Audio status: {status}")
-        self._compute_features(indata[:, 0])
+            self.input_overflows += 1
+            self._last_status = status
+        self.ring.write(indata[:, 0])
+
+    def _analysis_loop(self):
+        # Consume the ring at our own pace; capture never waits on us
+        reported_status = None
+        idle_sleep = self.engine.hop / self.sample_rate / 4
+        while self.running:
+            if self._last_status is not reported_status:
+                reported_status = self._last_status
+                print(f"Audio status: {reported_status}")
+
+            if self.ring.read(self._block):
+                self._consume(self._block)
+            else:
+                time.sleep(idle_sleep)
+
+    def _consume(self, block):
+        self._hops_read += 1
+        if self._hops_read % self.analysis_stride:
+            # Governor is skipping this hop: keep the STFT frame
+            # current but run no FFT
+            self.engine.push(block)
+        else:
+            self._compute_features(block)
+            self.blocks_analyzed += 1
+        self._update_rates()
+
+    def _update_rates(self):
+        # Analyzed blocks per second over ~1 s windows
+        now = time.time()
+        elapsed = now - self._rate_window_start
+        if elapsed >= 1.0:
+            self.blocks_per_second = (self.blocks_analyzed - self._rate_window_blocks) / elapsed
+            self._rate_window_start = now
+            self._rate_window_blocks = self.blocks_analyzed
 
     def _compute_features(self, data):
-        # Data is float32 normalized [-1, 1]
-        
-        # 1. RMS & dB
-        rms = np.sqrt(np.mean(data**2))
-        db = 20 * np.log10(rms) if rms > 1e-6 else -80
-        
-        # 2. FFT
-        fft_spectrum = np.abs(np.fft.rfft(data))
-        freqs = np.fft.rfftfreq(len(data), 1.0/SAMPLE_RATE)
-        
-        low_mask = freqs < 300
-        mid_mask = (freqs >= 300) & (freqs < 2000)
-        high_mask = freqs >= 2000
-        
-        low_energy = np.sum(fft_spectrum[low_mask])
-        mid_energy = np.sum(fft_spectrum[mid_mask])
-        high_energy = np.sum(fft_spectrum[high_mask])
-        
+        # Data is float32 normalized [-1, 1]. Each call advances the STFT by
+        # len(data) samples (normally one hop) and runs a single FFT.
+        features = self.engine.process(data)
+
+        self._set_features(features)
+
+    def _set_features(self, features):
+        # `features` must be a fresh dict: readers hold on to it without copying
         with self.lock:
-            self.latest_features = {
-                "rms": float(rms),
-                "db": float(db),
-                "low_energy": float(low_energy),
-                "mid_energy": float(mid_energy),
-                "high_energy": float(high_energy)
-            }
+            self.latest_features = features
+            self.snapshot = self.snapshot.next(features)
+        for listener in self.listeners:
+            listener()
+
+    def get_snapshot(self):
+        return self.snapshot
 
     def get_features(self):
-        with self.lock:
-            return self.latest_features.copy()
+        # Mutable copy for callers that want one; hot paths use get_snapshot()
+        return self.snapshot.features.copy()
+
+    def get_stats(self):
+        return {
+            "blocks_analyzed": self.blocks_analyzed,
+            "blocks_per_second": self.blocks_per_second,
+            "backlog_samples": self.ring.available(),
+            "overruns": self.ring.overruns,
+            "dropped_samples": self.ring.dropped_samples,
+            "input_overflows": self.input_overflows
+        }
 
 if __name__ == "__main__":
     sensor = AudioSensor()
@@ -0,0 +1,205 @@
+import asyncio
+import collections
+import time
+from . import metrics
+from .protocol import JsonEncoder
+
+SERIALIZE_TIME = metrics.stage("serialize")
+
+# Per-client queue depth. Clients that fall further behind lose their oldest
+# messages instead of stalling the producer or growing memory.
+DEFAULT_QUEUE_SIZE = 4
+
+
+class Subscriber:
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE, encoder=None, rate=None):
+        self.queue = collections.deque(maxlen=queue_size)
+        self.event = asyncio.Event()
+        self.dropped = 0
+        # Wire format (protocol.JsonEncoder / BinaryEncoder) and max updates/s
+        self.encoder = encoder or JsonEncoder()
+        self.min_interval = 1.0 / rate if rate else 0.0
+        self.next_due = 0.0
+
+    def push(self, message):
+        # deque(maxlen) discards from the left, i.e. the oldest message
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+            # Stateful encoders must not build on a frame the client never got
+            self.encoder.resync()
+        self.queue.append(message)
+        self.event.set()
+
+    def send(self, payload, shared):
+        # Encode one tick and queue it. If that overflows a stateful encoder's
+        # queue, every queued frame goes (the deltas behind the oldest one
+        # were built on it) and the encoder restarts from a keyframe.
+        messages = self.encoder.encode(payload, shared)
+        if self.encoder.stateful and len(self.queue) + len(messages) > self.queue.maxlen:
+            self.dropped += len(self.queue)
+            self.queue.clear()
+            self.encoder.resync()
+            messages = self.encoder.encode(payload, shared)
+        for message in messages:
+            self.push(message)
+
+    async def get(self):
+        while not self.queue:
+            self.event.clear()
+            await self.event.wait()
+        return self.queue.popleft()
+
+
+class BroadcastHub:
+    # Pushes on change instead of on a fixed timer. Sensor threads call
+    # notify() after every feature update; the hub wakes, rebuilds the payload
+    # and publishes it if significant(previous, current) says so. Publishes
+    # are spaced at least 1/max_rate apart, and a heartbeat goes out every
+    # `heartbeat` seconds while nothing significant happens.
+    def __init__(self, produce, max_rate=10.0, heartbeat=2.0, significant=None,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        # produce() returns the payload dict for one tick
+        self.produce = produce
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.heartbeat = heartbeat
+        self.significant = significant
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.task = None
+        self.tick = 0
+
+        # Bumped by notify() on any thread; _run compares against what it
+        # last looked at
+        self.version = 0
+        self.loop = None
+        self.wakeup = None
+        self._wake_pending = False
+        self._force = False
+        self.last_payload = None
+        self.last_publish = 0.0
+        self.change_pushes = 0
+        self.heartbeat_pushes = 0
+        # Long-polling requests (see wait_notify), woken with the hub
+        self.waiters = set()
+
+    def subscribe(self, encoder=None, rate=None):
+        sub = Subscriber(self.queue_size, encoder, rate)
+        self.subscribers.add(sub)
+        # New clients get the current state now, not at the next heartbeat
+        self._force = True
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return sub
+
+    def unsubscribe(self, sub):
+        self.subscribers.discard(sub)
+
+    def notify(self):
+        # Thread-safe. Wakeups are coalesced: at most one is queued on the
+        # loop no matter how fast sensors fire.
+        self.version += 1
+        if self.loop is None or self._wake_pending:
+            return
+        self._wake_pending = True
+        try:
+            self.loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            # Loop already closed during shutdown
+            pass
+
+    def _wake(self):
+        self._wake_pending = False
+        self.wakeup.set()
+        for waiter in self.waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def wait_notify(self, timeout):
+        # Returns after the next notify() or `timeout` seconds, whichever
+        # comes first
+        if self.loop is None:
+            await asyncio.sleep(timeout)
+            return
+        waiter = self.loop.create_future()
+        self.waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.waiters.discard(waiter)
+
+    def start(self):
+        if self.task is None:
+            self.loop = asyncio.get_running_loop()
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self.loop = None
+
+    def publish(self, payload):
+        # Each distinct encoding is serialized once per tick and the same
+        # message object is fanned out to every client that shares it
+        now = time.monotonic()
+        self.tick += 1
+        shared = {"tick": self.tick}
+        with SERIALIZE_TIME.time():
+            for sub in list(self.subscribers):
+                if sub.min_interval:
+                    if now < sub.next_due:
+                        continue
+                    sub.next_due = now + sub.min_interval
+                sub.send(payload, shared)
+        return shared
+
+    async def _run(self):
+        seen = self.version
+        while True:
+            # Sleep until a sensor update, a new subscriber or the heartbeat
+            if self.version == seen and not self._force:
+                timeout = max(0.0, self.last_publish + self.heartbeat - time.monotonic())
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            self.wakeup.clear()
+
+            # Max rate: updates arriving inside the window are folded into
+            # the next publish
+            delay = self.last_publish + self.min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            changed = self.version != seen
+            seen = self.version
+            # Nobody listening -> skip sensor reads and classification entirely
+            if not self.subscribers:
+                continue
+
+            now = time.monotonic()
+            heartbeat = now >= self.last_publish + self.heartbeat
+            if not (changed or heartbeat or self._force):
+                continue
+            try:
+                payload = self.produce()
+                significant = (self._force or self.last_payload is None or self.significant is None
+                               or self.significant(self.last_payload, payload))
+                if significant or heartbeat:
+                    self.publish(payload)
+                    self.last_payload = payload
+                    self.last_publish = now
+                    if significant:
+                        self.change_pushes += 1
+                    else:
+                        self.heartbeat_pushes += 1
+            except Exception as e:
+                print(f"BroadcastHub: Producer error: {e}")
+            self._force = False
@@ -0,0 +1,234 @@
+import os
+import threading
+import time
+import urllib.request
+import cv2
+import numpy as np
+
+# How cameras are opened (see open_capture):
+#   reduced  ask devices for MJPG at the analysis size and decode HTTP MJPEG
+#            streams ourselves, straight to grayscale at 1/2, 1/4 or 1/8 scale
+#   full     plain cv2.VideoCapture at whatever the source delivers
+CAPTURE_MODE = os.environ.get("SENSORYNET_CAPTURE", "reduced")
+# Resolution VideoSensor analyzes at; no point decoding more than this
+CAPTURE_WIDTH = 320
+CAPTURE_HEIGHT = 240
+
+# HTTP MJPEG (DroidCam, IP Webcam, most network cameras)
+MJPEG_TIMEOUT = 5.0
+MJPEG_READ = 65536
+# Give up on a stream that sends this much without a complete JPEG
+MJPEG_MAX_FRAME = 8 << 20
+
+# Start-of-frame markers (baseline, progressive, ...), which carry the size
+JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_SOS = 0xDA
+REDUCED_GRAYSCALE = ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                     (2, cv2.IMREAD_REDUCED_GRAYSCALE_2))
+
+
+def scan_jpeg(buf, start, search_from=0):
+    # buf[start:] begins with SOI. Returns (end, width, height): end is just
+    # past the EOI, or -1 if the JPEG is not complete yet. Header segments
+    # are skipped by length, so an EXIF thumbnail's EOI is never mistaken
+    # for ours; after SOS, 0xFF in the data is always stuffed, so the next
+    # FFD9 is the real end. search_from skips data already searched.
+    pos = start + 2
+    width = height = 0
+    n = len(buf)
+    while pos + 4 <= n:
+        if buf[pos] != 0xFF:
+            # Not a marker where one must be: corrupt frame, skip its SOI
+            return start + 2, 0, 0
+        marker = buf[pos + 1]
+        if marker == 0xFF:
+            # Fill byte
+            pos += 1
+            continue
+        length = (buf[pos + 2] << 8) | buf[pos + 3]
+        if marker in JPEG_SOF and pos + 9 <= n:
+            height = (buf[pos + 5] << 8) | buf[pos + 6]
+            width = (buf[pos + 7] << 8) | buf[pos + 8]
+        if marker == JPEG_SOS:
+            end = buf.find(b"\xff\xd9", max(pos + 2 + length, search_from))
+            return (end + 2 if end >= 0 else -1), width, height
+        pos += 2 + length
+    return -1, width, height
+
+
+def reduced_flag(width, height):
+    # Largest libjpeg DCT scaling that still covers the analysis resolution
+    for factor, flag in REDUCED_GRAYSCALE:
+        if width // factor >= CAPTURE_WIDTH and height // factor >= CAPTURE_HEIGHT:
+            return flag, factor
+    return cv2.IMREAD_GRAYSCALE, 1
+
+
+class MjpegStream:
+    # cv2.VideoCapture stand-in for multipart HTTP MJPEG. grab() reads until
+    # the next complete JPEG and keeps its bytes; retrieve() decodes them
+    # grayscale at reduced scale, so FrameGrabber still never decodes frames
+    # nobody analyzes, and the ones we do analyze skip most of the IDCT and
+    # all of the color conversion.
+    def __init__(self, url, timeout=MJPEG_TIMEOUT):
+        self.url = url
+        self.response = None
+        self.buffer = bytearray()
+        self.jpeg = None
+        self.flag = None
+        self.factor = 1
+        self.frame_size = None
+        try:
+            response = urllib.request.urlopen(url, timeout=timeout)
+        except (OSError, ValueError) as e:
+            print(f"MjpegStream: {url} failed ({e})")
+            return
+        content_type = response.headers.get("Content-Type", "")
+        if "multipart" not in content_type and "jpeg" not in content_type:
+            print(f"MjpegStream: {url} is not MJPEG ({content_type or 'no content type'})")
+            response.close()
+            return
+        self.response = response
+
+    def isOpened(self):
+        return self.response is not None
+
+    def grab(self):
+        if self.response is None:
+            return False
+        buf = self.buffer
+        # Where the EOI search got to in the frame at the front of buf, so a
+        # large frame arriving in many reads is scanned once, not per read
+        searched = 0
+        while True:
+            start = buf.find(b"\xff\xd8")
+            if start >= 0:
+                end, width, height = scan_jpeg(buf, start, start + searched)
+                if end >= 0 and width:
+                    self.jpeg = bytes(buf[start:end])
+                    del buf[:end]
+                    if self.frame_size != (width, height):
+                        self.frame_size = (width, height)
+                        self.flag, self.factor = reduced_flag(width, height)
+                    return True
+                if end >= 0:
+                    # Corrupt frame: drop it and look again
+                    del buf[:end]
+                    searched = 0
+                    continue
+                # Keep only the frame in progress (multipart headers are dropped)
+                del buf[:start]
+                searched = max(0, len(buf) - 1)
+            else:
+                # A lone 0xFF may be the first half of the next SOI
+                del buf[:max(0, len(buf) - 1)]
+            if len(buf) > MJPEG_MAX_FRAME:
+                del buf[:]
+                searched = 0
+            try:
+                chunk = self.response.read1(MJPEG_READ)
+            except OSError:
+                chunk = b""
+            if not chunk:
+                return False
+            buf += chunk
+
+    def retrieve(self):
+        if self.jpeg is None:
+            return False, None
+        frame = cv2.imdecode(np.frombuffer(self.jpeg, dtype=np.uint8), self.flag)
+        return frame is not None, frame
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def get(self, prop):
+        if self.frame_size and prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.frame_size[0])
+        if self.frame_size and prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.frame_size[1])
+        return 0.0
+
+    def release(self):
+        if self.response is not None:
+            self.response.close()
+            self.response = None
+
+
+def request_low_resolution(cap):
+    # Ask a local camera for MJPG at the analysis size. Drivers pick their
+    # nearest supported mode or ignore the request; either way we get less
+    # than the default full-HD YUYV to convert.
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAPTURE_WIDTH)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAPTURE_HEIGHT)
+
+
+def open_capture(source, mode=None):
+    # cv2.VideoCapture-like object for a camera index or URL
+    mode = mode or CAPTURE_MODE
+    if mode == "reduced" and isinstance(source, str) and source.startswith(("http://", "https://")):
+        stream = MjpegStream(source)
+        if stream.isOpened():
+            return stream
+        # Not MJPEG (or unreachable): let OpenCV / FFmpeg try
+    cap = cv2.VideoCapture(source)
+    if mode == "reduced" and isinstance(source, int) and cap.isOpened():
+        request_low_resolution(cap)
+    return cap
+
+
+class FrameGrabber:
+    # Drains a cv2.VideoCapture on its own thread.
+    #
+    # grab() only pulls the next frame off the device/decoder queue without
+    # converting it, so the source never backs up. The analysis side calls
+    # retrieve() to decode whichever frame was grabbed most recently; every
+    # grabbed frame it never retrieves is counted as dropped.
+    def __init__(self, cap):
+        self.cap = cap
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.seq = 0
+        self.grab_time = 0.0
+        self.failures = 0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._grab_loop, name="frame-grabber", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def _grab_loop(self):
+        while self.running:
+            with self.lock:
+                ok = self.cap.grab()
+                if ok:
+                    self.seq += 1
+                    self.grab_time = time.time()
+            if not ok:
+                self.failures += 1
+                time.sleep(0.05)
+
+    def retrieve(self, last_seq):
+        # Returns (frame, seq, grab_time), or None if nothing newer than
+        # last_seq has been grabbed yet
+        with self.lock:
+            seq = self.seq
+            if seq == last_seq:
+                return None
+            ok, frame = self.cap.retrieve()
+            grab_time = self.grab_time
+        if not ok:
+            return None
+        return frame, seq, grab_time
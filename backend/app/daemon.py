@@ -0,0 +1,25 @@
+import argparse
+import os
+import uvicorn
+
+# Sensor / inference daemon for multi-worker deployments. It owns the camera
+# and microphone and publishes every room's state to shared memory
+# (shared_state.py); the public API then runs as stateless readers:
+#
+#   python -m app.daemon
+#   SENSORYNET_ROLE=api python -m uvicorn app.main:app --port 8000 --workers 4
+#
+# The daemon itself still serves the full API on its own port, which is
+# where /history, /sensors/... and the sensor metrics live.
+
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 8001
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SensoryNet sensor daemon")
+    parser.add_argument("--host", default=DAEMON_HOST)
+    parser.add_argument("--port", type=int, default=DAEMON_PORT)
+    args = parser.parse_args()
+
+    os.environ["SENSORYNET_ROLE"] = "daemon"
+    uvicorn.run("app.main:app", host=args.host, port=args.port)
@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .capture import open_capture
+
+# Last known-good devices, tried first on the next boot (next to model.json)
+DEVICE_CACHE_PATH = "devices.json"
+
+# Audio inputs that enumerate fine but are usually silent virtual drivers
+VIRTUAL_MICS = ("Camo", "DroidCam")
+PREFERRED_MICS = ("Realtek", "Array", "Internal")
+GENERIC_MICS = ("Microphone", "Mic")
+
+
+class DeviceCache:
+    def __init__(self, path=DEVICE_CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"DeviceCache: Ignoring unreadable {path} ({e})")
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value):
+        with self.lock:
+            if self.data.get(key) == value:
+                return
+            self.data[key] = value
+            try:
+                with open(self.path, "w") as f:
+                    json.dump(self.data, f)
+            except OSError as e:
+                print(f"DeviceCache: Could not write {self.path} ({e})")
+
+
+class DiscoveryProgress:
+    # Shared by the probing thread and API handlers; snapshot() is what
+    # /discovery returns
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = "idle"  # idle -> probing -> ready | failed
+        self.candidates = {}
+        self.selected = None
+        self.started = None
+        self.finished = None
+
+    def begin(self, candidates):
+        with self.lock:
+            self.state = "probing"
+            self.candidates = {str(c): "pending" for c in candidates}
+            self.selected = None
+            self.started = time.time()
+            self.finished = None
+
+    def update(self, candidate, status):
+        with self.lock:
+            self.candidates[str(candidate)] = status
+
+    def finish(self, selected):
+        with self.lock:
+            self.state = "ready" if selected is not None else "failed"
+            self.selected = selected
+            self.finished = time.time()
+
+    def snapshot(self):
+        with self.lock:
+            end = self.finished or time.time()
+            return {
+                "state": self.state,
+                "selected": self.selected,
+                "candidates": dict(self.candidates),
+                "elapsed": round(end - self.started, 3) if self.started else 0.0,
+            }
+
+
+def _probe_camera(source):
+    cap = open_capture(source)
+    if not cap.isOpened():
+        return None, "failed to open"
+    ret, _ = cap.read()
+    if not ret:
+        cap.release()
+        return None, "opened but no frame"
+    return cap, "ok"
+
+
+def discover_camera(candidates, progress, cache=None):
+    # Opens every candidate at once and returns (source, cap) for the
+    # highest-priority one that delivers a frame, or (None, None).
+    # A slow failing index no longer delays the ones after it, and we stop
+    # waiting as soon as everything ranked above a working camera has failed.
+    order = []
+    cached = cache.get("camera") if cache else None
+    for c in [cached] + list(candidates):
+        if c is not None and c not in order:
+            order.append(c)
+
+    progress.begin(order)
+    print(f"Discovery: Probing cameras {order} in parallel")
+    results = {}
+    chosen = None
+    pool = ThreadPoolExecutor(max_workers=len(order), thread_name_prefix="camera-probe")
+    futures = {pool.submit(_probe_camera, c): c for c in order}
+    for c in order:
+        progress.update(c, "trying")
+
+    for future in as_completed(futures):
+        source = futures[future]
+        try:
+            cap, status = future.result()
+        except Exception as e:
+            cap, status = None, f"error: {e}"
+        results[source] = cap
+        progress.update(source, status)
+
+        # Best remaining answer is decided once every higher-priority probe is done
+        for c in order:
+            if c not in results:
+                break
+            if results[c] is not None:
+                chosen = c
+                break
+        if chosen is not None:
+            break
+
+    # Late probes finish in the background; release any extra camera they open
+    def release_late(fut, source):
+        if fut.exception() is not None:
+            progress.update(source, "error")
+            return
+        cap, status = fut.result()
+        progress.update(source, status + " (late)")
+        if cap is not None:
+            cap.release()
+
+    for future, source in futures.items():
+        if source not in results:
+            future.add_done_callback(lambda fut, s=source: release_late(fut, s))
+        elif results[source] is not None and source != chosen:
+            results[source].release()
+    pool.shutdown(wait=False)
+
+    progress.finish(chosen)
+    if chosen is None:
+        print("Discovery: No working camera found")
+        return None, None
+    print(f"Discovery: Camera source {chosen} ready")
+    if cache:
+        cache.set("camera", chosen)
+    return chosen, results[chosen]
+
+
+def rank_microphones(devices, cached_name=None):
+    # One pass over sd.query_devices(): cached mic, then built-in hardware,
+    # then anything called a microphone, then any other input. Virtual
+    # drivers only ever rank last.
+    ranked = []
+    for i, dev in enumerate(devices):
+        if dev["max_input_channels"] <= 0:
+            continue
+        name = dev["name"]
+        if any(v in name for v in VIRTUAL_MICS):
+            rank = 4
+        elif cached_name and name == cached_name:
+            rank = 0
+        elif any(p in name for p in PREFERRED_MICS):
+            rank = 1
+        elif any(g in name for g in GENERIC_MICS):
+            rank = 2
+        else:
+            rank = 3
+        ranked.append((rank, i, name))
+    ranked.sort()
+    return [(i, name) for _, i, name in ranked]
@@ -0,0 +1,450 @@
+import datetime
+import json
+import os
+import threading
+import time
+import numpy as np
+from .history import HISTORY_FIELDS
+
+# Optional on-disk feature log: weeks of features and states for occupancy /
+# capacity reports. Only the feature rows the sensors already compute are
+# stored, never audio or video.
+#
+#   <root>/<room>/<YYYY-MM-DD>/      one directory per UTC day
+#     meta.json                      fields and state names (codes index it)
+#     t.f64  <field>.f32  state.i16  raw columns, append-only, memory-mapped
+#     rollup_1s.npy                  one record per second of the day
+#     rollup_1m.npy  rollup_1h.npy   ... per minute / hour, with histograms
+#
+# Raw columns grow GROW_ROWS at a time; the row count is wherever `t` turns
+# to 0, so there is no separate counter to lose in a crash. Rollup files
+# have one fixed slot per bucket and are updated as each row arrives, so
+# range queries read at most 24 records per field per day at 1 h resolution.
+
+LOG_RATE = 10.0 # Rows/s recorded per room (~55 MB/day raw at 13 fields)
+GROW_ROWS = 1 << 16
+ROLLUPS = {"1s": 1, "1m": 60, "1h": 3600}
+# Percentiles come from fixed-bin histograms, kept for the coarser rollups
+HISTOGRAM_ROLLUPS = ("1m", "1h")
+HIST_BINS = 128
+# State codes counted per bucket; later states are logged but not rolled up
+MAX_STATES = 16
+
+# Histogram range per field: (low, high, log scale). Values outside are
+# clamped into the end bins; min/max stay exact.
+HIST_RANGES = {
+    "rms": (0.0, 1.0, False),
+    "db": (-80.0, 100.0, False),
+    "low_energy": (1e-3, 1e6, True),
+    "mid_energy": (1e-3, 1e6, True),
+    "high_energy": (1e-3, 1e6, True),
+    "spectral_centroid": (0.0, 22050.0, False),
+    "spectral_rolloff": (0.0, 22050.0, False),
+    "spectral_flux": (1e-3, 1e6, True),
+    "zcr": (0.0, 1.0, False),
+    "brightness": (0.0, 255.0, False),
+    "motion_magnitude": (1e-3, 1e3, True),
+    "motion_hotspots": (1.0, 1e5, True),
+    "confidence": (0.0, 1.0, False),
+}
+DEFAULT_HIST_RANGE = (1e-3, 1e6, True)
+
+
+def _day_start(timestamp):
+    day = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).date()
+    return day, datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def rollup_dtype(n_fields, histogram):
+    fields = [
+        ("count", np.uint32),
+        ("sum", np.float64, (n_fields,)),
+        ("sumsq", np.float64, (n_fields,)),
+        ("min", np.float32, (n_fields,)),
+        ("max", np.float32, (n_fields,)),
+        ("states", np.uint32, (MAX_STATES,)),
+    ]
+    if histogram:
+        fields.append(("hist", np.uint32, (n_fields, HIST_BINS)))
+    return np.dtype(fields)
+
+
+class Histogram:
+    # Maps values to HIST_BINS bins per field (vectorized over fields) and
+    # back to approximate values for percentiles
+    def __init__(self, fields):
+        ranges = np.array([HIST_RANGES.get(f, DEFAULT_HIST_RANGE) for f in fields], dtype=np.float64)
+        self.log = ranges[:, 2].astype(bool)
+        self.lo = np.where(self.log, np.log10(np.where(self.log, ranges[:, 0], 1.0)), ranges[:, 0])
+        self.hi = np.where(self.log, np.log10(np.where(self.log, ranges[:, 1], 1.0)), ranges[:, 1])
+        self.width = (self.hi - self.lo) / HIST_BINS
+
+    def bins(self, row):
+        values = np.asarray(row, dtype=np.float64)
+        scaled = np.where(self.log, np.log10(np.maximum(values, 1e-30)), values)
+        return np.clip(((scaled - self.lo) / self.width).astype(np.int64), 0, HIST_BINS - 1)
+
+    def percentile(self, hist, q, i):
+        # q in [0, 1] for field i, interpolating linearly inside the bin
+        total = hist.sum()
+        if not total:
+            return None
+        cumulative = np.cumsum(hist)
+        b = int(np.searchsorted(cumulative, q * total, side="left"))
+        b = min(b, HIST_BINS - 1)
+        before = cumulative[b - 1] if b else 0
+        within = (q * total - before) / hist[b] if hist[b] else 0.0
+        value = self.lo[i] + (b + within) * self.width[i]
+        return float(10 ** value if self.log[i] else value)
+
+
+class DayLog:
+    # Raw columns + rollups for one room-day. Writable by the recorder,
+    # read-only everywhere else.
+    def __init__(self, path, day_start, fields=None, states=None, writable=False):
+        self.path = path
+        self.day_start = day_start
+        self.writable = writable
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self.fields = meta["fields"]
+            self.states = meta["states"]
+        else:
+            if not writable:
+                raise FileNotFoundError(meta_path)
+            os.makedirs(path, exist_ok=True)
+            self.fields = list(fields or HISTORY_FIELDS)
+            self.states = list(states or [])
+            self._write_meta()
+        self.histogram = Histogram(self.fields)
+
+        # np.memmap objects are kept for flush(); all indexing goes through
+        # plain ndarray views of the same pages (memmap's per-item Python
+        # overhead is most of an append otherwise)
+        self.maps = []
+        self.rollups = {}
+        for name, seconds in ROLLUPS.items():
+            file = os.path.join(path, f"rollup_{name}.npy")
+            if writable and not os.path.exists(file):
+                dtype = rollup_dtype(len(self.fields), name in HISTOGRAM_ROLLUPS)
+                # Sparse on disk until buckets are touched
+                mapped = np.lib.format.open_memmap(file, mode="w+", dtype=dtype, shape=(86400 // seconds,))
+            else:
+                mapped = np.load(file, mmap_mode="r+" if writable else "r")
+            self.maps.append(mapped)
+            self.rollups[name] = mapped.view(np.ndarray)
+
+        self.columns = {}
+        self.column_maps = []
+        self.capacity = 0
+        self.count = 0
+        if writable:
+            self._map_columns(max(GROW_ROWS, self._file_rows()))
+            t = self.columns["t"]
+            self.count = int(np.searchsorted(t == 0, True))
+
+    def _write_meta(self):
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"fields": self.fields, "states": self.states}, f)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+
+    def _column_files(self):
+        files = [("t", "t.f64", np.float64), ("state", "state.i16", np.int16)]
+        return files + [(f, f"{f}.f32", np.float32) for f in self.fields]
+
+    def _file_rows(self):
+        file = os.path.join(self.path, "t.f64")
+        return os.path.getsize(file) // 8 if os.path.exists(file) else 0
+
+    def _map_columns(self, rows):
+        for mapped in self.column_maps:
+            mapped.flush()
+        self.columns = {}
+        self.column_maps = []
+        for name, file, dtype in self._column_files():
+            file = os.path.join(self.path, file)
+            with open(file, "ab") as f:
+                f.truncate(rows * np.dtype(dtype).itemsize)
+            mapped = np.memmap(file, dtype=dtype, mode="r+", shape=(rows,))
+            self.column_maps.append(mapped)
+            self.columns[name] = mapped.view(np.ndarray)
+        self.capacity = rows
+
+    def raw(self, fields=None):
+        # Read-only view of the logged rows: (t, {field: values}, state codes)
+        count = self.count if self.writable else int(np.searchsorted(
+            np.memmap(os.path.join(self.path, "t.f64"), dtype=np.float64, mode="r") == 0, True))
+        columns = {}
+        for name, file, dtype in self._column_files():
+            if name in ("t", "state") or fields is None or name in fields:
+                columns[name] = self.columns[name][:count] if self.writable else \
+                    np.memmap(os.path.join(self.path, file), dtype=dtype, mode="r", shape=(count,))
+        t = columns.pop("t")
+        state = columns.pop("state")
+        return t, columns, state
+
+    def state_code(self, state):
+        if state not in self.states:
+            self.states.append(state)
+            self._write_meta()
+        return self.states.index(state)
+
+    def append(self, timestamp, row, state):
+        if self.count == self.capacity:
+            self._map_columns(self.capacity + GROW_ROWS)
+        code = self.state_code(state)
+        i = self.count
+        for f, value in zip(self.fields, row):
+            self.columns[f][i] = value
+        self.columns["state"][i] = code
+        # Written last: a row exists once its timestamp does
+        self.columns["t"][i] = timestamp
+        self.count += 1
+
+        row = np.asarray(row, dtype=np.float32)
+        wide = row.astype(np.float64)
+        bins = None
+        offset = timestamp - self.day_start
+        for name, seconds in ROLLUPS.items():
+            rollup = self.rollups[name]
+            b = min(int(offset // seconds), len(rollup) - 1)
+            record = rollup[b:b + 1]
+            if record["count"][0] == 0:
+                record["min"][0] = row
+                record["max"][0] = row
+            else:
+                np.minimum(record["min"][0], row, out=record["min"][0])
+                np.maximum(record["max"][0], row, out=record["max"][0])
+            record["count"] += 1
+            record["sum"][0] += wide
+            record["sumsq"][0] += wide * wide
+            if code < MAX_STATES:
+                record["states"][0, code] += 1
+            if name in HISTOGRAM_ROLLUPS:
+                if bins is None:
+                    bins = self.histogram.bins(row)
+                record["hist"][0, np.arange(len(row)), bins] += 1
+
+    def flush(self):
+        for mapped in self.column_maps + self.maps:
+            mapped.flush()
+
+
+class FeatureLog:
+    # One room's log across days; rotates to a new DayLog at UTC midnight
+    def __init__(self, root, fields=None, writable=True):
+        self.root = root
+        self.fields = list(fields or HISTORY_FIELDS)
+        self.writable = writable
+        self.current = None
+        self.lock = threading.Lock()
+        self.rows = 0
+        if writable:
+            os.makedirs(root, exist_ok=True)
+
+    def _day_path(self, day):
+        return os.path.join(self.root, day.isoformat())
+
+    def append(self, timestamp, audio_feats, video_feats, state, confidence):
+        row = []
+        for k in self.fields:
+            if k == "confidence":
+                row.append(confidence)
+            elif k in audio_feats:
+                row.append(audio_feats[k])
+            else:
+                row.append(video_feats.get(k, 0.0))
+
+        day, start = _day_start(timestamp)
+        with self.lock:
+            if self.current is None or self.current.day_start != start:
+                if self.current is not None:
+                    self.current.flush()
+                    print(f"FeatureLog: Rotating to {day.isoformat()}")
+                self.current = DayLog(self._day_path(day), start, self.fields, writable=True)
+            self.current.append(timestamp, row, state)
+            self.rows += 1
+
+    def flush(self):
+        with self.lock:
+            if self.current is not None:
+                self.current.flush()
+
+    def close(self):
+        self.flush()
+        self.current = None
+
+    def days(self, start, end):
+        # (day_start, DayLog) for every logged day overlapping [start, end)
+        if not os.path.isdir(self.root):
+            return
+        day, day_start = _day_start(start)
+        while day_start < end:
+            path = self._day_path(day)
+            if self.current is not None and self.current.path == path:
+                yield day_start, self.current
+            elif os.path.exists(os.path.join(path, "meta.json")):
+                yield day_start, DayLog(path, day_start)
+            day += datetime.timedelta(days=1)
+            day_start += 86400
+
+    def query(self, fields, start, end, step, stats=("mean",)):
+        # Aggregates per `step` seconds over [start, end) straight from the
+        # rollups: count, mean, std, min, max, pNN (histogram, >= 1 min
+        # resolution) and the share of time spent in each state
+        percentiles = [s for s in stats if s.startswith("p")]
+        resolution = None
+        for name, seconds in sorted(ROLLUPS.items(), key=lambda item: -item[1]):
+            if step % seconds == 0 and (not percentiles or name in HISTOGRAM_ROLLUPS):
+                resolution = name
+                break
+        if resolution is None:
+            raise ValueError(f"step must be a multiple of {'60' if percentiles else '1'} s")
+        for s in stats:
+            if s not in ("count", "mean", "std", "min", "max", "states") and not (
+                    s.startswith("p") and s[1:].replace(".", "", 1).isdigit() and 0 <= float(s[1:]) <= 100):
+                raise ValueError(f"Unknown stat '{s}'")
+        unknown = [f for f in fields if f not in self.fields]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+
+        seconds = ROLLUPS[resolution]
+        start = np.floor(start / step) * step
+        n_out = max(0, int(np.ceil((end - start) / step)))
+        n_fields = len(fields)
+        count = np.zeros(n_out, dtype=np.int64)
+        total = np.zeros((n_out, n_fields))
+        total_sq = np.zeros((n_out, n_fields))
+        low = np.full((n_out, n_fields), np.inf)
+        high = np.full((n_out, n_fields), -np.inf)
+        hist = np.zeros((n_out, n_fields, HIST_BINS), dtype=np.int64) if percentiles else None
+        states = {}
+        histogram = Histogram(fields)
+
+        with self.lock:
+            for day_start, day in self.days(start, end):
+                columns = [day.fields.index(f) if f in day.fields else None for f in fields]
+                rollup = day.rollups[resolution]
+                first = max(0, int((start - day_start) // seconds))
+                last = min(len(rollup), int(np.ceil((end - day_start) / seconds)))
+                if first >= last:
+                    continue
+                records = np.array(rollup[first:last])
+                used = np.nonzero(records["count"])[0]
+                if not len(used):
+                    continue
+                records = records[used]
+                out = ((day_start + (first + used) * seconds - start) // step).astype(np.int64)
+
+                np.add.at(count, out, records["count"])
+                for j, c in enumerate(columns):
+                    if c is None:
+                        continue
+                    np.add.at(total[:, j], out, records["sum"][:, c])
+                    np.add.at(total_sq[:, j], out, records["sumsq"][:, c])
+                    np.minimum.at(low[:, j], out, records["min"][:, c])
+                    np.maximum.at(high[:, j], out, records["max"][:, c])
+                    if hist is not None:
+                        np.add.at(hist[:, j], out, records["hist"][:, c])
+                if "states" in stats:
+                    for code, name in enumerate(day.states[:MAX_STATES]):
+                        series = states.setdefault(name, np.zeros(n_out, dtype=np.int64))
+                        np.add.at(series, out, records["states"][:, code])
+
+        present = count > 0
+        safe = np.maximum(count, 1)[:, None]
+        mean = total / safe
+        std = np.sqrt(np.maximum(total_sq / safe - mean * mean, 0.0))
+
+        def column(values):
+            return [float(v) if ok else None for v, ok in zip(values, present)]
+
+        series = {}
+        for j, f in enumerate(fields):
+            result = {}
+            for s in stats:
+                if s == "mean":
+                    result[s] = column(mean[:, j])
+                elif s == "std":
+                    result[s] = column(std[:, j])
+                elif s == "min":
+                    result[s] = column(low[:, j])
+                elif s == "max":
+                    result[s] = column(high[:, j])
+                elif s.startswith("p"):
+                    q = float(s[1:]) / 100
+                    values = []
+                    for i in range(n_out):
+                        value = histogram.percentile(hist[i, j], q, j) if present[i] else None
+                        # Bin interpolation can overshoot the exact extremes
+                        values.append(None if value is None else float(min(max(value, low[i, j]), high[i, j])))
+                    result[s] = values
+            series[f] = result
+
+        response = {
+            "resolution": resolution,
+            "step": step,
+            "t": (start + np.arange(n_out) * step).tolist(),
+            "count": count.tolist(),
+            "series": series,
+        }
+        if "states" in stats:
+            response["states"] = {name: (values / np.maximum(count, 1)).tolist() for name, values in states.items()}
+        return response
+
+
+class FeatureRecorder:
+    # Samples every room's fused reading LOG_RATE times a second (only when
+    # it changed) into that room's FeatureLog under `root`
+    def __init__(self, manager, root, rate=LOG_RATE):
+        self.manager = manager
+        self.root = root
+        self.interval = 1.0 / rate
+        self.logs = {}
+        self.last = {}
+        self.running = False
+        self.thread = None
+
+    def log(self, room_id):
+        log = self.logs.get(room_id)
+        if log is None:
+            log = FeatureLog(os.path.join(self.root, room_id))
+            self.logs[room_id] = log
+        return log
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="feature-recorder", daemon=True)
+        self.thread.start()
+        print(f"FeatureRecorder: Logging to {self.root}")
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        for log in self.logs.values():
+            log.close()
+
+    def _run(self):
+        next_flush = time.monotonic() + 5.0
+        while self.running:
+            now = time.time()
+            for room_id, room in list(self.manager.rooms.items()):
+                fused = room.fusion.current()
+                if self.last.get(room_id) == fused.key:
+                    continue
+                self.last[room_id] = fused.key
+                try:
+                    self.log(room_id).append(now, fused.audio.features, fused.video.features, fused.state, fused.confidence)
+                except Exception as e:
+                    print(f"FeatureRecorder: Room '{room_id}' write failed ({e})")
+            if time.monotonic() >= next_flush:
+                for log in self.logs.values():
+                    log.flush()
+                next_flush = time.monotonic() + 5.0
+            time.sleep(self.interval)
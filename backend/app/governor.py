@@ -0,0 +1,99 @@
+import copy
+import time
+
+# Sampling-rate governor. Each room runs in one of three modes:
+#   active  something significant changed within the last `stable_after` s
+#   stable  nothing significant for `stable_after` s, clients connected
+#   idle    nothing significant for `stable_after` s and nobody watching
+# and the sensors are throttled to that mode's video FPS / audio stride
+# (analyze every Nth hop). Any significant change flips straight back to
+# active and wakes the video loop so the next frame is analyzed now.
+DEFAULT_POLICY = {
+    "stable_after": 60.0,
+    "video_fps": {"active": 5.0, "stable": 1.0, "idle": 0.5},
+    "audio_stride": {"active": 1, "stable": 4, "idle": 8},
+    # The sensor daemon cannot see API-worker clients, so it turns this off
+    "idle_without_clients": True,
+}
+
+
+MODES = ("active", "stable", "idle")
+
+
+def merge_policy(base, overrides):
+    # Raises ValueError for a policy the sensors can't run (e.g. video_fps 0),
+    # so a bad rooms.json entry is skipped instead of crashing the listener
+    policy = copy.deepcopy(base)
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(policy.get(key), dict):
+            policy[key].update(value)
+        else:
+            policy[key] = value
+    for key in ("video_fps", "audio_stride"):
+        rates = policy.get(key)
+        if not isinstance(rates, dict):
+            raise ValueError(f"Governor policy '{key}' must map {', '.join(MODES)} to a value")
+        for mode in MODES:
+            value = rates.get(mode)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"Governor policy '{key}.{mode}' must be a number, got {value!r}")
+            if key == "video_fps" and not value > 0:
+                raise ValueError(f"Governor policy 'video_fps.{mode}' must be > 0, got {value}")
+            if key == "audio_stride" and value < 1:
+                raise ValueError(f"Governor policy 'audio_stride.{mode}' must be >= 1, got {value}")
+    return policy
+
+
+class Governor:
+    def __init__(self, room, significant=None, policy=None):
+        self.room = room
+        # significant(previous, current) on payload-shaped dicts; default is
+        # "the state changed"
+        self.significant = significant or (lambda previous, current: previous["state"] != current["state"])
+        self.policy = merge_policy(DEFAULT_POLICY, policy)
+        self.mode = "active"
+        self.reference = None
+        self.last_change = time.monotonic()
+        self.transitions = 0
+        room.audio_sensor.listeners.append(self.update)
+        room.video_sensor.listeners.append(self.update)
+        self._apply()
+
+    def update(self):
+        # Sensor-thread listener; the fused prediction is cached, so this is
+        # a dict compare per update
+        fused = self.room.fusion.current()
+        current = {
+            "state": fused.state,
+            "features": {"audio": fused.audio.features, "video": fused.video.features}
+        }
+        now = time.monotonic()
+        if self.reference is None or self.significant(self.reference, current):
+            self.reference = current
+            self.last_change = now
+
+        if now - self.last_change < self.policy["stable_after"]:
+            mode = "active"
+        elif self.policy["idle_without_clients"] and not self.room.hub.subscribers:
+            mode = "idle"
+        else:
+            mode = "stable"
+
+        if mode != self.mode:
+            print(f"Governor: Room '{self.room.id}' {self.mode} -> {mode}")
+            self.mode = mode
+            self.transitions += 1
+            self._apply()
+
+    def _apply(self):
+        self.room.video_sensor.set_frame_rate(self.policy["video_fps"][self.mode])
+        self.room.audio_sensor.analysis_stride = max(1, int(self.policy["audio_stride"][self.mode]))
+
+    def get_stats(self):
+        return {
+            "mode": self.mode,
+            "video_fps": self.policy["video_fps"][self.mode],
+            "audio_stride": self.room.audio_sensor.analysis_stride,
+            "seconds_since_change": round(time.monotonic() - self.last_change, 1),
+            "transitions": self.transitions,
+        }
@@ -0,0 +1,153 @@
+import threading
+import numpy as np
+
+# Numeric series kept per sample (state is stored separately as a code)
+AUDIO_FIELDS = ["rms", "db", "low_energy", "mid_energy", "high_energy",
+                "spectral_centroid", "spectral_rolloff", "spectral_flux", "zcr"]
+VIDEO_FIELDS = ["brightness", "motion_magnitude", "motion_hotspots"]
+HISTORY_FIELDS = AUDIO_FIELDS + VIDEO_FIELDS + ["confidence"]
+
+# Samples per min/max summary block
+STATS_BLOCK = 256
+
+
+class FeatureHistory:
+    # Fixed-capacity ring of timestamped samples stored as one array per
+    # field. Rolling sum / sum of squares are kept exact over the buffered
+    # samples; min / max are kept per STATS_BLOCK block, so they cover the
+    # buffer minus at most one partially overwritten block.
+    def __init__(self, capacity, fields=None, states=None):
+        self.capacity = int(capacity)
+        self.fields = list(fields or HISTORY_FIELDS)
+        self.states = list(states or [])
+        self.lock = threading.Lock()
+
+        n = len(self.fields)
+        self.t = np.zeros(self.capacity, dtype=np.float64)
+        self.values = np.zeros((n, self.capacity), dtype=np.float32)
+        self.state = np.full(self.capacity, -1, dtype=np.int16)
+        self.count = 0
+
+        self._sum = np.zeros(n, dtype=np.float64)
+        self._sumsq = np.zeros(n, dtype=np.float64)
+        n_blocks = -(-self.capacity // STATS_BLOCK)
+        self._block_min = np.full((n, n_blocks), np.inf, dtype=np.float32)
+        self._block_max = np.full((n, n_blocks), -np.inf, dtype=np.float32)
+
+    def _state_code(self, state):
+        try:
+            return self.states.index(state)
+        except ValueError:
+            self.states.append(state)
+            return len(self.states) - 1
+
+    def append(self, timestamp, audio_feats, video_feats, state, confidence):
+        # Same dtype as storage so evicting a value subtracts exactly what was added
+        row = np.empty(len(self.fields), dtype=np.float32)
+        for i, k in enumerate(self.fields):
+            if k == "confidence":
+                row[i] = confidence
+            elif k in audio_feats:
+                row[i] = audio_feats[k]
+            else:
+                row[i] = video_feats.get(k, 0.0)
+
+        with self.lock:
+            idx = self.count % self.capacity
+            if self.count >= self.capacity:
+                old = self.values[:, idx]
+                self._sum -= old
+                self._sumsq -= np.square(old, dtype=np.float64)
+
+            self.t[idx] = timestamp
+            self.values[:, idx] = row
+            self.state[idx] = self._state_code(state)
+            self._sum += row
+            self._sumsq += np.square(row, dtype=np.float64)
+
+            block = idx // STATS_BLOCK
+            if idx % STATS_BLOCK == 0:
+                self._block_min[:, block] = np.inf
+                self._block_max[:, block] = -np.inf
+            np.minimum(self._block_min[:, block], row, out=self._block_min[:, block])
+            np.maximum(self._block_max[:, block], row, out=self._block_max[:, block])
+
+            self.count += 1
+            # Re-sum periodically so subtracting evicted values cannot drift
+            if self.count % self.capacity == 0:
+                self._sum = self.values.sum(axis=1, dtype=np.float64)
+                self._sumsq = np.square(self.values, dtype=np.float64).sum(axis=1)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def stats(self):
+        # Rolling stats over everything currently buffered
+        with self.lock:
+            n = len(self)
+            if not n:
+                return {}
+            mean = self._sum / n
+            var = np.maximum(self._sumsq / n - mean * mean, 0.0)
+            mins = self._block_min.min(axis=1)
+            maxs = self._block_max.max(axis=1)
+        return {
+            k: {"mean": float(mean[i]), "std": float(np.sqrt(var[i])),
+                "min": float(mins[i]), "max": float(maxs[i])}
+            for i, k in enumerate(self.fields)
+        }
+
+    def _ordered_since(self, since):
+        # Chronological copy of samples with t >= since (caller holds lock)
+        n = len(self)
+        if self.count <= self.capacity:
+            segments = [(0, n)]
+        else:
+            head = self.count % self.capacity
+            segments = [(head, self.capacity), (0, head)]
+
+        parts = []
+        for start, stop in segments:
+            first = start + int(np.searchsorted(self.t[start:stop], since, side="left"))
+            if first < stop:
+                parts.append((first, stop))
+
+        t = np.concatenate([self.t[a:b] for a, b in parts]) if parts else np.zeros(0)
+        values = np.concatenate([self.values[:, a:b] for a, b in parts], axis=1) if parts else np.zeros((len(self.fields), 0), dtype=np.float32)
+        state = np.concatenate([self.state[a:b] for a, b in parts]) if parts else np.zeros(0, dtype=np.int16)
+        return t, values, state
+
+    def query(self, window, points, fields=None, now=None):
+        # Min/mean/max buckets over the last `window` seconds
+        with self.lock:
+            if now is None:
+                now = self.t[(self.count - 1) % self.capacity] if self.count else 0.0
+            t, values, state = self._ordered_since(now - window)
+            states = list(self.states)
+
+        fields = [f for f in (fields or self.fields) if f in self.fields]
+        rows = [self.fields.index(f) for f in fields]
+        n = len(t)
+        if not n:
+            return {"t": [], "state": [], "series": {f: {"mean": [], "min": [], "max": []} for f in fields}}
+
+        points = max(1, min(int(points), n))
+        edges = np.linspace(0, n, points + 1).astype(np.int64)
+        starts = edges[:-1]
+        counts = np.diff(edges)
+
+        selected = values[rows].astype(np.float64)
+        means = np.add.reduceat(selected, starts, axis=1) / counts
+        mins = np.minimum.reduceat(selected, starts, axis=1)
+        maxs = np.maximum.reduceat(selected, starts, axis=1)
+        series = {}
+        for i, f in enumerate(fields):
+            series[f] = {"mean": means[i].tolist(), "min": mins[i].tolist(), "max": maxs[i].tolist()}
+
+        # Bucket timestamp = start of bucket; state = last state in bucket
+        last = state[edges[1:] - 1]
+        return {
+            "t": t[starts].tolist(),
+            "state": [states[c] if c >= 0 else None for c in last],
+            "series": series
+        }
@@ -0,0 +1,423 @@
+import copy
+import heapq
+import os
+import threading
+from collections import OrderedDict, namedtuple
+import numpy as np
+from . import model_store
+from .ml import DEMO_PROTOTYPES, PREDICT_TIME, BATCH_CHUNK, N_FEATURES, ModelStats, feature_vector
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    # Fall back to the numpy KDTree below: same answers, but batch queries
+    # run one row at a time
+    cKDTree = None
+
+# k-nearest-neighbor backend (SENSORYNET_CLASSIFIER=knn). Unlike the
+# centroid model, a class can occupy several separate regions of feature
+# space ("TV/Media" bright or dark, "Crowded" chatty or loud), as long as
+# there are exemplars there.
+KNN_MODEL_PATH = "knn.npz"
+KNN_K = 7
+# Points per leaf of the numpy KDTree; scipy keeps its own default
+KD_LEAF_SIZE = 512
+# Predictions are cached on the scaled feature vector rounded to this many
+# standard deviations; consecutive sensor ticks mostly land in one cell
+CACHE_SIZE = 4096
+CACHE_QUANTUM = 0.01
+# partial_fit() rows are scanned brute force until there are this many,
+# then folded into the index
+REBUILD_AFTER = 4096
+
+# Demo exemplars: DEMO_PROTOTYPES plus a few multi-modal classes, each mode
+# jittered by DEMO_JITTER (relative) around its reading
+DEMO_MODES = {label: [row] for label, row in DEMO_PROTOTYPES.items()}
+DEMO_MODES.update({
+    # Many voices, or a loud room with lots of people moving
+    "Crowded": [[0.3, 70, 300, 900, 200, 120, 4, 6], [0.45, 78, 600, 700, 400, 150, 6, 10]],
+    # Speech-band audio with a flickering screen, lit room or dark room
+    "TV/Media": [[0.15, 55, 150, 600, 250, 140, 1, 2], [0.1, 50, 120, 500, 200, 35, 1, 1]],
+})
+DEMO_PER_MODE = 2000
+DEMO_JITTER = 0.1
+DEMO_SEED = 7
+
+# Everything a prediction reads, published with one attribute assignment so
+# a predict() racing fit()/partial_fit() never sees half of an update (new
+# pending rows with old pending codes, new scaler with old index). version
+# goes into the cache key, so a result computed from an older state can't
+# answer a query against a newer one.
+KNNState = namedtuple(
+    "KNNState", "labels exemplars codes stats scaler_mean scaler_scale index pending pending_codes version")
+
+
+class KDTree:
+    # Minimal numpy k-d tree. Points are reordered so every leaf is a
+    # contiguous slice scanned in one vectorized step. Queries descend to the
+    # nearest leaf, queue each skipped sibling by its distance lower bound
+    # (tracked incrementally per split, as in Arya & Mount) and stop once no
+    # queued node can beat the current k-th neighbor. Internal nodes cost a
+    # few Python float ops, so large leaves keep the walk short.
+    def __init__(self, data, leaf_size=KD_LEAF_SIZE):
+        data = np.asarray(data, dtype=np.float64)
+        self.n = len(data)
+        self.n_features = data.shape[1]
+        order = np.arange(self.n)
+        start, end, left, right, split_dim, split_value = [], [], [], [], [], []
+        # (slice start, slice end, parent node, parent's child list)
+        stack = [(0, self.n, None, None)]
+        while stack:
+            s, e, parent, side = stack.pop()
+            node = len(start)
+            if parent is not None:
+                side[parent] = node
+            start.append(s)
+            end.append(e)
+            left.append(-1)
+            right.append(-1)
+            split_dim.append(0)
+            split_value.append(0.0)
+            if e - s <= leaf_size:
+                continue
+            # Split the widest dimension at the median: left <= value <= right
+            points = data[order[s:e]]
+            dim = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+            mid = (s + e) // 2
+            part = np.argpartition(points[:, dim], mid - s)
+            order[s:e] = order[s:e][part]
+            split_dim[node] = dim
+            split_value[node] = float(points[part[mid - s], dim])
+            stack.append((mid, e, node, right))
+            stack.append((s, mid, node, left))
+
+        self.order = order
+        self.data = data[order]
+        # Plain lists: the query loop reads them one node at a time
+        self.start = start
+        self.end = end
+        self.left = left
+        self.right = right
+        self.split_dim = split_dim
+        self.split_value = split_value
+
+    def query(self, x, k):
+        # (distances[k], indices[k]) of the k nearest points, nearest first
+        k = min(k, self.n)
+        point = np.asarray(x, dtype=np.float64)
+        x = point.tolist()
+        best_d = np.empty(0)
+        best_i = np.empty(0, dtype=np.int64)
+        kth = np.inf
+        # (squared lower bound, node, per-dimension offsets behind that bound)
+        heap = [(0.0, 0, [0.0] * self.n_features)]
+        while heap:
+            bound, node, offsets = heapq.heappop(heap)
+            if bound >= kth:
+                break
+            while self.left[node] >= 0:
+                dim = self.split_dim[node]
+                diff = x[dim] - self.split_value[node]
+                if diff < 0:
+                    near, far = self.left[node], self.right[node]
+                else:
+                    near, far = self.right[node], self.left[node]
+                far_bound = bound - offsets[dim] ** 2 + diff * diff
+                if far_bound < kth:
+                    far_offsets = offsets.copy()
+                    far_offsets[dim] = diff
+                    heapq.heappush(heap, (far_bound, far, far_offsets))
+                node = near
+
+            s, e = self.start[node], self.end[node]
+            diff = self.data[s:e] - point
+            best_d = np.concatenate([best_d, np.einsum("ij,ij->i", diff, diff)])
+            best_i = np.concatenate([best_i, np.arange(s, e)])
+            if len(best_d) > k:
+                keep = np.argpartition(best_d, k - 1)[:k]
+                best_d = best_d[keep]
+                best_i = best_i[keep]
+            if len(best_d) == k:
+                kth = float(best_d.max())
+        nearest = np.argsort(best_d)
+        return np.sqrt(best_d[nearest]), self.order[best_i[nearest]]
+
+    def query_batch(self, X, k):
+        dist = np.empty((len(X), min(k, self.n)))
+        index = np.empty(dist.shape, dtype=np.int64)
+        for i, x in enumerate(X):
+            dist[i], index[i] = self.query(x, k)
+        return dist, index
+
+
+def build_index(data):
+    if cKDTree is not None:
+        return cKDTree(data)
+    return KDTree(data)
+
+
+def query_index(index, X, k):
+    # (distances, indices), both (len(X), k), nearest first
+    k = min(k, index.n)
+    if cKDTree is not None and isinstance(index, cKDTree):
+        dist, idx = index.query(X, k=k)
+        return dist.reshape(len(X), k), idx.reshape(len(X), k)
+    return index.query_batch(X, k)
+
+
+class PredictionCache:
+    # LRU of (label, confidence) by quantized scaled feature vector
+    def __init__(self, size=CACHE_SIZE, quantum=CACHE_QUANTUM):
+        self.size = size
+        self.quantum = quantum
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, scaled, version=0):
+        return version, np.floor(scaled / self.quantum).astype(np.int64).tobytes()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class KNNClassifier:
+    # Drop-in for EnvironmentClassifier (predict / predict_batch /
+    # partial_fit / save), voting among the k nearest exemplars
+    def __init__(self, model_path=KNN_MODEL_PATH, k=KNN_K, load=True, read_only=False):
+        self.model_path = model_path
+        # Same as EnvironmentClassifier's read_only
+        self.read_only = read_only
+        self.k = k
+        self.states = ["Quiet", "Noisy", "Crowded", "Silent", "Windy", "Conversation", "TV/Media", "Sleepy"]
+        # pending: rows from partial_fit() not in the index yet, kept scaled
+        self.state = KNNState(
+            labels=(), exemplars=np.zeros((0, N_FEATURES), dtype=np.float32), codes=np.zeros(0, dtype=np.int32),
+            stats=None, scaler_mean=None, scaler_scale=None, index=None,
+            pending=np.zeros((0, N_FEATURES)), pending_codes=np.zeros(0, dtype=np.int32), version=0)
+        self.cache = PredictionCache()
+        self.lock = threading.Lock()
+
+        if load:
+            self.load_or_train_demo()
+
+    def load_or_train_demo(self):
+        if os.path.exists(self.model_path):
+            try:
+                arrays = model_store.load_npz(self.model_path, mmap=not self.read_only)
+                labels = tuple(str(l) for l in arrays["labels"])
+                with self.lock:
+                    self._set_exemplars(labels, arrays["exemplars"], arrays["codes"], ModelStats.from_arrays(arrays))
+                print(f"Loaded existing kNN model ({self.model_path}, {len(self.codes)} exemplars).")
+                return
+            except Exception as e:
+                print(f"Error loading kNN model: {e}")
+        if self.read_only:
+            print(f"No kNN model at {self.model_path}; classifier stays untrained.")
+            return
+        self.train_demo()
+
+    def train_demo(self):
+        print("Training demo kNN model...")
+        rng = np.random.default_rng(DEMO_SEED)
+        X = []
+        y = []
+        for label, modes in DEMO_MODES.items():
+            for row in modes:
+                row = np.array(row, dtype=np.float64)
+                X.append(row * (1 + DEMO_JITTER * rng.standard_normal((DEMO_PER_MODE, N_FEATURES))))
+                y.extend([label] * DEMO_PER_MODE)
+        self.fit(np.clip(np.vstack(X), 0, None), y)
+        self.save()
+        print("Demo kNN model trained and saved.")
+
+    # Read-only views of the current state (training.py, /status)
+    @property
+    def labels(self):
+        return list(self.state.labels)
+
+    @property
+    def exemplars(self):
+        return self.state.exemplars
+
+    @property
+    def codes(self):
+        return self.state.codes
+
+    @property
+    def stats(self):
+        return self.state.stats
+
+    def _publish(self, **fields):
+        # Caller holds self.lock
+        state = self.state._replace(version=self.state.version + 1, **fields)
+        for label in state.labels:
+            if label not in self.states:
+                self.states.append(label)
+        self.state = state
+        self.cache.clear()
+
+    def _set_exemplars(self, labels, exemplars, codes, stats):
+        # Scaler from every exemplar seen, index over the scaled exemplars.
+        # Caller holds self.lock
+        mean, scale = stats.scaler()
+        scaled = (np.asarray(exemplars, dtype=np.float64) - mean) / scale
+        self._publish(
+            labels=tuple(labels), exemplars=exemplars, codes=np.asarray(codes, dtype=np.int32), stats=stats,
+            scaler_mean=mean, scaler_scale=scale, index=build_index(scaled) if len(scaled) else None,
+            pending=np.zeros((0, N_FEATURES)), pending_codes=np.zeros(0, dtype=np.int32))
+
+    @staticmethod
+    def _encode(known, labels):
+        # (labels extended with any new ones, codes into them)
+        known = list(known)
+        codes = []
+        for label in labels:
+            label = str(label)
+            if label not in known:
+                known.append(label)
+            codes.append(known.index(label))
+        return tuple(known), np.array(codes, dtype=np.int32)
+
+    def fit(self, X, labels):
+        # Replace the exemplar set
+        X = np.asarray(X, dtype=np.float64).reshape(-1, N_FEATURES)
+        with self.lock:
+            stats = ModelStats()
+            stats.update(X, labels)
+            known, codes = self._encode((), labels)
+            self._set_exemplars(known, X.astype(np.float32), codes, stats)
+
+    def load_stats(self):
+        return self.stats
+
+    def partial_fit(self, X, labels):
+        # New rows are searched brute force next to the index until
+        # REBUILD_AFTER accumulate; then everything is re-scaled and indexed
+        X = np.asarray(X, dtype=np.float64).reshape(-1, N_FEATURES)
+        with self.lock:
+            state = self.state
+            stats = copy.deepcopy(state.stats) if state.stats is not None else ModelStats()
+            stats.update(X, labels)
+            known, codes = self._encode(state.labels, labels)
+            if len(state.pending) + len(X) >= REBUILD_AFTER or state.index is None:
+                pending_raw = state.pending * state.scaler_scale + state.scaler_mean if len(state.pending) else state.pending
+                exemplars = np.vstack([state.exemplars, pending_raw.astype(np.float32), X.astype(np.float32)])
+                self._set_exemplars(known, exemplars, np.concatenate([state.codes, state.pending_codes, codes]), stats)
+            else:
+                self._publish(
+                    labels=known, stats=stats,
+                    pending=np.vstack([state.pending, (X - state.scaler_mean) / state.scaler_scale]),
+                    pending_codes=np.concatenate([state.pending_codes, codes]))
+
+    def save(self, path=None):
+        path = path or self.model_path
+        with self.lock:
+            # Release any mapping of the file about to be replaced
+            state = self.state = self.state._replace(exemplars=model_store.unmap(self.state.exemplars),
+                                                     codes=model_store.unmap(self.state.codes))
+            exemplars = np.asarray(state.exemplars, dtype=np.float32)
+            codes = state.codes
+            if len(state.pending):
+                pending_raw = state.pending * state.scaler_scale + state.scaler_mean
+                exemplars = np.vstack([exemplars, pending_raw.astype(np.float32)])
+                codes = np.concatenate([codes, state.pending_codes])
+            arrays = {
+                "labels": np.array(state.labels, dtype=str),
+                "exemplars": exemplars,
+                "codes": codes,
+            }
+            arrays.update(state.stats.to_arrays())
+            model_store.save_npz(path, arrays)
+
+    def _neighbors(self, state, scaled):
+        # (distances, codes), both (len(scaled), k), nearest first
+        dist, idx = query_index(state.index, scaled, self.k)
+        codes = state.codes[idx]
+        if len(state.pending):
+            diff = scaled[:, None, :] - state.pending[None, :, :]
+            pending_dist = np.sqrt(np.einsum("nkf,nkf->nk", diff, diff))
+            dist = np.hstack([dist, pending_dist])
+            codes = np.hstack([codes, np.broadcast_to(state.pending_codes, pending_dist.shape)])
+            nearest = np.argsort(dist, axis=1)[:, :self.k]
+            dist = np.take_along_axis(dist, nearest, axis=1)
+            codes = np.take_along_axis(codes, nearest, axis=1)
+        return dist, codes
+
+    def _vote(self, state, dist, codes):
+        # Distance-weighted vote; confidence is the winner's share of k,
+        # which equals the centroid model's 1 / (1 + dist) when k=1
+        weights = 1.0 / (1.0 + dist)
+        votes = np.zeros((len(dist), len(state.labels)))
+        np.add.at(votes, (np.arange(len(dist))[:, None], codes), weights)
+        best = np.argmax(votes, axis=1)
+        return best, votes[np.arange(len(dist)), best] / dist.shape[1]
+
+    def predict(self, audio_feats, video_feats):
+        with PREDICT_TIME.time():
+            return self._predict(audio_feats, video_feats)
+
+    def _predict(self, audio_feats, video_feats):
+        state = self.state
+        if state.index is None:
+            return "Unknown", 0.0
+        scaled = (feature_vector(audio_feats, video_feats) - state.scaler_mean) / state.scaler_scale
+        key = self.cache.key(scaled, state.version)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        dist, codes = self._neighbors(state, scaled.reshape(1, -1))
+        best, confidence = self._vote(state, dist, codes)
+        result = (state.labels[best[0]], float(confidence[0]))
+        self.cache.put(key, result)
+        return result
+
+    def predict_batch(self, X):
+        # Same contract as EnvironmentClassifier.predict_batch. Distance
+        # column j is the nearest of the k neighbors labeled labels[j], or
+        # the k-th neighbor's distance (a lower bound) if none of them is.
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != N_FEATURES:
+            raise ValueError(f"Expected rows of {N_FEATURES} features, got shape {X.shape}")
+        state = self.state
+        if state.index is None:
+            raise ValueError("Classifier has no trained model")
+
+        n = X.shape[0]
+        labels = np.empty(n, dtype=object)
+        confidences = np.empty(n)
+        distances = np.empty((n, len(state.labels)))
+        for start in range(0, n, BATCH_CHUNK):
+            scaled = (X[start:start + BATCH_CHUNK] - state.scaler_mean) / state.scaler_scale
+            dist, codes = self._neighbors(state, scaled)
+            best, confidence = self._vote(state, dist, codes)
+            rows = np.arange(len(dist))
+            chunk = np.repeat(dist[:, -1:], len(state.labels), axis=1)
+            # Nearest first, so writing in reverse leaves each label's nearest
+            for j in range(dist.shape[1] - 1, -1, -1):
+                chunk[rows, codes[:, j]] = dist[:, j]
+            labels[start:start + len(dist)] = np.asarray(state.labels)[best]
+            confidences[start:start + len(dist)] = confidence
+            distances[start:start + len(dist)] = chunk
+        return labels.astype(str), confidences, distances
@@ -1,10 +1,22 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 from .audio import AudioSensor
 from .video import VideoSensor
-from .ml import EnvironmentClassifier
-import asyncio
-import json
+from .ml import EnvironmentClassifier, N_FEATURES, feature_vector
+from .knn import KNNClassifier
+from .protocol import JsonEncoder, BinaryEncoder, parse_fields
+from .responses import json_response, not_modified, etag, etag_matches
+from .profiling import LoopLagMonitor, sample_stacks, collapsed, PROFILE_INTERVAL, PROFILE_MAX_SECONDS
+from .history import FeatureHistory
+from .feature_log import FeatureLog, FeatureRecorder
+from .discovery import DeviceCache
+from .rooms import SensorManager
+from .shared_state import StatePublisher, SharedStateRooms
+from . import metrics
+import numpy as np
+import os
 import time
 
 app = FastAPI(title="SensoryNet Backend")
@@ -17,11 +29,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Process role (SENSORYNET_ROLE):
+#   standalone  sensors and API in this process (default; one uvicorn worker)
+#   daemon      same, plus publishes state to shared memory (python -m app.daemon)
+#   api         no sensors: serves /status and /ws from the daemon's shared
+#               memory, so uvicorn can run any number of --workers
+ROLE = os.environ.get("SENSORYNET_ROLE", "standalone")
+SENSORS_LOCAL = ROLE != "api"
+
 # Global State
-audio_sensor = AudioSensor()
-# Auto-detect camera (Index 0 likely DroidCam if installed)
-video_sensor = VideoSensor()
-classifier = EnvironmentClassifier() # Trains on init if needed
+# Classifier backend (SENSORYNET_CLASSIFIER):
+#   centroid  nearest class mean, model.npz / model.json
+#   knn       k nearest exemplars, knn.npz; handles classes with several
+#             distinct looks (install scipy for fast batch /classify)
+CLASSIFIER_BACKEND = os.environ.get("SENSORYNET_CLASSIFIER", "centroid")
+# API workers only read the model the sensor daemon trained and saved; N of
+# them training at import would race on the same file
+if CLASSIFIER_BACKEND == "knn":
+    classifier = KNNClassifier(read_only=not SENSORS_LOCAL)
+else:
+    classifier = EnvironmentClassifier(read_only=not SENSORS_LOCAL) # Trains on init if needed
 
 # Recommendations
 RECOMMENDATIONS = {
@@ -35,43 +62,265 @@ RECOMMENDATIONS = {
     "TV/Media": "Media consumption detected."
 }
 
+# Push as soon as the state changes or a feature moves by at least this much
+# since the last push; anything smaller waits for the heartbeat
+PUSH_THRESHOLDS = {
+    "db": 3.0,
+    "brightness": 8.0,
+    "motion_magnitude": 0.5,
+    "motion_hotspots": 1,
+}
+WS_MAX_RATE = 10.0 # Max pushes/s to /ws clients
+WS_HEARTBEAT = 2.0 # Seconds between pushes while nothing changes
+# Longest /status?wait= hold; clients re-poll with the same ETag
+STATUS_MAX_WAIT = 30.0
+# Duty-cycling: camera FPS / audio hop stride per governor mode, see
+# governor.py. Set to None to always run at full rate.
+GOVERNOR_POLICY = {
+    "stable_after": 60.0,
+    "video_fps": {"active": 5.0, "stable": 1.0, "idle": 0.5},
+    "audio_stride": {"active": 1, "stable": 4, "idle": 8},
+    # API workers' clients are invisible to the sensor daemon
+    "idle_without_clients": ROLE != "daemon",
+}
+# Video analysis processes shared by all rooms (None = cores - 1 once there
+# are two or more rooms, 0 = analyze on each room's sensor thread)
+VIDEO_WORKERS = None
+# Optional on-disk feature log with hourly/minute/second rollups (see
+# feature_log.py), one subdirectory per room; unset = off
+FEATURE_LOG_DIR = os.environ.get("SENSORYNET_FEATURE_LOG")
+
+def significant_change(previous, current):
+    if current["state"] != previous["state"]:
+        return True
+    for group in ("audio", "video"):
+        before = previous["features"][group]
+        after = current["features"][group]
+        for key, threshold in PUSH_THRESHOLDS.items():
+            if key in after and abs(after[key] - before.get(key, 0)) >= threshold:
+                return True
+    return False
+
+if SENSORS_LOCAL:
+    # Last working camera / mic, tried first on the next boot
+    device_cache = DeviceCache()
+    audio_sensor = AudioSensor(device_cache=device_cache)
+    # Auto-detect camera (Index 0 likely DroidCam if installed)
+    video_sensor = VideoSensor(device_cache=device_cache)
+
+    # Every room gets its own sensors, fused prediction and /ws hub. The global
+    # sensors above are the "default" room behind /status and /ws; more rooms
+    # come from rooms.json and are served under /rooms/{id}/...
+    manager = SensorManager(classifier, RECOMMENDATIONS, video_workers=VIDEO_WORKERS, governor_policy=GOVERNOR_POLICY,
+                            max_rate=WS_MAX_RATE, heartbeat=WS_HEARTBEAT, significant=significant_change)
+    default_room = manager.add_room("default", audio_sensor, video_sensor)
+    manager.load_config()
+
+    # Latest (audio, video) snapshot pair and its prediction, computed once per
+    # sensor update and shared by /status, /ws and history
+    fusion = default_room.fusion
+
+    # ~1 hour at full sensor rate (audio hops + video frames, ~50 samples/s)
+    HISTORY_CAPACITY = 3600 * 50
+    history = FeatureHistory(HISTORY_CAPACITY, states=classifier.states)
+
+    def record_history():
+        # Runs on whichever sensor thread just produced new features
+        fused = fusion.current()
+        history.append(time.time(), fused.audio.features, fused.video.features, fused.state, fused.confidence)
+
+    audio_sensor.listeners.append(record_history)
+    video_sensor.listeners.append(record_history)
+
+    metrics.counter("sensorynet_video_frames_total", "Video frames analyzed", fn=lambda: video_sensor.frames_analyzed)
+    metrics.counter("sensorynet_video_dropped_frames_total", "Grabbed video frames never analyzed", fn=lambda: video_sensor.dropped_frames)
+    metrics.gauge("sensorynet_video_fps", "Effective video analysis rate", fn=lambda: video_sensor.fps)
+    metrics.gauge("sensorynet_video_frame_age_seconds", "Age of the last analyzed frame", fn=lambda: video_sensor.frame_age)
+    metrics.counter("sensorynet_audio_blocks_total", "Audio hops analyzed", fn=lambda: audio_sensor.blocks_analyzed)
+    metrics.gauge("sensorynet_audio_blocks_per_second", "Effective audio analysis rate", fn=lambda: audio_sensor.blocks_per_second)
+    metrics.counter("sensorynet_audio_overruns_total", "Audio blocks dropped because analysis fell behind", fn=lambda: audio_sensor.ring.overruns)
+    metrics.counter("sensorynet_fusion_cache_hits_total", "Fused predictions served from cache", fn=lambda: fusion.hits)
+    metrics.counter("sensorynet_fusion_cache_misses_total", "Fused predictions computed", fn=lambda: fusion.misses)
+    metrics.gauge("sensorynet_video_target_fps", "Camera analysis rate set by the governor", fn=lambda: 1.0 / video_sensor.frame_interval)
+    metrics.gauge("sensorynet_audio_analysis_stride", "Audio hops per analyzed hop, set by the governor", fn=lambda: audio_sensor.analysis_stride)
+else:
+    # Rooms mirror whatever the daemon publishes; history, sensor control
+    # and sensor metrics live in the daemon process
+    manager = SharedStateRooms(max_rate=WS_MAX_RATE, heartbeat=WS_HEARTBEAT, significant=significant_change)
+    history = None
+
+WS_SEND_TIME = metrics.stage("ws_send")
+metrics.gauge("sensorynet_ws_clients", "Connected WebSocket clients", fn=lambda: sum(len(r.hub.subscribers) for r in manager.rooms.values()))
+metrics.gauge("sensorynet_rooms", "Registered rooms", fn=lambda: len(manager.rooms))
+metrics.counter("sensorynet_ws_pushes_total", "Updates pushed to /ws clients", fn=lambda: sum(r.hub.change_pushes for r in manager.rooms.values()), reason="change")
+metrics.counter("sensorynet_ws_pushes_total", "Updates pushed to /ws clients", fn=lambda: sum(r.hub.heartbeat_pushes for r in manager.rooms.values()), reason="heartbeat")
+STATUS_RESPONSES = {
+    "full": metrics.counter("sensorynet_status_responses_total", "/status responses", result="full"),
+    "not_modified": metrics.counter("sensorynet_status_responses_total", "/status responses", result="not_modified"),
+}
+if CLASSIFIER_BACKEND == "knn":
+    metrics.counter("sensorynet_knn_cache_hits_total", "kNN predictions served from the quantized-vector cache", fn=lambda: classifier.cache.hits)
+    metrics.counter("sensorynet_knn_cache_misses_total", "kNN predictions that searched the index", fn=lambda: classifier.cache.misses)
+
+# Scheduling delay of this process's event loop (see profiling.py)
+lag_monitor = LoopLagMonitor()
+
+def local_discovery():
+    return {
+        "audio": audio_sensor.discovery.snapshot(),
+        "video": video_sensor.discovery.snapshot(),
+        "video_pool": manager.pool_status()
+    }
+
+# The daemon mirrors every room (plus discovery progress) into shared memory
+publisher = StatePublisher(manager, extra=lambda: {"discovery": local_discovery()}) if ROLE == "daemon" else None
+# Whoever owns the sensors writes the log; API workers only read it
+recorder = FeatureRecorder(manager, FEATURE_LOG_DIR) if FEATURE_LOG_DIR and SENSORS_LOCAL else None
+
+def require_local_sensors():
+    if not SENSORS_LOCAL:
+        raise HTTPException(status_code=503, detail="Served by the sensor daemon (python -m app.daemon), not API workers")
+
 @app.on_event("startup")
 async def startup_event():
-    # Auto-start sensors for demo (or make configurable)
-    audio_sensor.start()
-    video_sensor.start()
+    # Auto-start sensors for demo (or make configurable). Device discovery
+    # runs on the sensor threads, so this returns immediately; see /discovery.
+    lag_monitor.start()
+    manager.start()
+    if publisher:
+        publisher.start()
+    if recorder:
+        recorder.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    audio_sensor.stop()
-    video_sensor.stop()
+    if publisher:
+        publisher.stop()
+    if recorder:
+        recorder.stop()
+    await manager.stop()
+    await lag_monitor.stop()
 
 @app.get("/")
 def read_root():
     return {"status": "SensoryNet Running"}
 
+def get_room(room_id):
+    room = manager.rooms.get(room_id)
+    if room is None:
+        if not SENSORS_LOCAL and manager.document() is None:
+            raise HTTPException(status_code=503, detail="Sensor daemon not running")
+        raise HTTPException(status_code=404, detail=f"Unknown room '{room_id}'")
+    return room
+
+async def serve_status(request, room_id, wait):
+    # Conditional GET: If-None-Match with the last ETag gets 304 while the
+    # room's version is unchanged. With ?wait=<seconds> the request is held
+    # until the version moves (then the new status) or the wait runs out
+    # (then 304), so clients long-poll instead of hammering /status.
+    room = get_room(room_id)
+    since = request.headers.get("if-none-match")
+    if since:
+        deadline = time.monotonic() + min(max(wait, 0.0), STATUS_MAX_WAIT)
+        while True:
+            version = room.version()
+            if version is None or not etag_matches(since, etag(version)):
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                STATUS_RESPONSES["not_modified"].inc()
+                return not_modified(etag(version))
+            await room.hub.wait_notify(remaining)
+    status = room.status()
+    if status is None:
+        raise HTTPException(status_code=503, detail="Sensor daemon not running")
+    STATUS_RESPONSES["full"].inc()
+    return json_response(request, status, etag(status["version"]))
+
 @app.get("/status")
-def get_status():
-    audio_feats = audio_sensor.get_features()
-    video_feats = video_sensor.get_features()
-    state, confidence = classifier.predict(audio_feats, video_feats)
-    
-    return {
-        "state": state,
-        "confidence": confidence,
-        "recommendation": RECOMMENDATIONS.get(state, "No recommendation"),
-        "features": {
-            "audio": audio_feats,
-            "video": video_feats
-        },
-        "sensors": {
-            "audio": audio_sensor.running,
-            "video": video_sensor.running
+async def get_status(request: Request, wait: float = 0):
+    return await serve_status(request, "default", wait)
+
+@app.get("/rooms")
+def list_rooms():
+    rooms = {}
+    for room_id, room in manager.rooms.items():
+        status = room.status()
+        if status is None:
+            continue
+        rooms[room_id] = {
+            "state": status["state"],
+            "sensors": status["sensors"],
+            "governor": status.get("governor"),
+            "ws_clients": len(room.hub.subscribers)
         }
-    }
+    return {"rooms": rooms}
+
+@app.get("/rooms/{room_id}/status")
+async def get_room_status(request: Request, room_id: str, wait: float = 0):
+    return await serve_status(request, room_id, wait)
+
+@app.get("/discovery")
+def get_discovery():
+    # Camera / microphone probing progress while the sensors come up
+    if SENSORS_LOCAL:
+        return local_discovery()
+    document = manager.document()
+    if document is None:
+        raise HTTPException(status_code=503, detail="Sensor daemon not running")
+    return document.get("discovery", {})
+
+@app.get("/history")
+def get_history(request: Request, window: float = 3600, points: int = 300, fields: str = ""):
+    # Downsampled min/mean/max series for backfilling charts
+    require_local_sensors()
+    selected = [f for f in fields.split(",") if f] or None
+    result = history.query(window, points, selected)
+    result["window"] = window
+    result["stats"] = history.stats()
+    return json_response(request, result)
+
+@app.get("/log/query")
+def query_feature_log(request: Request, fields: str = "db", stats: str = "mean", step: int = 3600, window: float = 86400,
+                      start: float = None, end: float = None, room: str = "default"):
+    # Aggregates from the on-disk log's rollups, e.g. dB p95 per hour over
+    # the last week: /log/query?fields=db&stats=p95&step=3600&window=604800
+    # stats: count, mean, std, min, max, pNN, states (share of time per state)
+    if not FEATURE_LOG_DIR:
+        raise HTTPException(status_code=404, detail="Feature log disabled (set SENSORYNET_FEATURE_LOG)")
+    get_room(room)
+    log = recorder.log(room) if recorder else FeatureLog(os.path.join(FEATURE_LOG_DIR, room), writable=False)
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - window
+    if step <= 0 or (end - start) / step > 100000:
+        raise HTTPException(status_code=400, detail="step must be positive and give at most 100000 buckets")
+    try:
+        result = log.query([f for f in fields.split(",") if f], start, end, step, [s for s in stats.split(",") if s])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return json_response(request, result)
+
+@app.get("/metrics")
+def get_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile")
+async def debug_profile(seconds: float = 5.0, interval: float = PROFILE_INTERVAL):
+    # Samples every thread's Python stack for `seconds` and returns collapsed
+    # stacks: curl "localhost:8000/debug/profile?seconds=10" | flamegraph.pl
+    # Covers this process only; in API-worker mode, ask the daemon (port
+    # 8001) for the sensor threads.
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {PROFILE_MAX_SECONDS:g}]")
+    try:
+        counts, samples = await run_in_threadpool(sample_stacks, seconds, max(interval, 0.001), lag_monitor.thread_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(collapsed(counts), headers={"X-Profile-Samples": str(samples)})
 
 @app.post("/sensors/{sensor_type}/{action}")
 def control_sensors(sensor_type: str, action: str):
+    require_local_sensors()
     if sensor_type == "audio":
         if action == "start":
             audio_sensor.start()
@@ -84,29 +333,119 @@ def control_sensors(sensor_type: str, action: str):
             video_sensor.stop()
     return {"status": "ok"}
 
-@app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+@app.post("/classify")
+async def classify_batch(request: Request, dtype: str = "float64", distances: bool = False):
+    # Re-score recorded feature rows in one vectorized pass.
+    # JSON body: {"rows": [[rms, db, low, mid, high, brightness, motion_mag, motion_hotspots], ...]}
+    # or application/octet-stream: packed little-endian float32/float64 rows
+    if request.headers.get("content-type", "").startswith("application/octet-stream"):
+        if dtype not in ("float32", "float64"):
+            raise HTTPException(status_code=400, detail="dtype must be float32 or float64")
+        body = await request.body()
+        X = np.frombuffer(body, dtype=np.dtype(dtype).newbyteorder("<"))
+        if X.size % N_FEATURES:
+            raise HTTPException(status_code=400, detail=f"Body is not a whole number of {N_FEATURES}-feature rows")
+        X = X.reshape(-1, N_FEATURES)
+    else:
+        try:
+            X = np.asarray((await request.json())["rows"], dtype=np.float64)
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Expected JSON body with a 'rows' array")
+
+    try:
+        labels, confidences, dist = await run_in_threadpool(classifier.predict_batch, X)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = {
+        "states": classifier.labels,
+        "labels": labels.tolist(),
+        "confidences": confidences.tolist()
+    }
+    if distances:
+        result["distances"] = dist.tolist()
+    return result
+
+@app.post("/model/samples")
+async def add_samples(request: Request):
+    # Teach the classifier from labeled samples without retraining:
+    #   {"label": "Quiet"}                      label what a room sees right now
+    #   {"label": "Quiet", "room": "lab"}
+    #   {"label": "Quiet", "rows": [[...], ...]} label recorded feature rows
+    # The scaler and centroids are recomputed from running statistics, and the
+    # model file is rewritten unless "save" is false. Rooms pick the new model
+    # up on their next sensor update.
+    require_local_sensors()
+    try:
+        body = await request.json()
+        label = str(body["label"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Expected JSON body with a 'label'")
+
+    if body.get("rows") is not None:
+        try:
+            X = np.asarray(body["rows"], dtype=np.float64).reshape(-1, N_FEATURES)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail=f"'rows' must be {N_FEATURES}-feature rows")
+    else:
+        fused = get_room(body.get("room", "default")).fusion.current()
+        X = feature_vector(fused.audio.features, fused.video.features).reshape(1, -1)
+
+    def update():
+        classifier.partial_fit(X, [label] * len(X))
+        if body.get("save", True):
+            classifier.save()
+
+    await run_in_threadpool(update)
+    stats = classifier.load_stats()
+    return {
+        "label": label,
+        "added": len(X),
+        "samples": dict(zip(stats.labels, stats.class_counts.tolist())),
+        "states": classifier.labels
+    }
+
+async def serve_ws(websocket, room, proto, fields, rate, heatmap=False):
+    # Wire format is negotiated on connect, see protocol.py
     await websocket.accept()
+    try:
+        if room is None:
+            raise ValueError("Unknown room")
+        selected = parse_fields(fields)
+        if proto not in ("json", "binary"):
+            raise ValueError(f"Unknown proto '{proto}'")
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+
+    if proto == "binary":
+        encoder = BinaryEncoder(selected, classifier.states, heatmap=heatmap)
+        await websocket.send_text(encoder.schema())
+    else:
+        encoder = JsonEncoder(selected, heatmap)
+
+    sub = room.hub.subscribe(encoder, rate)
     try:
         while True:
-            audio_feats = audio_sensor.get_features()
-            video_feats = video_sensor.get_features()
-            state, confidence = classifier.predict(audio_feats, video_feats)
-            
-            payload = {
-                "timestamp": time.time(),
-                "state": state,
-                "confidence": confidence,
-                "recommendation": RECOMMENDATIONS.get(state, ""),
-                "features": {
-                    "audio": audio_feats,
-                    "video": video_feats
-                }
-            }
-            await websocket.send_json(payload)
-            await asyncio.sleep(0.5) # Update rate
+            message = await sub.get()
+            t0 = time.perf_counter()
+            if isinstance(message, bytes):
+                await websocket.send_bytes(message)
+            else:
+                await websocket.send_text(message)
+            WS_SEND_TIME.observe(time.perf_counter() - t0)
     except WebSocketDisconnect:
         print("Client disconnected")
     except Exception as e:
         print(f"WS Error: {e}")
         await websocket.close()
+    finally:
+        room.hub.unsubscribe(sub)
+
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket, proto: str = "json", fields: str = "", rate: float = 0, heatmap: bool = False):
+    await serve_ws(websocket, manager.rooms.get("default"), proto, fields, rate, heatmap)
+
+@app.websocket("/rooms/{room_id}/ws")
+async def room_websocket_endpoint(websocket: WebSocket, room_id: str, proto: str = "json", fields: str = "", rate: float = 0, heatmap: bool = False):
+    await serve_ws(websocket, manager.rooms.get(room_id), proto, fields, rate, heatmap)
@@ -1,123 +1,368 @@
 import numpy as np
-import pickle
 import os
+import copy
 import json
+import threading
+from collections import namedtuple
+from . import metrics
+from . import model_store
+
+PREDICT_TIME = metrics.stage("classify")
+
+# Model input order: [rms, db, low, mid, high, brightness, motion_mag, motion_hotspots]
+AUDIO_KEYS = ["rms", "db", "low_energy", "mid_energy", "high_energy"]
+VIDEO_KEYS = ["brightness", "motion_magnitude", "motion_hotspots"]
+N_FEATURES = len(AUDIO_KEYS) + len(VIDEO_KEYS)
+
+# Rows per vectorized step in predict_batch; bounds the (rows, states, features)
+# temporary to a few MB regardless of batch size
+BATCH_CHUNK = 16384
+
+# Binary model (see model_store.py); model.json is still read if this is missing
+MODEL_PATH = "model.npz"
+# Rows per class assumed for models saved without training statistics
+# (train_demo used 50)
+LEGACY_CLASS_COUNT = 50
+# What predict() needs from model.npz; the rest is training statistics
+MODEL_ARRAYS = ("labels", "centroids", "scaler_mean", "scaler_scale")
+
+# Demo model: one typical reading per class
+# [rms, db, low, mid, high, brightness, motion_mag, motion_hotspots]
+DEMO_PROTOTYPES = {
+    "Quiet": [0.01, 20, 10, 5, 2, 100, 0, 0],
+    # High RMS, broad spectrum
+    "Noisy": [0.5, 80, 500, 500, 500, 100, 5, 1],
+    "Silent": [0.001, 10, 1, 0, 0, 100, 0, 0],
+    # Mid band energy, varying RMS
+    "Conversation": [0.2, 60, 100, 800, 100, 100, 2, 1],
+    # Dark, silent
+    "Sleepy": [0.005, 15, 2, 1, 0, 20, 0, 0],
+}
+
+# What predict() reads, swapped in with one assignment so a concurrent
+# partial_fit() can't pair a new scaler or label list with old centroids.
+# labels[i] <-> centroid_matrix[i]; centroid_matrix is None until trained.
+ModelState = namedtuple("ModelState", "labels centroid_matrix scaler_mean scaler_scale")
+EMPTY_STATE = ModelState((), None, None, None)
+
+def feature_vector(audio_feats, video_feats):
+    return np.array([audio_feats.get(k, 0) for k in AUDIO_KEYS] +
+                    [video_feats.get(k, 0) for k in VIDEO_KEYS], dtype=np.float64)
+
+class ModelStats:
+    # Sufficient statistics for the nearest-centroid model: global count /
+    # mean / M2 for the scaler and per-class raw sums for the centroids.
+    # Chunks are merged exactly (Chan et al.), so training is one pass in
+    # constant memory and new samples can be folded in at any time.
+    def __init__(self, n_features=N_FEATURES):
+        self.n_features = n_features
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.labels = []
+        self.class_counts = np.zeros(0, dtype=np.int64)
+        self.class_sums = np.zeros((0, n_features))
+
+    def update(self, X, labels):
+        X = np.asarray(X, dtype=np.float64)
+        labels = np.asarray(labels)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected rows of {self.n_features} features, got shape {X.shape}")
+        if len(labels) != len(X):
+            raise ValueError(f"Got {len(X)} rows but {len(labels)} labels")
+        n = len(X)
+        if n == 0:
+            return
+
+        # Global moments
+        chunk_mean = X.mean(axis=0)
+        chunk_m2 = ((X - chunk_mean) ** 2).sum(axis=0)
+        delta = chunk_mean - self.mean
+        total = self.count + n
+        self.mean += delta * (n / total)
+        self.m2 += chunk_m2 + delta ** 2 * (self.count * n / total)
+        self.count = total
+
+        # Per-class sums, one bincount per feature
+        names, inverse = np.unique(labels.astype(str), return_inverse=True)
+        index = np.array([self._class_index(name) for name in names.tolist()])
+        rows = index[inverse]
+        k = len(self.labels)
+        self.class_counts += np.bincount(rows, minlength=k)
+        for f in range(self.n_features):
+            self.class_sums[:, f] += np.bincount(rows, weights=X[:, f], minlength=k)
+
+    def _class_index(self, name):
+        if name not in self.labels:
+            self.labels.append(name)
+            self.class_counts = np.append(self.class_counts, 0)
+            self.class_sums = np.vstack([self.class_sums, np.zeros(self.n_features)])
+        return self.labels.index(name)
+
+    def scaler(self):
+        # Same as np.mean / np.std (ddof=0) over every row seen
+        scale = np.sqrt(self.m2 / max(self.count, 1))
+        scale[scale == 0] = 1.0
+        return self.mean.copy(), scale
+
+    def centroids(self):
+        # Scaled-space class means, skipping classes with no samples
+        mean, scale = self.scaler()
+        seen = self.class_counts > 0
+        raw = self.class_sums[seen] / self.class_counts[seen, None]
+        labels = [l for l, s in zip(self.labels, seen) if s]
+        return labels, (raw - mean) / scale
+
+    def to_arrays(self):
+        return {
+            "stats_count": np.array([self.count], dtype=np.int64),
+            "stats_mean": self.mean,
+            "stats_m2": self.m2,
+            "stats_labels": np.array(self.labels, dtype=str),
+            "stats_class_counts": self.class_counts,
+            "stats_class_sums": self.class_sums,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        stats = cls(len(arrays["stats_mean"]))
+        stats.count = int(arrays["stats_count"][0])
+        stats.mean = np.array(arrays["stats_mean"], dtype=np.float64)
+        stats.m2 = np.array(arrays["stats_m2"], dtype=np.float64)
+        stats.labels = [str(l) for l in arrays["stats_labels"]]
+        stats.class_counts = np.array(arrays["stats_class_counts"], dtype=np.int64)
+        stats.class_sums = np.array(arrays["stats_class_sums"], dtype=np.float64).reshape(-1, stats.n_features)
+        return stats
+
+    @classmethod
+    def from_model(cls, labels, centroids, mean, scale, per_class):
+        # Older models only kept centroids and the scaler. Pretend each class
+        # was seen `per_class` times at its centroid and the global spread
+        # was exactly the scaler; for the demo model (50 rows per class)
+        # this reproduces the original statistics.
+        stats = cls(len(mean))
+        stats.labels = list(labels)
+        stats.count = per_class * len(labels)
+        stats.mean = np.array(mean, dtype=np.float64)
+        stats.m2 = np.array(scale, dtype=np.float64) ** 2 * stats.count
+        stats.class_counts = np.full(len(labels), per_class, dtype=np.int64)
+        stats.class_sums = (np.asarray(centroids) * scale + mean) * per_class
+        return stats
 
 class EnvironmentClassifier:
-    def __init__(self, model_path="model.json"):
+    def __init__(self, model_path=MODEL_PATH, load=True, read_only=False):
         self.model_path = model_path
-        self.centroids = {}
-        self.scaler_mean = None
-        self.scaler_scale = None
+        # read_only: load whatever model exists but never train or save one,
+        # and keep it in memory rather than mapped so its owner can replace
+        # the file (API workers following the sensor daemon)
+        self.read_only = read_only
+        self.state = EMPTY_STATE
+        # What the centroids were computed from; partial_fit() adds to it
+        self.stats = None
+        self.stats_path = None
+        self.lock = threading.Lock()
         self.states = ["Quiet", "Noisy", "Crowded", "Silent", "Windy", "Conversation", "TV/Media", "Sleepy"]
-        
-        self.load_or_train_demo()
+
+        if load:
+            self.load_or_train_demo()
 
     def load_or_train_demo(self):
-        if os.path.exists(self.model_path):
+        path = self.model_path
+        if not os.path.exists(path):
+            # Older installs only have model.json next to where model.npz goes
+            legacy = os.path.splitext(path)[0] + ".json"
+            path = legacy if os.path.exists(legacy) else None
+        if path is not None:
             try:
-                with open(self.model_path, "r") as f:
-                    data = json.load(f)
-                    self.centroids = {k: np.array(v) for k, v in data["centroids"].items()}
-                    self.scaler_mean = np.array(data["scaler_mean"])
-                    self.scaler_scale = np.array(data["scaler_scale"])
-                    print("Loaded existing model.")
+                if path.endswith(".npz"):
+                    self._load_npz(path)
+                else:
+                    self._load_json(path)
+                print(f"Loaded existing model ({path}).")
             except Exception as e:
                 print(f"Error loading model: {e}")
+                path = None
+        if path is None:
+            if self.read_only:
+                print(f"No model at {self.model_path}; classifier stays untrained.")
+            else:
                 self.train_demo()
+
+    # Read-only views of the current state
+    @property
+    def labels(self):
+        return list(self.state.labels)
+
+    @property
+    def centroid_matrix(self):
+        return self.state.centroid_matrix
+
+    @property
+    def scaler_mean(self):
+        return self.state.scaler_mean
+
+    @property
+    def scaler_scale(self):
+        return self.state.scaler_scale
+
+    @property
+    def centroids(self):
+        state = self.state
+        if state.centroid_matrix is None:
+            return {}
+        return dict(zip(state.labels, state.centroid_matrix))
+
+    def _set_model(self, labels, centroids, mean, scale):
+        labels = tuple(labels)
+        matrix = np.stack([np.asarray(c) for c in centroids]) if labels else None
+        for label in labels:
+            if label not in self.states:
+                self.states.append(label)
+        self.state = ModelState(labels, matrix, mean, scale)
+
+    def _load_json(self, path):
+        with open(path, "r") as f:
+            data = json.load(f)
+        labels = list(data["centroids"])
+        centroids = [np.array(data["centroids"][k]) for k in labels]
+        mean = np.array(data["scaler_mean"])
+        scale = np.array(data["scaler_scale"])
+        if "stats" in data:
+            self.stats = ModelStats.from_arrays({k: np.array(v) for k, v in data["stats"].items()})
         else:
-            self.train_demo()
+            self.stats = ModelStats.from_model(labels, centroids, mean, scale, LEGACY_CLASS_COUNT)
+        self._set_model(labels, centroids, mean, scale)
+
+    def _load_npz(self, path):
+        arrays = model_store.load_npz(path, MODEL_ARRAYS, mmap=not self.read_only)
+        labels = [str(l) for l in arrays["labels"]]
+        # centroids stays a view into the mapped file
+        self.state = ModelState(tuple(labels), arrays["centroids"] if labels else None,
+                                arrays["scaler_mean"], arrays["scaler_scale"])
+        # Only partial_fit() needs the training statistics
+        self.stats = None
+        self.stats_path = path
+
+    def load_stats(self):
+        if self.stats is None and self.stats_path is not None:
+            arrays = model_store.load_npz(self.stats_path, mmap=not self.read_only)
+            if "stats_count" in arrays:
+                self.stats = ModelStats.from_arrays(arrays)
+            else:
+                state = self.state
+                self.stats = ModelStats.from_model(state.labels, state.centroid_matrix, state.scaler_mean,
+                                                   state.scaler_scale, LEGACY_CLASS_COUNT)
+        return self.stats
+
+    def set_stats(self, stats):
+        # Recompute the scaler and centroids from accumulated statistics
+        labels, centroids = stats.centroids()
+        mean, scale = stats.scaler()
+        self.stats = stats
+        self._set_model(labels, centroids, mean, scale)
+
+    def partial_fit(self, X, labels):
+        # Fold newly labeled rows into the model; same result as retraining
+        # on everything seen so far
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        with self.lock:
+            stats = self.load_stats()
+            stats = copy.deepcopy(stats) if stats is not None else ModelStats()
+            stats.update(X, labels)
+            self.set_stats(stats)
+
+    def save(self, path=None):
+        path = path or self.model_path
+        with self.lock:
+            # Release any mapping of the file about to be replaced
+            state = self.state = ModelState(*map(model_store.unmap, self.state))
+            if path.endswith(".npz"):
+                arrays = {
+                    "labels": np.array(state.labels, dtype=str),
+                    "centroids": np.asarray(state.centroid_matrix),
+                    "scaler_mean": np.asarray(state.scaler_mean),
+                    "scaler_scale": np.asarray(state.scaler_scale),
+                }
+                if self.load_stats() is not None:
+                    arrays.update(self.stats.to_arrays())
+                model_store.save_npz(path, arrays)
+            else:
+                # Portable fallback, readable by older versions
+                data = {
+                    "centroids": {k: np.asarray(v).tolist() for k, v in zip(state.labels, state.centroid_matrix)},
+                    "scaler_mean": np.asarray(state.scaler_mean).tolist(),
+                    "scaler_scale": np.asarray(state.scaler_scale).tolist()
+                }
+                if self.load_stats() is not None:
+                    data["stats"] = {k: v.tolist() for k, v in self.stats.to_arrays().items()}
+                with open(path, "w") as f:
+                    json.dump(data, f)
 
     def train_demo(self):
         print("Training demo model (Lightweight)...")
-        # Features: [rms, db, low, mid, high, brightness, motion_mag, motion_hotspots]
+        # 50 identical rows per class, as the original demo did
         X = []
         y = []
-        
-        # 1. Quiet
-        for _ in range(50):
-            X.append([0.01, 20, 10, 5, 2, 100, 0, 0])
-            y.append("Quiet")
-            
-        # 2. Noisy (High RMS, broad spectrum)
-        for _ in range(50):
-            X.append([0.5, 80, 500, 500, 500, 100, 5, 1])
-            y.append("Noisy")
-            
-        # 3. Silent
-        for _ in range(50):
-            X.append([0.001, 10, 1, 0, 0, 100, 0, 0])
-            y.append("Silent")
-
-        # 4. Conversation (Mid band energy, varying RMS)
-        for _ in range(50):
-            X.append([0.2, 60, 100, 800, 100, 100, 2, 1])
-            y.append("Conversation")
-
-        # 5. Sleepy (Dark, Silent)
-        for _ in range(50):
-            X.append([0.005, 15, 2, 1, 0, 20, 0, 0])
-            y.append("Sleepy")
-
-        X = np.array(X)
-        
-        # Simple Standard Scaler
-        self.scaler_mean = np.mean(X, axis=0)
-        self.scaler_scale = np.std(X, axis=0)
-        self.scaler_scale[self.scaler_scale == 0] = 1.0 # Avoid divide by zero
-        
-        X_scaled = (X - self.scaler_mean) / self.scaler_scale
-        
-        # Calculate centroids
-        self.centroids = {}
-        unique_classes = set(y)
-        for cls in unique_classes:
-            indices = [i for i, label in enumerate(y) if label == cls]
-            class_samples = X_scaled[indices]
-            self.centroids[cls] = np.mean(class_samples, axis=0)
-        
-        # Save as JSON (portable)
-        data = {
-            "centroids": {k: v.tolist() for k, v in self.centroids.items()},
-            "scaler_mean": self.scaler_mean.tolist(),
-            "scaler_scale": self.scaler_scale.tolist()
-        }
-        with open(self.model_path, "w") as f:
-            json.dump(data, f)
+        for label, row in DEMO_PROTOTYPES.items():
+            X.extend([row] * 50)
+            y.extend([label] * 50)
+
+        # Same standard scaler + per-class centroids as before, via the
+        # streaming statistics
+        stats = ModelStats()
+        stats.update(np.array(X), y)
+        self.set_stats(stats)
+        self.save()
         print("Demo model trained and saved.")
 
     def predict(self, audio_feats, video_feats):
+        with PREDICT_TIME.time():
+            return self._predict(audio_feats, video_feats)
+
+    def _predict(self, audio_feats, video_feats):
         # Combine features
         # [rms, db, low, mid, high, brightness, motion_mag, motion_hotspots]
-        features = np.array([
-            audio_feats.get("rms", 0),
-            audio_feats.get("db", 0),
-            audio_feats.get("low_energy", 0),
-            audio_feats.get("mid_energy", 0),
-            audio_feats.get("high_energy", 0),
-            video_feats.get("brightness", 0),
-            video_feats.get("motion_magnitude", 0),
-            video_feats.get("motion_hotspots", 0)
-        ])
+        features = feature_vector(audio_feats, video_feats)
+        state = self.state
         
-        if self.scaler_mean is None:
+        if state.scaler_mean is None or state.centroid_matrix is None:
             return "Unknown", 0.0
 
-        features_scaled = (features - self.scaler_mean) / self.scaler_scale
-        
-        best_state = "Unknown"
-        min_dist = float("inf")
+        features_scaled = (features - state.scaler_mean) / state.scaler_scale
         
-        # Find nearest centroid
-        distances = {}
-        for state, centroid in self.centroids.items():
-            dist = np.linalg.norm(features_scaled - centroid)
-            distances[state] = dist
-            if dist < min_dist:
-                min_dist = dist
-                best_state = state
+        # Find nearest centroid (all states in one vectorized step)
+        distances = np.linalg.norm(state.centroid_matrix - features_scaled, axis=1)
+        best = int(np.argmin(distances))
+        min_dist = float(distances[best])
         
         # Pseudo-confidence (1 / (1 + dist))
         confidence = 1.0 / (1.0 + min_dist)
         
-        return best_state, confidence
+        return state.labels[best], confidence
+
+    def predict_batch(self, X):
+        # X: (N, 8) raw feature rows in feature_vector() order.
+        # Returns (labels[N], confidences[N], distances[N, n_states]); the
+        # distance columns follow the labels of the state used.
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != N_FEATURES:
+            raise ValueError(f"Expected rows of {N_FEATURES} features, got shape {X.shape}")
+        state = self.state
+        if state.scaler_mean is None or state.centroid_matrix is None:
+            raise ValueError("Classifier has no trained model")
+
+        n = X.shape[0]
+        distances = np.empty((n, len(state.labels)), dtype=np.float64)
+        for start in range(0, n, BATCH_CHUNK):
+            chunk = (X[start:start + BATCH_CHUNK] - state.scaler_mean) / state.scaler_scale
+            diff = chunk[:, None, :] - state.centroid_matrix[None, :, :]
+            distances[start:start + BATCH_CHUNK] = np.sqrt(np.einsum("nkf,nkf->nk", diff, diff))
+
+        best = np.argmin(distances, axis=1)
+        labels = np.asarray(state.labels)[best]
+        confidences = 1.0 / (1.0 + distances[np.arange(n), best])
+        return labels, confidences, distances
@@ -0,0 +1,84 @@
+import math
+import os
+import struct
+import tempfile
+import zipfile
+import numpy as np
+
+# Binary model files. np.savez (uncompressed) stores each array as a plain
+# .npy member of a zip, so instead of inflating members we find where each
+# one's data starts and np.memmap it: loading is a zip directory read plus
+# one small header parse per array, independent of model size.
+
+# Fixed part of a zip local file header; name / extra lengths at bytes 26-29
+ZIP_LOCAL_HEADER = 30
+
+
+def save_npz(path, arrays):
+    # Write to a temp file and rename, so a running server never maps a
+    # half-written model. The temp name is unique, so concurrent writers
+    # never share one. Windows refuses to replace a file that is still
+    # mapped: callers holding load_npz() views of `path` unmap() them first.
+    tmp = tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)),
+                                      prefix=os.path.basename(path) + ".", suffix=".tmp", delete=False)
+    try:
+        with tmp:
+            np.savez(tmp, **arrays)
+        os.replace(tmp.name, path)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+
+
+def unmap(value):
+    # In-memory copy of a load_npz() view; anything else is returned as is
+    base = value
+    while base is not None:
+        if isinstance(base, np.memmap):
+            return np.array(value)
+        base = getattr(base, "base", None)
+    return value
+
+
+def _member_offset(f, info):
+    f.seek(info.header_offset)
+    local = f.read(ZIP_LOCAL_HEADER)
+    name_len, extra_len = struct.unpack("<HH", local[26:30])
+    return info.header_offset + ZIP_LOCAL_HEADER + name_len + extra_len
+
+
+def load_npz(path, names=None, mmap=True):
+    # {name: array} for `names` (default all); members are memory-mapped
+    # read-only when stored uncompressed, otherwise (np.savez_compressed)
+    # read normally
+    if not mmap:
+        with np.load(path, allow_pickle=False) as data:
+            return {name: data[name] for name in data.files if names is None or name in names}
+
+    arrays = {}
+    # One mapping for the whole file; every member is a view into it
+    mapped = np.memmap(path, dtype=np.uint8, mode="r")
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            if not info.filename.endswith(".npy"):
+                continue
+            name = info.filename[:-4]
+            if names is not None and name not in names:
+                continue
+            if info.compress_type != zipfile.ZIP_STORED:
+                with zf.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+                continue
+            f.seek(_member_offset(f, info))
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                raise ValueError(f"{path}: array '{name}' holds Python objects")
+            start = f.tell()
+            count = math.prod(shape)
+            data = mapped[start:start + count * dtype.itemsize].view(dtype)
+            arrays[name] = data.reshape(shape, order="F" if fortran else "C")
+    return arrays
@@ -0,0 +1,206 @@
+import collections
+import cv2
+import numpy as np
+
+# A pixel counts as a hotspot when it moves more than this many pixels per
+# frame at the 320x240 analysis resolution. Every tier reports in those units
+# so motion_magnitude / motion_hotspots stay comparable when switching.
+HOTSPOT_THRESHOLD = 2.0
+
+# magnitude: mean per-pixel displacement (px/frame)
+# hotspots:  number of analysis pixels moving faster than HOTSPOT_THRESHOLD
+# field:     2-D magnitude map (may be coarser than the frame)
+# tier:      name of the estimator that produced the result
+MotionResult = collections.namedtuple("MotionResult", "magnitude hotspots field tier")
+
+# Coarse motion heatmap (columns, rows): mean displacement per grid cell
+HEATMAP_GRID = (8, 6)
+
+
+def motion_heatmap(field, grid=HEATMAP_GRID):
+    # Block-average any tier's field down to the grid, (rows, columns)
+    # float32 in px/frame. INTER_AREA is an exact block mean when the grid
+    # divides the field (320x240 -> 8x6 is 40x40 blocks) and area-weighted
+    # otherwise (the lk tier's 20x15 cells).
+    return cv2.resize(np.asarray(field, dtype=np.float32), tuple(grid), interpolation=cv2.INTER_AREA)
+
+
+class DiffMotion:
+    # Cheapest tier: frame differencing turned into normal flow.
+    #
+    # |dI/dt| / |grad I| is the displacement along the image gradient, so the
+    # result is in px/frame like the optical-flow tiers. Sensor noise is
+    # ignored. The hotspot mask is spread over the same 15 px support
+    # Farneback averages over, so hotspot areas line up with the flow tiers.
+    name = "diff"
+
+    def __init__(self, noise_level=6, min_gradient=4.0, max_displacement=20.0, support=15):
+        self.noise_level = noise_level
+        self.min_gradient = min_gradient
+        self.max_displacement = max_displacement
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (support, support))
+        self.changed_fraction = 0.0
+
+    def estimate(self, prev, gray):
+        prev_b = cv2.GaussianBlur(prev, (5, 5), 0)
+        gray_b = cv2.GaussianBlur(gray, (5, 5), 0)
+
+        diff = cv2.absdiff(prev_b, gray_b)
+        changed = diff > self.noise_level
+        self.changed_fraction = float(np.count_nonzero(changed)) / changed.size
+
+        if not self.changed_fraction:
+            field = np.zeros(gray.shape, dtype=np.float32)
+            return MotionResult(0.0, 0, field, self.name)
+
+        # A 3x3 Sobel response is 8x the per-pixel intensity gradient
+        gx = cv2.Sobel(gray_b, cv2.CV_32F, 1, 0, ksize=3, scale=0.125)
+        gy = cv2.Sobel(gray_b, cv2.CV_32F, 0, 1, ksize=3, scale=0.125)
+        grad = cv2.magnitude(gx, gy)
+
+        field = diff.astype(np.float32)
+        np.divide(field, np.maximum(grad, self.min_gradient), out=field)
+        field[~changed] = 0.0
+        np.minimum(field, self.max_displacement, out=field)
+
+        moving = cv2.dilate((field > HOTSPOT_THRESHOLD).view(np.uint8), self.kernel)
+        return MotionResult(float(field.mean()), int(np.count_nonzero(moving)), field, self.name)
+
+
+class FarnebackMotion:
+    # Dense Farneback at full analysis resolution (the original behaviour)
+    name = "farneback"
+
+    def estimate(self, prev, gray):
+        flow = cv2.calcOpticalFlowFarneback(prev, gray, None, 0.5, 3, 15, 3, 5, 1.2, 0)
+        mag, _ = cv2.cartToPolar(flow[..., 0], flow[..., 1])
+        return MotionResult(float(np.mean(mag)), int(np.count_nonzero(mag > HOTSPOT_THRESHOLD)), mag, self.name)
+
+
+class PyramidFarnebackMotion:
+    # Farneback on a pyrDown'd pair: ~1/4 of the pixels and one level fewer.
+    # Displacements are scaled back up and hotspot counts are re-expressed in
+    # full-resolution pixels. Matches Farneback (1.0x) on textured motion;
+    # on flat, untextured objects the wider effective window fills more of
+    # their interior and reads up to ~1.5x.
+    name = "pyramid"
+
+    def __init__(self, downscale_levels=1):
+        self.downscale_levels = downscale_levels
+        self.factor = 2 ** downscale_levels
+
+    def estimate(self, prev, gray):
+        for _ in range(self.downscale_levels):
+            prev = cv2.pyrDown(prev)
+            gray = cv2.pyrDown(gray)
+
+        flow = cv2.calcOpticalFlowFarneback(prev, gray, None, 0.5, 2, 9, 3, 5, 1.1, 0)
+        mag, _ = cv2.cartToPolar(flow[..., 0], flow[..., 1])
+        mag *= self.factor
+
+        hotspots = int(np.count_nonzero(mag > HOTSPOT_THRESHOLD)) * self.factor * self.factor
+        return MotionResult(float(np.mean(mag)), hotspots, mag, self.name)
+
+
+class LucasKanadeMotion:
+    # Sparse pyramidal Lucas-Kanade on corners carried over between frames.
+    # Corners are re-detected every `redetect_every` frames, or sooner when
+    # too many have been lost; carried-over corners settle on the static
+    # background, and something that starts moving later would go unseen.
+    # Point magnitudes are averaged per cell into a coarse field, which
+    # stands in for the dense one. Against Farneback: ~0.8x magnitude on
+    # moving objects, 1.0x on a pan (benchmark.py --only motion).
+    name = "lk"
+
+    def __init__(self, max_corners=200, min_corners=50, cell=16, redetect_every=10):
+        self.max_corners = max_corners
+        self.min_corners = min_corners
+        self.cell = cell
+        self.redetect_every = redetect_every
+        self.points = None
+        self._age = 0
+
+    def estimate(self, prev, gray):
+        h, w = gray.shape
+        gh, gw = max(1, h // self.cell), max(1, w // self.cell)
+
+        self._age += 1
+        if self.points is None or len(self.points) < self.min_corners or self._age >= self.redetect_every:
+            self.points = cv2.goodFeaturesToTrack(prev, self.max_corners, 0.01, 8)
+            self._age = 0
+
+        if self.points is None or not len(self.points):
+            self.points = None
+            return MotionResult(0.0, 0, np.zeros((gh, gw), dtype=np.float32), self.name)
+
+        nxt, status, _ = cv2.calcOpticalFlowPyrLK(prev, gray, self.points, None, winSize=(15, 15), maxLevel=2)
+        ok = status.ravel() == 1
+        p0 = self.points[ok].reshape(-1, 2)
+        p1 = nxt[ok].reshape(-1, 2)
+        self.points = p1.reshape(-1, 1, 2)
+
+        if not len(p0):
+            return MotionResult(0.0, 0, np.zeros((gh, gw), dtype=np.float32), self.name)
+
+        mags = np.linalg.norm(p1 - p0, axis=1)
+
+        # Coarse field: mean point magnitude per cell
+        cx = np.clip((p0[:, 0] / self.cell).astype(int), 0, gw - 1)
+        cy = np.clip((p0[:, 1] / self.cell).astype(int), 0, gh - 1)
+        idx = cy * gw + cx
+        sums = np.bincount(idx, weights=mags, minlength=gh * gw)
+        counts = np.bincount(idx, minlength=gh * gw)
+        field = (sums / np.maximum(counts, 1)).astype(np.float32).reshape(gh, gw)
+
+        # Dense-equivalent: corners cluster on moving edges, so averaging
+        # points over-reports motion (~2x Farneback on a static camera).
+        # Average cells instead, filling cells without a corner with the
+        # median sampled cell (the background: ~0 for a still camera, the
+        # pan speed when the camera moves).
+        sampled = counts > 0
+        field = field.ravel()
+        field[~sampled] = np.median(field[sampled])
+        field = field.reshape(gh, gw)
+        hotspots = int(round(np.mean(field > HOTSPOT_THRESHOLD) * h * w))
+        return MotionResult(float(field.mean()), hotspots, field, self.name)
+
+
+class AutoMotion:
+    # Runs the cheap tier every frame and escalates to the expensive tier
+    # only while the cheap tier sees change. Stays escalated for `hold`
+    # frames after the last change to avoid flapping.
+    name = "auto"
+
+    def __init__(self, cheap=None, expensive=None, change_threshold=0.002, hold=5):
+        self.cheap = cheap or DiffMotion()
+        self.expensive = expensive or PyramidFarnebackMotion()
+        self.change_threshold = change_threshold
+        self.hold = hold
+        self._hold_left = 0
+
+    def estimate(self, prev, gray):
+        result = self.cheap.estimate(prev, gray)
+
+        if self.cheap.changed_fraction > self.change_threshold:
+            self._hold_left = self.hold
+        elif self._hold_left > 0:
+            self._hold_left -= 1
+        else:
+            return result
+
+        return self.expensive.estimate(prev, gray)
+
+
+MOTION_TIERS = {
+    "diff": DiffMotion,
+    "farneback": FarnebackMotion,
+    "pyramid": PyramidFarnebackMotion,
+    "lk": LucasKanadeMotion,
+    "auto": AutoMotion,
+}
+
+
+def create_motion_estimator(name="auto"):
+    if name not in MOTION_TIERS:
+        raise ValueError(f"Unknown motion tier '{name}' (choose from {', '.join(MOTION_TIERS)})")
+    return MOTION_TIERS[name]()
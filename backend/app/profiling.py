@@ -0,0 +1,120 @@
+import asyncio
+import collections
+import sys
+import threading
+import time
+from . import metrics
+
+# Tools for finding out why the backend stutters:
+#   LoopLagMonitor  always on; one timer per LAG_INTERVAL on the event loop,
+#                   recording how late it fires (= how long something held
+#                   the loop)
+#   sample_stacks   only while /debug/profile runs; samples the Python stack
+#                   of every thread (sensor loops, audio callback, event loop,
+#                   worker pool) into collapsed stacks for flamegraph.pl /
+#                   speedscope
+# Nothing is hooked into the interpreter (no sys.setprofile / settrace), so
+# threads that are not being sampled run at full speed.
+LAG_INTERVAL = 0.1
+# Print a warning when the loop was blocked at least this long
+LAG_WARN = 0.25
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LOOP_LAG = metrics.REGISTRY.register(metrics.Histogram(
+    "sensorynet_event_loop_lag_seconds", "How late event loop timers fire", buckets=LAG_BUCKETS))
+
+# 200 Hz: a 10 s profile is 2000 samples at ~1-2% of one core
+PROFILE_INTERVAL = 0.005
+PROFILE_MAX_SECONDS = 60.0
+
+# One profile at a time, whoever asks
+_profile_lock = threading.Lock()
+
+
+class LoopLagMonitor:
+    def __init__(self, interval=LAG_INTERVAL, warn=LAG_WARN):
+        self.interval = interval
+        self.warn = warn
+        self.task = None
+        # Thread running the loop, labelled "event-loop" in profiles
+        self.thread_id = None
+        self.last = 0.0
+        self.max = 0.0
+
+    def start(self):
+        if self.task is not None:
+            return
+        self.thread_id = threading.get_ident()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            LOOP_LAG.observe(lag)
+            self.last = lag
+            self.max = max(self.max, lag)
+            if lag >= self.warn:
+                print(f"LoopLagMonitor: Event loop blocked for {lag * 1000:.0f} ms")
+
+
+def _frame_label(code):
+    # "function (package/file.py:first line)": one node per function, not
+    # per line, so samples from the same call merge
+    path = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds, interval=PROFILE_INTERVAL, loop_thread=None):
+    # Blocks for `seconds`, so call it from a worker thread. Returns
+    # ({"thread;outer;...;inner": samples}, sample count). Threads outside
+    # Python code (PortAudio between callbacks, a worker inside a NumPy or
+    # OpenCV call) show their innermost Python frame.
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    try:
+        me = threading.get_ident()
+        counts = collections.Counter()
+        labels = {}
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            if loop_thread is not None:
+                names[loop_thread] = "event-loop"
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                # Native threads calling into Python (the audio callback)
+                # have no threading.Thread
+                stack.append(names.get(ident, f"native-{ident}"))
+                counts[";".join(reversed(stack))] += 1
+            samples += 1
+            time.sleep(interval)
+        return counts, samples
+    finally:
+        _profile_lock.release()
+
+
+def collapsed(counts):
+    # Brendan Gregg's folded format: "frame;frame;frame count" per line
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
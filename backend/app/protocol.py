@@ -0,0 +1,251 @@
+import base64
+import json
+import struct
+import numpy as np
+from .history import AUDIO_FIELDS, VIDEO_FIELDS
+
+# /ws wire formats.
+#
+# Negotiated with query parameters on connect:
+#   /ws                                  plain JSON, every field (default)
+#   /ws?fields=db,brightness&rate=2      JSON subset, at most 2 updates/s
+#   /ws?proto=binary&fields=...&rate=... packed binary frames
+#   /ws?heatmap=1                        also stream the motion heatmap
+#
+# Binary clients first receive a JSON text "schema" message, then a JSON text
+# "recommendation" message whenever the state changes, and otherwise only
+# binary frames:
+#
+#   header  <BBHIdfI  (24 bytes, little-endian)
+#     u8   frame type    1 = keyframe (every field), 2 = delta (changed fields)
+#     u8   state index   into schema["states"], 255 = unknown
+#     u16  reserved
+#     u32  hub tick number (gaps mean skipped or dropped frames)
+#     f64  timestamp     (unix seconds)
+#     f32  confidence
+#     u32  field mask    bit i set -> schema["fields"][i] follows
+#   body    one f32 per set mask bit, in schema field order
+#
+# With heatmap=1, binary clients also get frame type 3 whenever the motion
+# heatmap changes (and with every keyframe): the same header with
+# mask = columns | rows << 16, then one u8 per cell, row-major, in steps of
+# schema["heatmap_scale"] px/frame. JSON clients get payload["heatmap"] as
+# produced by pack_heatmap().
+
+PROTOCOL_VERSION = 1
+FIELDS = AUDIO_FIELDS + VIDEO_FIELDS
+HEADER = struct.Struct("<BBHIdfI")
+KEYFRAME = 1
+DELTA = 2
+HEATMAP = 3
+UNKNOWN_STATE = 255
+# Every tick divisible by this is a keyframe for everyone (so clients in step
+# share it), and no client goes more than this many frames without one, even
+# if its rate limit skips those ticks; new or resyncing clients get one
+# immediately
+KEYFRAME_INTERVAL = 20
+# px/frame per heatmap step: u8 cells cover 0-12.75 px/frame
+HEATMAP_SCALE = 0.05
+
+
+def parse_fields(spec):
+    # "db,brightness" -> ["db", "brightness"]; empty -> None (all fields)
+    fields = [f.strip() for f in (spec or "").split(",") if f.strip()]
+    unknown = [f for f in fields if f not in FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields or None
+
+
+def pack_heatmap(cells):
+    # (rows, columns) float heatmap -> JSON-safe dict with the u8 cells as
+    # base64, so it also survives the daemon's shared-state document
+    if cells is None:
+        return None
+    quantized = np.minimum(np.rint(cells / HEATMAP_SCALE), 255).astype(np.uint8)
+    return {
+        "cols": int(cells.shape[1]),
+        "rows": int(cells.shape[0]),
+        "scale": HEATMAP_SCALE,
+        "cells": base64.b64encode(quantized.tobytes()).decode("ascii"),
+    }
+
+
+def unpack_heatmap(packed):
+    # Inverse of pack_heatmap(): (rows, columns) float32 in px/frame
+    cells = np.frombuffer(base64.b64decode(packed["cells"]), dtype=np.uint8)
+    return cells.reshape(packed["rows"], packed["cols"]).astype(np.float32) * packed["scale"]
+
+
+def tick_vector(payload, shared):
+    # Every subscribed field for this tick as one float32 array; computed
+    # once per tick and shared by all binary clients
+    vector = shared.get("vector")
+    if vector is None:
+        audio = payload["features"]["audio"]
+        video = payload["features"]["video"]
+        vector = np.array([audio.get(f, video.get(f, 0.0)) for f in FIELDS], dtype=np.float32)
+        shared["vector"] = vector
+    return vector
+
+
+class JsonEncoder:
+    # Stateless; every client with the same field subset shares one string
+    stateful = False
+
+    def __init__(self, fields=None, heatmap=False):
+        self.fields = fields
+        self.heatmap = heatmap
+        self.key = ("json:" + ",".join(fields) if fields else "json") + (":heatmap" if heatmap else "")
+
+    def resync(self):
+        pass
+
+    def encode(self, payload, shared):
+        message = shared.get(self.key)
+        if message is None:
+            if not self.heatmap and "heatmap" in payload:
+                payload = {k: v for k, v in payload.items() if k != "heatmap"}
+            if self.fields:
+                payload = dict(payload)
+                payload["features"] = {
+                    "audio": {k: v for k, v in payload["features"]["audio"].items() if k in self.fields},
+                    "video": {k: v for k, v in payload["features"]["video"].items() if k in self.fields},
+                }
+            message = json.dumps(payload, separators=(",", ":"))
+            shared[self.key] = message
+        return [message]
+
+
+class BinaryEncoder:
+    # Per-client state is just the last tick/state sent. The frame bytes only
+    # depend on (fields, previous tick, current tick), so clients that are in
+    # step share one encoded frame per tick.
+    stateful = True
+
+    def __init__(self, fields=None, states=None, keyframe_interval=KEYFRAME_INTERVAL, heatmap=False):
+        self.fields = fields or list(FIELDS)
+        self.fields_key = ",".join(self.fields)
+        self.index = np.array([FIELDS.index(f) for f in self.fields])
+        self.bits = 1 << np.arange(len(self.fields), dtype=np.int64)
+        self.states = list(states or [])
+        self.keyframe_interval = keyframe_interval
+        self.heatmap = heatmap
+        self.last_tick = None
+        self.last_values = None
+        self.last_state = None
+        self.last_heatmap = None
+        # Frames this client got since its last keyframe
+        self.since_keyframe = 0
+
+    def schema(self):
+        return json.dumps({
+            "type": "schema",
+            "proto": "binary",
+            "version": PROTOCOL_VERSION,
+            "header": HEADER.format,
+            "fields": self.fields,
+            "states": self.states,
+            "heatmap_scale": HEATMAP_SCALE if self.heatmap else None,
+        })
+
+    def resync(self):
+        # A queued frame was dropped: next frame must be a keyframe and the
+        # current recommendation must be re-sent
+        self.last_tick = None
+        self.last_values = None
+        self.last_state = None
+        self.last_heatmap = None
+
+    def encode(self, payload, shared):
+        messages = []
+        tick = shared.get("tick", 0)
+        state = payload["state"]
+        if state != self.last_state:
+            self.last_state = state
+            key = ("recommendation", state)
+            if key not in shared:
+                shared[key] = json.dumps({
+                    "type": "recommendation",
+                    "state": state,
+                    "recommendation": payload.get("recommendation", ""),
+                })
+            messages.append(shared[key])
+
+        keyframe = (self.last_values is None or tick % self.keyframe_interval == 0
+                    or self.since_keyframe >= self.keyframe_interval - 1)
+        key = ("binary", self.fields_key, None if keyframe else self.last_tick)
+        cached = shared.get(key)
+        if cached is None:
+            values = tick_vector(payload, shared)[self.index]
+            if keyframe:
+                frame_type = KEYFRAME
+                mask = (1 << len(self.fields)) - 1
+                body = values
+            else:
+                frame_type = DELTA
+                changed = values != self.last_values
+                mask = int(np.dot(changed, self.bits))
+                body = values[changed]
+
+            try:
+                state_idx = self.states.index(state)
+            except ValueError:
+                state_idx = UNKNOWN_STATE
+
+            header = HEADER.pack(frame_type, state_idx, 0, tick & 0xFFFFFFFF,
+                                 payload["timestamp"], payload["confidence"], mask)
+            cached = (header + body.astype("<f4").tobytes(), values)
+            shared[key] = cached
+
+        frame, self.last_values = cached
+        self.last_tick = tick
+        self.since_keyframe = 0 if keyframe else self.since_keyframe + 1
+        messages.append(frame)
+
+        packed = payload.get("heatmap") if self.heatmap else None
+        if packed is not None and (keyframe or packed["cells"] != self.last_heatmap):
+            self.last_heatmap = packed["cells"]
+            key = ("heatmap", tick)
+            if key not in shared:
+                try:
+                    state_idx = self.states.index(state)
+                except ValueError:
+                    state_idx = UNKNOWN_STATE
+                header = HEADER.pack(HEATMAP, state_idx, 0, tick & 0xFFFFFFFF, payload["timestamp"],
+                                     payload["confidence"], packed["cols"] | packed["rows"] << 16)
+                shared[key] = header + base64.b64decode(packed["cells"])
+            messages.append(shared[key])
+        return messages
+
+
+def decode_frame(data, schema, previous=None):
+    # Reference decoder for binary frames: returns a dict of the header plus
+    # current field values, carrying unchanged fields over from `previous`
+    frame_type, state_idx, _, seq, timestamp, confidence, mask = HEADER.unpack_from(data)
+    states = schema["states"]
+    if frame_type == HEATMAP:
+        cols, rows = mask & 0xFFFF, mask >> 16
+        cells = np.frombuffer(data, dtype=np.uint8, offset=HEADER.size, count=rows * cols)
+        return {
+            "type": frame_type,
+            "seq": seq,
+            "timestamp": timestamp,
+            "heatmap": cells.reshape(rows, cols).astype(np.float32) * schema["heatmap_scale"],
+        }
+    fields = schema["fields"]
+    body = np.frombuffer(data, dtype="<f4", offset=HEADER.size)
+    values = dict(previous["values"]) if previous and frame_type == DELTA else {}
+    k = 0
+    for i, name in enumerate(fields):
+        if mask & (1 << i):
+            values[name] = float(body[k])
+            k += 1
+    return {
+        "type": frame_type,
+        "seq": seq,
+        "timestamp": timestamp,
+        "state": states[state_idx] if state_idx < len(states) else None,
+        "confidence": confidence,
+        "values": values,
+    }
@@ -0,0 +1,263 @@
+import argparse
+import csv
+import os
+import struct
+import time
+import cv2
+import numpy as np
+from .audio import AudioSensor
+from .video import VideoSensor
+from .ml import EnvironmentClassifier, AUDIO_KEYS, VIDEO_KEYS
+
+# WAV (format tag, bits) -> memmap dtype. 24-bit is handled separately.
+WAV_DTYPES = {
+    (1, 8): np.uint8,
+    (1, 16): np.dtype("<i2"),
+    (1, 32): np.dtype("<i4"),
+    (3, 32): np.dtype("<f4"),
+    (3, 64): np.dtype("<f8"),
+}
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class Pacer:
+    # Sleeps so media time tracks wall-clock time. realtime=False ("max
+    # speed") never sleeps.
+    def __init__(self, realtime=True, speed=1.0):
+        self.realtime = realtime
+        self.speed = speed
+        self.start = None
+
+    def wait(self, media_time):
+        if not self.realtime:
+            return
+        if self.start is None:
+            self.start = time.perf_counter() - media_time / self.speed
+        delay = self.start + media_time / self.speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class WavSource:
+    # Memory-mapped PCM WAV reader. Only the block being converted is ever
+    # touched, so multi-hour files cost no more RAM than a live stream.
+    def __init__(self, path, realtime=True, speed=1.0, loop=False):
+        self.path = path
+        self.realtime = realtime
+        self.speed = speed
+        self.loop = loop
+
+        fmt, offset, size = self._parse_header(path)
+        tag, self.channels, self.sample_rate, bits = fmt
+        self.bits = bits
+        frame_bytes = self.channels * bits // 8
+        size = min(size, os.path.getsize(path) - offset)
+        self.frames = size // frame_bytes
+
+        if bits == 24 and tag == 1:
+            self.data = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(self.frames, self.channels, 3))
+        elif (tag, bits) in WAV_DTYPES:
+            self.data = np.memmap(path, dtype=WAV_DTYPES[(tag, bits)], mode="r", offset=offset, shape=(self.frames, self.channels))
+        else:
+            raise ValueError(f"{path}: unsupported WAV encoding (format {tag}, {bits} bit)")
+
+    @staticmethod
+    def _parse_header(path):
+        with open(path, "rb") as f:
+            riff = f.read(12)
+            if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+                raise ValueError(f"{path}: not a RIFF/WAVE file")
+
+            fmt = None
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    raise ValueError(f"{path}: no data chunk")
+                chunk_id, size = header[:4], struct.unpack("<I", header[4:])[0]
+                if chunk_id == b"fmt ":
+                    body = f.read(size)
+                    tag, channels, rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+                    if tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                        tag = struct.unpack("<H", body[24:26])[0]
+                    fmt = (tag, channels, rate, bits)
+                    if size & 1:
+                        f.seek(1, 1)
+                elif chunk_id == b"data":
+                    if fmt is None:
+                        raise ValueError(f"{path}: data chunk before fmt chunk")
+                    return fmt, f.tell(), size
+                else:
+                    f.seek(size + (size & 1), 1)
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate
+
+    def _to_float(self, chunk):
+        # Mixes down to mono float32 in [-1, 1]
+        if self.bits == 24 and chunk.ndim == 3:
+            raw = chunk.astype(np.int32)
+            ints = raw[..., 0] | (raw[..., 1] << 8) | (raw[..., 2] << 16)
+            ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+            samples = ints.astype(np.float32) / 8388608.0
+        elif chunk.dtype == np.uint8:
+            samples = (chunk.astype(np.float32) - 128.0) / 128.0
+        elif chunk.dtype.kind == "i":
+            samples = chunk.astype(np.float32) / float(2 ** (chunk.dtype.itemsize * 8 - 1))
+        else:
+            samples = chunk.astype(np.float32)
+        return samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+
+    def blocks(self, block_size):
+        # Yields (media_time, samples) per block; media_time is the end of the block
+        pacer = Pacer(self.realtime, self.speed)
+        while True:
+            for start in range(0, self.frames - block_size + 1, block_size):
+                t = (start + block_size) / self.sample_rate
+                pacer.wait(t)
+                yield t, self._to_float(self.data[start:start + block_size])
+            if not self.loop:
+                return
+            pacer = Pacer(self.realtime, self.speed)
+
+
+class VideoFileSource:
+    # Sequential decode of a recorded video file. Frames are read one at a
+    # time, never buffered, and timestamped from the frame index and FPS.
+    def __init__(self, path, realtime=True, speed=1.0, loop=False, stride=1):
+        self.path = path
+        self.realtime = realtime
+        self.speed = speed
+        self.loop = loop
+        # Analyze every stride-th frame; skipped frames are grab()bed, not decoded
+        self.stride = max(1, int(stride))
+
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise ValueError(f"{path}: cannot open video")
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        cap.release()
+
+    def frames(self):
+        # Yields (media_time, bgr_frame)
+        while True:
+            cap = cv2.VideoCapture(self.path)
+            pacer = Pacer(self.realtime, self.speed)
+            index = 0
+            while cap.grab():
+                if index % self.stride == 0:
+                    ok, frame = cap.retrieve()
+                    if not ok:
+                        break
+                    t = index / self.fps
+                    pacer.wait(t)
+                    yield t, frame
+                index += 1
+            cap.release()
+            if not self.loop:
+                return
+
+
+# Rows buffered before classification / writing in replay()
+REPLAY_CHUNK = 8192
+
+
+def replay(audio_path=None, video_path=None, out_path=None, stride=1, motion="auto"):
+    # Deterministic, unthrottled pass over recorded files through the real
+    # analysis code. One output row per audio hop (or per video frame when
+    # there is no audio) carrying the latest features of the other stream.
+    # Rows are classified and written in chunks so memory stays flat.
+
+    audio_src = WavSource(audio_path, realtime=False) if audio_path else None
+    video_src = VideoFileSource(video_path, realtime=False, stride=stride) if video_path else None
+    if audio_src is None and video_src is None:
+        raise ValueError("Nothing to replay: pass an audio and/or video file")
+
+    audio = AudioSensor(sample_rate=audio_src.sample_rate) if audio_src else AudioSensor()
+    video = VideoSensor(motion=motion)
+    classifier = EnvironmentClassifier()
+
+    audio_keys = list(audio.latest_features.keys())
+    video_keys = list(video.latest_features.keys())
+    columns = audio_keys + video_keys
+    model_cols = [columns.index(k) for k in AUDIO_KEYS + VIDEO_KEYS]
+
+    chunk = np.zeros((REPLAY_CHUNK, len(columns)), dtype=np.float64)
+    chunk_t = np.zeros(REPLAY_CHUNK, dtype=np.float64)
+    state_counts = {}
+    summary = {"rows": 0, "media_seconds": 0.0}
+
+    out = open(out_path, "w", newline="") if out_path else None
+    writer = csv.writer(out) if out else None
+    if writer:
+        writer.writerow(["t"] + columns + ["state", "confidence"])
+
+    def flush(n):
+        if not n:
+            return
+        labels, confidences, _ = classifier.predict_batch(chunk[:n, model_cols])
+        for label in labels.tolist():
+            state_counts[label] = state_counts.get(label, 0) + 1
+        if writer:
+            for i in range(n):
+                writer.writerow([f"{chunk_t[i]:.4f}"] + chunk[i].tolist() + [labels[i], f"{confidences[i]:.4f}"])
+
+    pending = 0
+
+    def emit(t):
+        nonlocal pending
+        a, v = audio.get_features(), video.get_features()
+        chunk_t[pending] = t
+        chunk[pending] = [a[k] for k in audio_keys] + [v[k] for k in video_keys]
+        pending += 1
+        summary["rows"] += 1
+        summary["media_seconds"] = t
+        if pending == REPLAY_CHUNK:
+            flush(pending)
+            pending = 0
+
+    frames = video_src.frames() if video_src else iter(())
+    next_frame = next(frames, None)
+
+    def advance_video(until):
+        nonlocal next_frame
+        while next_frame is not None and next_frame[0] <= until:
+            video._analyze_frame(next_frame[1])
+            next_frame = next(frames, None)
+
+    started = time.perf_counter()
+    try:
+        if audio_src:
+            for t, block in audio_src.blocks(audio.engine.hop):
+                audio._compute_features(block)
+                advance_video(t)
+                emit(t)
+        else:
+            while next_frame is not None:
+                t = next_frame[0]
+                advance_video(t)
+                emit(t)
+        flush(pending)
+    finally:
+        if out:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    summary["elapsed_seconds"] = elapsed
+    summary["states"] = state_counts
+    media = summary["media_seconds"]
+    print(f"Replay: {summary['rows']} rows, {media:.1f} s of media in {elapsed:.1f} s ({media / max(elapsed, 1e-9):.0f}x realtime)")
+    if out_path:
+        print(f"Replay: Wrote {out_path}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-process recorded audio/video through the SensoryNet pipeline")
+    parser.add_argument("--audio", help="PCM WAV file")
+    parser.add_argument("--video", help="Video file readable by OpenCV")
+    parser.add_argument("--out", help="CSV file for per-row features, state and confidence")
+    parser.add_argument("--stride", type=int, default=1, help="Analyze every Nth video frame")
+    parser.add_argument("--motion", default="auto", help="Motion tier (diff, pyramid, lk, farneback, auto)")
+    args = parser.parse_args()
+    replay(args.audio, args.video, args.out, args.stride, args.motion)
@@ -0,0 +1,82 @@
+import gzip
+import json
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    # gzip only; pip install brotli to offer br as well
+    brotli = None
+
+# JSON responses for endpoints polled often or returning large bodies:
+# weak ETags for conditional requests, and compression negotiated from
+# Accept-Encoding. Bodies smaller than COMPRESS_MIN_SIZE go out as is: they
+# fit in one TCP segment anyway (a plain /status is ~1.1 KB).
+COMPRESS_MIN_SIZE = 1400
+# Fast settings: these bodies are rebuilt per request, not cached
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def etag(version):
+    # Weak: the version covers state and features, not every stats counter
+    return f'W/"{version}"'
+
+
+def etag_matches(header, tag):
+    # If-None-Match uses the weak comparison (RFC 9110 13.1.2)
+    if header.strip() == "*":
+        return True
+    opaque = tag[2:] if tag.startswith("W/") else tag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def choose_encoding(accept):
+    # "br" (when the brotli module is installed) or "gzip", whichever the
+    # client accepts first in that order; None for identity
+    offered = {}
+    for part in accept.split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip().lower()] = q
+    for name in (("br",) if brotli else ()) + ("gzip",):
+        if offered.get(name, offered.get("*", 0.0)) > 0:
+            return name
+    return None
+
+
+def json_response(request, content, tag=None):
+    # Same JSON FastAPI would produce for `content`, compressed if worth it
+    body = json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+    headers = {"Vary": "Accept-Encoding"}
+    if tag:
+        headers["ETag"] = tag
+        # Caches may keep it but must revalidate, which is a cheap 304
+        headers["Cache-Control"] = "no-cache"
+    if len(body) >= COMPRESS_MIN_SIZE:
+        encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+        if encoding == "br":
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def not_modified(tag):
+    return Response(status_code=304, headers={"ETag": tag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"})
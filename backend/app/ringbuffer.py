@@ -0,0 +1,56 @@
+import numpy as np
+
+
+class RingBuffer:
+    # Single-producer / single-consumer sample ring.
+    #
+    # The producer (PortAudio callback) only ever advances write_pos and the
+    # consumer (analysis worker) only ever advances read_pos. Both are plain
+    # Python ints, so each side publishes its position with one atomic store
+    # and neither side takes a lock. All storage is allocated up front.
+    def __init__(self, capacity, dtype=np.float32):
+        self.capacity = int(capacity)
+        self.buffer = np.zeros(self.capacity, dtype=dtype)
+        self.write_pos = 0
+        self.read_pos = 0
+        # Producer-side counters
+        self.overruns = 0
+        self.dropped_samples = 0
+
+    def available(self):
+        return self.write_pos - self.read_pos
+
+    def free(self):
+        return self.capacity - (self.write_pos - self.read_pos)
+
+    def write(self, data):
+        # Called on the realtime thread: copy only, never allocate or block
+        n = len(data)
+        if n > self.free():
+            # Consumer is behind; drop the incoming block rather than
+            # overwrite samples it may be reading right now
+            self.overruns += 1
+            self.dropped_samples += n
+            return False
+
+        start = self.write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start:start + first] = data[:first]
+        if first < n:
+            self.buffer[:n - first] = data[first:]
+        self.write_pos += n
+        return True
+
+    def read(self, out):
+        # Copy exactly len(out) samples into a caller-owned array
+        n = len(out)
+        if self.available() < n:
+            return False
+
+        start = self.read_pos % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self.buffer[start:start + first]
+        if first < n:
+            out[first:] = self.buffer[:n - first]
+        self.read_pos += n
+        return True
@@ -0,0 +1,483 @@
+import json
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from .audio import AudioSensor
+from .video import VideoSensor, HEATMAP_HALF_LIFE
+from .motion import HEATMAP_GRID
+from .broadcast import BroadcastHub
+from .snapshot import SnapshotFusion
+from .protocol import pack_heatmap
+from .governor import Governor, merge_policy
+from .replay import WavSource, VideoFileSource
+from .synthetic import SyntheticAudioSource, SyntheticVideoSource
+
+# Optional per-room configuration, next to model.json / devices.json:
+#
+#   {
+#     "lab":   {"camera": 2, "microphone": "USB Mic", "motion": "diff"},
+#     "lobby": {"camera": "http://192.168.1.20:4747/video"},
+#     "demo":  {"video_file": "clip.mp4", "audio_file": "clip.wav"},
+#     "sim":   {"synthetic": 3},
+#     "hall":  {"camera": 3, "governor": {"stable_after": 600}},
+#     "shop":  {"camera": 4, "heatmap_grid": [16, 12], "heatmap_half_life": 10}
+#   }
+ROOMS_CONFIG_PATH = "rooms.json"
+
+# Seconds a sensor thread waits for a worker to analyze its frame
+ANALYZE_TIMEOUT = 2.0
+# Seconds spawned workers get to import their modules and report in
+POOL_START_TIMEOUT = 15.0
+
+# Prefix of status versions, so ETags issued before a restart never match
+BOOT_ID = f"{time.time_ns():x}"
+
+
+def _video_worker(tasks, results):
+    # Pool process main loop. Each room is pinned to one worker, so the
+    # room's motion estimator state (previous frame, auto tier) lives here.
+    # Frames arrive as shared-memory segment names, never pickled pixels.
+    sensors = {}
+    segments = {}
+    # Tell VideoWorkerPool.start() this process came up
+    results.put((None, os.getpid()))
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        room_id, motion, heatmap, name, shape, dtype, seq = task
+        frame = None
+        try:
+            segment = segments.get(room_id)
+            if segment is None or segment.name != name:
+                # Room re-allocated its slot (new frame size)
+                if segment is not None:
+                    segment.close()
+                segment = shared_memory.SharedMemory(name=name)
+                segments[room_id] = segment
+            frame = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+
+            sensor = sensors.get(room_id)
+            if sensor is None:
+                grid, half_life = heatmap
+                sensor = VideoSensor(motion=motion, heatmap_grid=grid, heatmap_half_life=half_life)
+                sensors[room_id] = sensor
+            features = sensor._extract_features(frame)
+            results.put((room_id, seq, features, sensor.motion_tier, sensor.heatmap, sensor.stage_times))
+        except Exception as e:
+            print(f"VideoWorker: Room {room_id} frame failed ({e})")
+            results.put((room_id, seq, None, None, None, None))
+        finally:
+            # Drop the view before any close() of its segment
+            del frame
+
+    for segment in segments.values():
+        segment.close()
+
+
+class RemoteAnalyzer:
+    # Stands in for VideoSensor._analyze_frame: copies the frame into this
+    # room's shared-memory slot, hands it to the room's worker and waits for
+    # the features. One frame in flight per room, so one slot is enough.
+    def __init__(self, pool, room_id, motion, heatmap):
+        self.pool = pool
+        self.room_id = room_id
+        self.motion = motion
+        # (grid, half-life) for the worker-side heatmap
+        self.heatmap = heatmap
+        self.worker = None
+        self.inbox = queue.Queue()
+        self.segment = None
+        self.frame = None
+        self.seq = 0
+        self.in_flight = None
+
+    def _allocate(self, frame):
+        self.close()
+        self.segment = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+        self.frame = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.segment.buf)
+
+    def _wait(self, timeout):
+        # Returns the worker reply for the in-flight frame, or None on timeout.
+        # Replies to frames we already gave up on are discarded.
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                _, seq, features, tier, heatmap, stage_times = self.inbox.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return None
+            if seq == self.in_flight:
+                self.in_flight = None
+                return (features, tier, heatmap, stage_times) if features is not None else None
+
+    def analyze(self, frame):
+        if self.worker is None:
+            # Pool not started
+            return None
+        if self.in_flight is not None:
+            # A timed-out frame may still be being read from the slot
+            self._wait(0.0)
+            if self.in_flight is not None:
+                return None
+
+        if self.frame is None or self.frame.shape != frame.shape or self.frame.dtype != frame.dtype:
+            self._allocate(frame)
+        np.copyto(self.frame, frame)
+
+        self.seq += 1
+        self.in_flight = self.seq
+        self.pool.submit(self.worker, (self.room_id, self.motion, self.heatmap, self.segment.name,
+                                       frame.shape, frame.dtype.str, self.seq))
+        return self._wait(ANALYZE_TIMEOUT)
+
+    def close(self):
+        self.frame = None
+        if self.segment is not None:
+            self.segment.close()
+            self.segment.unlink()
+            self.segment = None
+
+
+class VideoWorkerPool:
+    # N spawned processes doing the CPU-heavy part of video analysis
+    # (resize, grayscale, motion estimation) so rooms scale with cores
+    # instead of sharing one GIL.
+    def __init__(self, processes=None):
+        self.processes = processes or max(1, (os.cpu_count() or 2) - 1)
+        self.ctx = mp.get_context("spawn")
+        self.workers = []
+        self.task_queues = []
+        self.results = None
+        self.analyzers = {}
+        self.thread = None
+
+    def register(self, room_id, motion, heatmap=(HEATMAP_GRID, HEATMAP_HALF_LIFE)):
+        analyzer = RemoteAnalyzer(self, room_id, motion, heatmap)
+        self.analyzers[room_id] = analyzer
+        if self.workers:
+            analyzer.worker = self._least_loaded()
+        return analyzer
+
+    def _least_loaded(self):
+        load = [0] * len(self.workers)
+        for analyzer in self.analyzers.values():
+            if analyzer.worker is not None:
+                load[analyzer.worker] += 1
+        return load.index(min(load))
+
+    def start(self):
+        # True once every worker has reported in. On failure the pool is torn
+        # down again and False returned, e.g. when the entry script has no
+        # `if __name__ == "__main__"` guard and spawned children die while
+        # re-importing it.
+        if self.workers:
+            return True
+        # Never more processes than rooms to serve
+        count = max(1, min(self.processes, len(self.analyzers)))
+        self.results = self.ctx.Queue()
+        try:
+            for i in range(count):
+                tasks = self.ctx.Queue()
+                process = self.ctx.Process(target=_video_worker, args=(tasks, self.results),
+                                           name=f"video-worker-{i}", daemon=True)
+                self.task_queues.append(tasks)
+                self.workers.append(process)
+                process.start()
+        except (OSError, RuntimeError) as e:
+            print(f"VideoWorkerPool: Could not start workers ({e})")
+            self.stop()
+            return False
+        if not self._wait_ready(count):
+            print("VideoWorkerPool: Workers did not start")
+            self.stop()
+            return False
+        for i, analyzer in enumerate(self.analyzers.values()):
+            analyzer.worker = i % count
+        self.thread = threading.Thread(target=self._collect, name="video-results", daemon=True)
+        self.thread.start()
+        print(f"VideoWorkerPool: Started {count} worker process(es) for {len(self.analyzers)} room(s)")
+        return True
+
+    def _wait_ready(self, count):
+        deadline = time.monotonic() + POOL_START_TIMEOUT
+        ready = 0
+        while ready < count:
+            try:
+                self.results.get(timeout=0.2)
+                ready += 1
+            except queue.Empty:
+                if time.monotonic() > deadline or not all(p.is_alive() for p in self.workers):
+                    return False
+        return True
+
+    def submit(self, worker, task):
+        self.task_queues[worker].put(task)
+
+    def _collect(self):
+        # Routes worker replies back to the sensor thread waiting on them
+        while True:
+            item = self.results.get()
+            if item is None:
+                break
+            analyzer = self.analyzers.get(item[0])
+            if analyzer is not None:
+                analyzer.inbox.put(item)
+
+    def stop(self):
+        for tasks in self.task_queues:
+            tasks.put(None)
+        for process in self.workers:
+            if process.pid is None:
+                # Never started
+                continue
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        if self.results is not None:
+            if self.thread is not None:
+                self.results.put(None)
+                self.thread.join()
+                self.thread = None
+            self.results.close()
+            self.results = None
+        for tasks in self.task_queues:
+            tasks.close()
+        for analyzer in self.analyzers.values():
+            analyzer.close()
+        self.workers = []
+        self.task_queues = []
+
+
+class Room:
+    # One room's sensors, fused prediction and /ws broadcaster
+    def __init__(self, room_id, audio_sensor, video_sensor, classifier, recommendations, **hub_options):
+        self.id = room_id
+        self.audio_sensor = audio_sensor
+        self.video_sensor = video_sensor
+        self.recommendations = recommendations
+        self.fusion = SnapshotFusion(audio_sensor, video_sensor, classifier)
+        self.hub = BroadcastHub(self.build_payload, **hub_options)
+        audio_sensor.listeners.append(self.hub.notify)
+        video_sensor.listeners.append(self.hub.notify)
+        # Set by SensorManager when duty-cycling is enabled
+        self.governor = None
+        # Status version (see version())
+        self._version = 0
+        self._version_key = None
+        self._version_reading = None
+        self._version_lock = threading.Lock()
+
+    def build_payload(self):
+        fused = self.fusion.current()
+        return {
+            "timestamp": time.time(),
+            "room": self.id,
+            "seq": fused.key,
+            "state": fused.state,
+            "confidence": fused.confidence,
+            "recommendation": self.recommendations.get(fused.state, ""),
+            "features": {
+                "audio": fused.audio.features,
+                "video": fused.video.features
+            },
+            "heatmap": pack_heatmap(fused.video.heatmap)
+        }
+
+    def _version_of(self, fused):
+        # Advances only when the fused reading changes significantly (the
+        # /ws push rule), not on every audio hop, so pollers mostly get 304
+        with self._version_lock:
+            if fused.key != self._version_key:
+                self._version_key = fused.key
+                reading = {
+                    "state": fused.state,
+                    "features": {"audio": fused.audio.features, "video": fused.video.features}
+                }
+                significant = self.hub.significant
+                if self._version_reading is None or significant is None or significant(self._version_reading, reading):
+                    self._version += 1
+                    self._version_reading = reading
+            return f"{BOOT_ID}-{self._version}"
+
+    def version(self):
+        # ETag version of status(); cheap enough to check on every poll
+        return self._version_of(self.fusion.current())
+
+    def status(self):
+        # No sensor locks, copies or classifier calls here: just the cached
+        # fusion of the newest snapshots
+        fused = self.fusion.current()
+        return {
+            "room": self.id,
+            "seq": fused.key,
+            "version": self._version_of(fused),
+            "state": fused.state,
+            "confidence": fused.confidence,
+            "recommendation": self.recommendations.get(fused.state, "No recommendation"),
+            "features": {
+                "audio": fused.audio.features,
+                "video": fused.video.features
+            },
+            "heatmap": pack_heatmap(fused.video.heatmap),
+            "sensors": {
+                "audio": self.audio_sensor.running,
+                "video": self.video_sensor.running
+            },
+            "stats": {
+                "audio": self.audio_sensor.get_stats(),
+                "video": self.video_sensor.get_stats()
+            },
+            "governor": self.governor.get_stats() if self.governor else None
+        }
+
+    def start(self):
+        self.audio_sensor.start()
+        self.video_sensor.start()
+        self.hub.start()
+
+    async def stop(self):
+        await self.hub.stop()
+        self.audio_sensor.stop()
+        self.video_sensor.stop()
+
+
+class SensorManager:
+    # Registry of named rooms. Video analysis for every room goes through
+    # one shared process pool (video_workers=0 keeps it on the sensor threads;
+    # the default None only starts the pool for two or more rooms, and any
+    # pool that fails to start falls back to the sensor threads too). The
+    # pool starts in the background; rooms analyze on their own threads
+    # until its workers report in.
+    # governor_policy (see governor.py) enables duty-cycling; rooms.json
+    # entries can override it per room with a "governor" key.
+    def __init__(self, classifier, recommendations, video_workers=None, governor_policy=None, **hub_options):
+        self.classifier = classifier
+        self.recommendations = recommendations
+        self.governor_policy = governor_policy
+        self.hub_options = hub_options
+        self.rooms = {}
+        self.video_workers = video_workers
+        self.pool = VideoWorkerPool(video_workers) if video_workers != 0 else None
+        # off / starting / ready / failed, see pool_status()
+        self.pool_state = "off"
+        # (room id, video sensor) to hand to the pool once it is ready
+        self._pool_rooms = []
+        self._pool_lock = threading.Lock()
+        self._pool_thread = None
+        self.started = False
+
+    def add_room(self, room_id, audio_sensor=None, video_sensor=None, **config):
+        # Either pass ready-made sensors or a config dict (see ROOMS_CONFIG_PATH)
+        if room_id in self.rooms:
+            raise ValueError(f"Room '{room_id}' already exists")
+
+        # "synthetic": seed replaces both devices with a seeded scenario
+        seed = config.get("synthetic")
+        if audio_sensor is None:
+            source = WavSource(config["audio_file"], loop=True) if config.get("audio_file") else None
+            if seed is not None:
+                source = SyntheticAudioSource(seed)
+            audio_sensor = AudioSensor(source=source, device=config.get("microphone"))
+        if video_sensor is None:
+            source = VideoFileSource(config["video_file"], loop=True) if config.get("video_file") else None
+            if seed is not None:
+                source = SyntheticVideoSource(seed)
+            video_sensor = VideoSensor(camera_index=config.get("camera", 0), motion=config.get("motion", "auto"),
+                                       source=source, search="camera" not in config,
+                                       heatmap_grid=config.get("heatmap_grid", HEATMAP_GRID),
+                                       heatmap_half_life=config.get("heatmap_half_life", HEATMAP_HALF_LIFE))
+        if self.started and video_sensor.analyzer is None:
+            self._attach(room_id, video_sensor)
+
+        room = Room(room_id, audio_sensor, video_sensor, self.classifier, self.recommendations, **self.hub_options)
+        if self.governor_policy is not None:
+            policy = merge_policy(self.governor_policy, config.get("governor"))
+            room.governor = Governor(room, self.hub_options.get("significant"), policy)
+        self.rooms[room_id] = room
+        if self.started:
+            room.start()
+        print(f"SensorManager: Registered room '{room_id}'")
+        return room
+
+    def load_config(self, path=ROOMS_CONFIG_PATH):
+        if not os.path.exists(path):
+            return
+        with open(path, "r") as f:
+            config = json.load(f)
+        for room_id, room_config in config.items():
+            try:
+                self.add_room(room_id, **room_config)
+            except (ValueError, OSError) as e:
+                print(f"SensorManager: Skipping room '{room_id}' ({e})")
+
+    def _register(self, room_id, video_sensor):
+        return self.pool.register(room_id, video_sensor.motion_name,
+                                  (video_sensor.heatmap_grid, video_sensor.heatmap_half_life))
+
+    def _attach(self, room_id, video_sensor):
+        # Rooms added after start(): queued while the pool is starting, sent
+        # to it once ready, left on their sensor thread otherwise
+        with self._pool_lock:
+            if self.pool_state == "starting":
+                self._pool_rooms.append((room_id, video_sensor))
+            elif self.pool_state == "ready":
+                video_sensor.analyzer = self._register(room_id, video_sensor)
+
+    def _start_pool(self):
+        local = [room for room in self.rooms.values() if room.video_sensor.analyzer is None]
+        if self.pool is None or (self.video_workers is None and len(local) < 2):
+            # One room gains nothing from a process hop
+            self.pool = None
+            return
+        self.pool_state = "starting"
+        self._pool_rooms = [(room.id, room.video_sensor) for room in local]
+        # Spawning workers and waiting for them to import takes seconds;
+        # never on the caller's (event loop) thread
+        self._pool_thread = threading.Thread(target=self._run_pool_start, name="video-pool-start", daemon=True)
+        self._pool_thread.start()
+
+    def _run_pool_start(self):
+        with self._pool_lock:
+            analyzers = [(sensor, self._register(room_id, sensor)) for room_id, sensor in self._pool_rooms]
+            self._pool_rooms = []
+        started = self.pool.start()
+        with self._pool_lock:
+            if not started:
+                print("SensorManager: Analyzing video on the sensor threads instead")
+                self.pool_state = "failed"
+                self._pool_rooms = []
+                return
+            # Rooms added while the workers were coming up
+            analyzers += [(sensor, self._register(room_id, sensor)) for room_id, sensor in self._pool_rooms]
+            self._pool_rooms = []
+            for sensor, analyzer in analyzers:
+                sensor.analyzer = analyzer
+            self.pool_state = "ready"
+
+    def pool_status(self):
+        # Video worker pool progress, reported by /discovery
+        with self._pool_lock:
+            return {
+                "state": self.pool_state,
+                "workers": len(self.pool.workers) if self.pool_state == "ready" else 0,
+            }
+
+    def start(self):
+        self._start_pool()
+        for room in self.rooms.values():
+            room.start()
+        self.started = True
+
+    async def stop(self):
+        for room in self.rooms.values():
+            await room.stop()
+        if self._pool_thread is not None:
+            self._pool_thread.join()
+            self._pool_thread = None
+        if self.pool is not None:
+            self.pool.stop()
+        self.started = False
@@ -0,0 +1,293 @@
+import asyncio
+import json
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from .broadcast import BroadcastHub
+
+# Sensor daemon -> API workers, through one shared-memory region guarded by
+# a seqlock. The daemon (python -m app.daemon) owns the sensors and writes a
+# JSON document with every room's status and /ws payload; any number of
+# uvicorn workers (SENSORYNET_ROLE=api) map the region read-only and serve
+# /status and /ws from it without touching a camera or microphone.
+#
+# Region layout (little-endian):
+#   u64  seq     odd while the writer is mid-update, +2 per published document
+#   u32  length  of the JSON document
+#   u32  reserved
+#   ...  JSON document, utf-8
+#
+# Readers copy the document between two reads of `seq` and retry if it was
+# odd or changed, so they never see a torn write and never block the writer.
+
+SHM_NAME = "sensorynet_state"
+SHM_SIZE = 1 << 20
+HEADER = struct.Struct("<QII")
+# Reader gives up after this many torn reads and keeps its previous document
+READ_RETRIES = 100
+# Max documents/s the daemon writes; API workers poll `seq` this often
+PUBLISH_RATE = 50.0
+POLL_INTERVAL = 0.01
+# The daemon writes at least once a second; no new seq for this long means it
+# is gone (or restarted with a fresh region), so readers re-attach
+STALE_AFTER = 3.0
+
+
+def _attach(name):
+    # Readers must not let their resource tracker unlink the daemon's
+    # region when they exit
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 has no track=
+        segment = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+class SeqlockWriter:
+    def __init__(self, name=SHM_NAME, size=SHM_SIZE):
+        try:
+            self.segment = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a previous daemon: reuse it so attached readers
+            # keep following along
+            self.segment = _attach(name)
+        self.buf = self.segment.buf
+        self.capacity = self.segment.size - HEADER.size
+        seq = HEADER.unpack_from(self.buf, 0)[0]
+        # Never resume from an odd (interrupted) value
+        self.seq = seq + (seq & 1)
+
+    def publish(self, data):
+        n = len(data)
+        if n > self.capacity:
+            raise ValueError(f"State document is {n} bytes, region holds {self.capacity}")
+        HEADER.pack_into(self.buf, 0, self.seq + 1, 0, 0)
+        self.buf[HEADER.size:HEADER.size + n] = data
+        HEADER.pack_into(self.buf, 0, self.seq + 2, n, 0)
+        self.seq += 2
+
+    def close(self, unlink=True):
+        self.buf = None
+        self.segment.close()
+        if unlink:
+            try:
+                self.segment.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class SeqlockReader:
+    def __init__(self, name=SHM_NAME):
+        self.name = name
+        self.segment = None
+        self.seq = 0
+        self.document = None
+        self.torn_reads = 0
+        # Set while the writer looks dead: read() then returns None (callers
+        # answer 503) instead of the last document it left behind
+        self.stale = False
+
+    def _ensure_attached(self):
+        if self.segment is None:
+            try:
+                self.segment = _attach(self.name)
+            except FileNotFoundError:
+                return False
+        return True
+
+    def detach(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+        self.seq = 0
+        self.document = None
+
+    def mark_stale(self):
+        # Drops the mapping too, in case the writer comes back with a fresh
+        # region under the same name
+        self.detach()
+        self.stale = True
+
+    def peek(self):
+        # Current seq without copying the document (0 if no daemon yet)
+        if not self._ensure_attached():
+            return 0
+        return HEADER.unpack_from(self.segment.buf, 0)[0]
+
+    def read(self):
+        # Latest complete document, decoded once per seq
+        if self.stale or not self._ensure_attached():
+            return None
+        buf = self.segment.buf
+        for _ in range(READ_RETRIES):
+            seq, n, _ = HEADER.unpack_from(buf, 0)
+            if seq == self.seq:
+                return self.document
+            if seq & 1:
+                self.torn_reads += 1
+                continue
+            data = bytes(buf[HEADER.size:HEADER.size + n])
+            if HEADER.unpack_from(buf, 0)[0] != seq:
+                self.torn_reads += 1
+                continue
+            self.document = json.loads(data) if n else None
+            self.seq = seq
+            return self.document
+        return self.document
+
+
+class StatePublisher:
+    # Daemon side: wakes on sensor updates (any room) and writes the whole
+    # state document, at most PUBLISH_RATE times per second
+    def __init__(self, manager, extra=None, writer=None, rate=PUBLISH_RATE):
+        self.manager = manager
+        # Optional callable returning more top-level keys (e.g. discovery)
+        self.extra = extra
+        self.writer = writer or SeqlockWriter()
+        self.min_interval = 1.0 / rate
+        self.event = threading.Event()
+        self.running = False
+        self.thread = None
+        self.published = 0
+        for room in manager.rooms.values():
+            self.watch(room)
+
+    def watch(self, room):
+        room.audio_sensor.listeners.append(self.event.set)
+        room.video_sensor.listeners.append(self.event.set)
+
+    def document(self):
+        doc = {
+            "published": time.time(),
+            "rooms": {
+                room_id: {"status": room.status(), "payload": room.build_payload()}
+                for room_id, room in self.manager.rooms.items()
+            }
+        }
+        if self.extra:
+            doc.update(self.extra())
+        return doc
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="state-publisher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.event.set()
+        if self.thread:
+            self.thread.join()
+        self.writer.close()
+
+    def _run(self):
+        while self.running:
+            # Heartbeat write once a second even if every sensor is idle, so
+            # readers can tell a live daemon from a dead one
+            self.event.wait(1.0)
+            self.event.clear()
+            if not self.running:
+                break
+            try:
+                self.writer.publish(json.dumps(self.document(), separators=(",", ":")).encode())
+                self.published += 1
+            except Exception as e:
+                print(f"StatePublisher: Publish failed ({e})")
+            time.sleep(self.min_interval)
+
+
+class SharedRoom:
+    # API-worker stand-in for rooms.Room, backed by the daemon's document
+    def __init__(self, room_id, reader, **hub_options):
+        self.id = room_id
+        self.reader = reader
+        self.hub = BroadcastHub(self.build_payload, **hub_options)
+
+    def _entry(self):
+        document = self.reader.read()
+        return (document or {}).get("rooms", {}).get(self.id)
+
+    def build_payload(self):
+        entry = self._entry()
+        if entry is None:
+            raise RuntimeError(f"Room '{self.id}' not published by the sensor daemon")
+        return entry["payload"]
+
+    def status(self):
+        entry = self._entry()
+        return entry["status"] if entry else None
+
+    def version(self):
+        # Computed by the daemon, so every API worker hands out the same ETags
+        status = self.status()
+        return status.get("version") if status else None
+
+
+class SharedStateRooms:
+    # API-worker stand-in for rooms.SensorManager: rooms appear as the daemon
+    # publishes them, and every hub is woken when `seq` moves
+    def __init__(self, reader=None, **hub_options):
+        self.reader = reader or SeqlockReader()
+        self.hub_options = hub_options
+        self._rooms = {}
+        self.task = None
+
+    @property
+    def rooms(self):
+        document = self.reader.read()
+        for room_id in (document or {}).get("rooms", {}):
+            if room_id not in self._rooms:
+                room = SharedRoom(room_id, self.reader, **self.hub_options)
+                self._rooms[room_id] = room
+                if self.task is not None:
+                    room.hub.start()
+        return self._rooms
+
+    def document(self):
+        return self.reader.read()
+
+    def start(self):
+        for room in self.rooms.values():
+            room.hub.start()
+        self.task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for room in self._rooms.values():
+            await room.hub.stop()
+
+    async def _poll(self):
+        # Checking `seq` is one 8-byte read; the document is only decoded by
+        # whoever needs it next. Rooms the daemon adds later are picked up
+        # by the first request that looks them up (see rooms).
+        last = 0
+        changed = time.monotonic()
+        while True:
+            seq = self.reader.peek()
+            now = time.monotonic()
+            if seq != last and not seq & 1:
+                last = seq
+                changed = now
+                self.reader.stale = False
+                for room in self._rooms.values():
+                    room.hub.notify()
+            elif now - changed > STALE_AFTER:
+                # A dead daemon's region stays behind with its last seq, so
+                # re-attaching finds the same seq and we stay stale until a
+                # live writer moves it
+                if not self.reader.stale:
+                    print("SharedStateRooms: Sensor daemon stopped publishing")
+                self.reader.mark_stale()
+                changed = now
+            await asyncio.sleep(POLL_INTERVAL)
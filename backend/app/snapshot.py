@@ -0,0 +1,64 @@
+import time
+
+# Sensors publish features as immutable snapshots: a new FeatureSnapshot is
+# built for every update and swapped in with a single attribute assignment,
+# so readers just take the reference (no lock, no copy). Treat .features as
+# read-only; copy it if you need to modify it.
+
+
+class FeatureSnapshot:
+    # heatmap: video only, the (rows, columns) float32 motion heatmap (see
+    # VideoSensor); same read-only rule as features
+    __slots__ = ("seq", "timestamp", "features", "heatmap")
+
+    def __init__(self, seq, timestamp, features, heatmap=None):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.features = features
+        self.heatmap = heatmap
+
+    def next(self, features, heatmap=None):
+        return FeatureSnapshot(self.seq + 1, time.time(), features, heatmap)
+
+
+class FusedSnapshot:
+    # Classifier output for one (audio, video) snapshot pair
+    __slots__ = ("audio", "video", "state", "confidence")
+
+    def __init__(self, audio, video, state, confidence):
+        self.audio = audio
+        self.video = video
+        self.state = state
+        self.confidence = confidence
+
+    @property
+    def key(self):
+        return (self.audio.seq, self.video.seq)
+
+
+class SnapshotFusion:
+    # Runs classifier.predict once per new snapshot pair. Everything that
+    # needs the fused state (/status, /ws, history) calls current() and gets
+    # the cached result until either sensor publishes again.
+    def __init__(self, audio_sensor, video_sensor, classifier):
+        self.audio_sensor = audio_sensor
+        self.video_sensor = video_sensor
+        self.classifier = classifier
+        self.cached = None
+        self.hits = 0
+        self.misses = 0
+
+    def current(self):
+        audio = self.audio_sensor.snapshot
+        video = self.video_sensor.snapshot
+        cached = self.cached
+        if cached is not None and cached.audio is audio and cached.video is video:
+            self.hits += 1
+            return cached
+        # Two threads may race to fill the same pair; both compute the same
+        # answer, so the duplicate is harmless and needs no lock
+        self.misses += 1
+        state, confidence = self.classifier.predict(audio.features, video.features)
+        fused = FusedSnapshot(audio, video, state, confidence)
+        self.cached = fused
+        return fused
@@ -0,0 +1,119 @@
+import time
+import numpy as np
+from . import metrics
+
+FFT_TIME = metrics.stage("audio_fft")
+BANDS_TIME = metrics.stage("audio_bands")
+
+# Default reporting bands (Hz): low / mid / high, same split as before
+DEFAULT_BANDS = {
+    "low_energy": (0, 300),
+    "mid_energy": (300, 2000),
+    "high_energy": (2000, None),
+}
+
+WINDOWS = {
+    "hann": np.hanning,
+    "hamming": np.hamming,
+    "blackman": np.blackman,
+    "rect": np.ones,
+}
+
+
+class StftEngine:
+    # Streaming short-time Fourier analysis.
+    #
+    # Window and bin->band ranges are computed once.
+    # Each call to process() shifts new samples into a preallocated frame,
+    # runs one FFT and derives every spectral feature from that spectrum.
+    def __init__(self, sample_rate, n_fft=4096, hop=1024, window="hann",
+                 bands=None, rolloff=0.85):
+        self.sample_rate = sample_rate
+        self.n_fft = n_fft
+        self.hop = hop
+        self.rolloff = rolloff
+        self.n_bins = n_fft // 2 + 1
+
+        # Normalize by coherent gain so band energies keep the same scale as
+        # the old unwindowed 4096-sample FFT
+        win = WINDOWS[window](n_fft).astype(np.float32)
+        self.window = win / win.mean()
+
+        self.freqs = np.fft.rfftfreq(n_fft, 1.0 / sample_rate).astype(np.float32)
+
+        # Bands become contiguous [start, stop) bin ranges
+        bands = bands or DEFAULT_BANDS
+        self.band_names = list(bands.keys())
+        self.band_ranges = []
+        for lo, hi in bands.values():
+            start = int(np.searchsorted(self.freqs, lo, side="left"))
+            stop = self.n_bins if hi is None else int(np.searchsorted(self.freqs, hi, side="left"))
+            self.band_ranges.append((start, stop))
+
+        # Preallocated working buffers
+        self.frame = np.zeros(n_fft, dtype=np.float32)
+        self._windowed = np.zeros(n_fft, dtype=np.float32)
+        self._sign = np.zeros(n_fft, dtype=bool)
+        self._crossings = np.zeros(n_fft - 1, dtype=bool)
+        self.mag = np.zeros(self.n_bins, dtype=np.float32)
+        self.prev_mag = np.zeros(self.n_bins, dtype=np.float32)
+        self._power = np.zeros(self.n_bins, dtype=np.float32)
+        self._cumsum = np.zeros(self.n_bins, dtype=np.float32)
+        self._diff = np.zeros(self.n_bins, dtype=np.float32)
+
+    def push(self, samples):
+        # Slide the analysis frame forward by len(samples)
+        n = len(samples)
+        if n >= self.n_fft:
+            self.frame[:] = samples[-self.n_fft:]
+        else:
+            self.frame[:-n] = self.frame[n:]
+            self.frame[-n:] = samples
+
+    def process(self, samples):
+        self.push(samples)
+        frame = self.frame
+
+        # 1. Time domain: RMS / dB / zero-crossing rate
+        rms = float(np.sqrt(np.dot(frame, frame) / self.n_fft))
+        db = 20 * np.log10(rms) if rms > 1e-6 else -80
+        np.signbit(frame, out=self._sign)
+        np.not_equal(self._sign[1:], self._sign[:-1], out=self._crossings)
+        zcr = np.count_nonzero(self._crossings) / (self.n_fft - 1)
+
+        # 2. One FFT per hop
+        t0 = time.perf_counter()
+        np.multiply(frame, self.window, out=self._windowed)
+        np.abs(np.fft.rfft(self._windowed), out=self.mag)
+        mag = self.mag
+        np.multiply(mag, mag, out=self._power)
+        t1 = time.perf_counter()
+        FFT_TIME.observe(t1 - t0)
+
+        features = {"rms": rms, "db": float(db)}
+        for name, (start, stop) in zip(self.band_names, self.band_ranges):
+            features[name] = float(mag[start:stop].sum())
+
+        # 3. Spectral shape
+        total = float(mag.sum())
+        if total > 1e-9:
+            centroid = float(np.dot(self.freqs, mag) / total)
+            np.cumsum(self._power, out=self._cumsum)
+            idx = int(np.searchsorted(self._cumsum, self.rolloff * self._cumsum[-1]))
+            rolloff = float(self.freqs[min(idx, self.n_bins - 1)])
+        else:
+            centroid = 0.0
+            rolloff = 0.0
+
+        # Positive spectral flux, normalized per bin
+        np.subtract(mag, self.prev_mag, out=self._diff)
+        np.maximum(self._diff, 0.0, out=self._diff)
+        flux = float(np.sqrt(np.dot(self._diff, self._diff)) / self.n_bins)
+        self.prev_mag[:] = mag
+
+        features["spectral_centroid"] = centroid
+        features["spectral_rolloff"] = rolloff
+        features["spectral_flux"] = flux
+        features["zcr"] = float(zcr)
+        BANDS_TIME.observe(time.perf_counter() - t1)
+        return features
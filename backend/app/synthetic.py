@@ -0,0 +1,265 @@
+import argparse
+import time
+import cv2
+import numpy as np
+from .audio import AudioSensor, SAMPLE_RATE
+from .video import VideoSensor
+from .replay import Pacer
+
+# Seeded synthetic sensors. A Scenario is an endless, reproducible sequence
+# of scenes; SyntheticAudioSource renders it as raw PCM and
+# SyntheticVideoSource as grayscale frames, both in vectorized batches. They
+# have the same interface as replay.WavSource / VideoFileSource, so the
+# output goes through the real STFT and motion code: at the live rate in mock
+# mode, or as fast as the CPU allows (realtime=False) for load tests.
+SYNTH_SEED = 0
+SYNTH_FPS = 5
+
+# audio: "silence" (noise floor only), "noise" (broadband) or "speech"
+# (voiced bursts); level is the peak amplitude of that component. light is
+# the mean gray level; blobs move at speed px/s (at 320 px wide).
+SCENES = {
+    "quiet": {"audio": "silence", "level": 0.0, "light": 180, "blobs": 0, "speed": 0},
+    "conversation": {"audio": "speech", "level": 0.1, "light": 170, "blobs": 1, "speed": 20},
+    "noisy": {"audio": "noise", "level": 0.2, "light": 190, "blobs": 3, "speed": 120},
+    "crowded": {"audio": "speech", "level": 0.3, "light": 200, "blobs": 4, "speed": 80},
+    "dark": {"audio": "silence", "level": 0.0, "light": 15, "blobs": 0, "speed": 0},
+}
+AUDIO_KINDS = ["silence", "noise", "speech"]
+# Every scenario opens with this scene (the old demo's "good lighting, little motion")
+FIRST_SCENE = "quiet"
+# Scene length range in seconds; lighting ramps into each scene over LIGHT_RAMP
+PHASE_SECONDS = (5.0, 20.0)
+LIGHT_RAMP = 3.0
+
+NOISE_FLOOR = 0.001
+# Voiced speech: harmonics of a per-scene pitch, 4 syllables/s, words
+# switched on and off WORD_RATE times per second
+SPEECH_PITCH = (100.0, 220.0)
+SPEECH_HARMONICS = 12
+SYLLABLE_RATE = 4.0
+WORD_RATE = 0.5
+
+MAX_BLOBS = max(scene["blobs"] for scene in SCENES.values())
+# Blob radius (fraction of frame width) and peak brightness over the background
+BLOB_SIGMA = 0.06
+BLOB_CONTRAST = 60.0
+SENSOR_NOISE = 2.0
+NOISE_FRAMES = 8
+
+PHASE_COLUMNS = ("start", "kind", "level", "pitch", "word_phase", "light", "prev_light", "blobs", "speed", "travel")
+
+# Hops / frames rendered per vectorized batch
+AUDIO_BATCH_BLOCKS = 32
+VIDEO_BATCH = 16
+
+
+class Scenario:
+    # Scene timeline, extended on demand. It has its own generator, so
+    # sources built with the same seed see the same scenes at the same times
+    # however much noise each of them draws.
+    def __init__(self, seed=SYNTH_SEED, scenes=SCENES):
+        self.rng = np.random.default_rng(seed)
+        self.scenes = scenes
+        self.names = list(scenes)
+        self.phases = []
+        self.ends = np.zeros(0)
+
+    def _add_phase(self):
+        rng = self.rng
+        prev = self.phases[-1] if self.phases else None
+        if prev is None:
+            name = FIRST_SCENE if FIRST_SCENE in self.scenes else self.names[0]
+        else:
+            # Never the same scene twice in a row
+            choices = [n for n in self.names if n != prev["name"]] or self.names
+            name = choices[rng.integers(len(choices))]
+        scene = self.scenes[name]
+        start = prev["end"] if prev else 0.0
+        end = start + rng.uniform(*PHASE_SECONDS)
+        self.phases.append({
+            "name": name,
+            "start": start,
+            "end": end,
+            "kind": AUDIO_KINDS.index(scene["audio"]),
+            "level": scene["level"],
+            "pitch": rng.uniform(*SPEECH_PITCH),
+            "word_phase": rng.uniform(0, 2 * np.pi),
+            "light": float(scene["light"]),
+            "prev_light": prev["light"] if prev else float(scene["light"]),
+            "blobs": scene["blobs"],
+            "speed": float(scene["speed"]),
+            # Distance every blob has travelled when the scene starts
+            "travel": prev["travel"] + prev["speed"] * (prev["end"] - prev["start"]) if prev else 0.0,
+        })
+        # Per-phase columns for vectorized lookups (self.start, self.light, ...)
+        self.ends = np.array([p["end"] for p in self.phases])
+        for key in PHASE_COLUMNS:
+            setattr(self, key, np.array([p[key] for p in self.phases]))
+
+    def lookup(self, t):
+        # Phase index for every time in t (seconds)
+        last = float(np.max(t))
+        while not self.phases or self.phases[-1]["end"] <= last:
+            self._add_phase()
+        return np.searchsorted(self.ends, t, side="right")
+
+    def name_at(self, t):
+        return self.phases[int(self.lookup(np.array([t]))[0])]["name"]
+
+
+class SyntheticAudioSource:
+    # Mono float32 PCM rendered AUDIO_BATCH_BLOCKS hops at a time
+    def __init__(self, seed=SYNTH_SEED, sample_rate=SAMPLE_RATE, realtime=True, speed=1.0, duration=None):
+        self.path = f"synthetic audio (seed {seed})"
+        self.sample_rate = sample_rate
+        self.realtime = realtime
+        self.speed = speed
+        # Seconds to generate; None runs until the consumer stops
+        self.duration = duration
+        self.scenario = Scenario(seed)
+        self.rng = np.random.default_rng([seed, 1])
+        self._harmonics = np.arange(1, SPEECH_HARMONICS + 1)
+
+    def render(self, start, n):
+        # Samples [start, start + n) of the scenario
+        s = self.scenario
+        t = (start + np.arange(n)) / self.sample_rate
+        p = s.lookup(t)
+        kind = s.kind[p]
+        out = NOISE_FLOOR * self.rng.standard_normal(n)
+
+        noise = kind == AUDIO_KINDS.index("noise")
+        if noise.any():
+            out += np.where(noise, s.level[p], 0.0) * self.rng.standard_normal(n)
+
+        speech = kind == AUDIO_KINDS.index("speech")
+        if speech.any():
+            # Sawtooth-like harmonic stack, normalized to unit peak
+            phase = (2 * np.pi * s.pitch[p] * t)[:, None] * self._harmonics
+            voiced = (np.sin(phase) / self._harmonics).sum(axis=1) / (1 / self._harmonics).sum()
+            syllables = np.sin(np.pi * SYLLABLE_RATE * t) ** 2
+            words = np.sin(2 * np.pi * WORD_RATE * t + s.word_phase[p]) > 0
+            out += np.where(speech & words, s.level[p], 0.0) * syllables * voiced
+        return out.astype(np.float32)
+
+    def blocks(self, block_size):
+        # Yields (media_time, samples) per block, like WavSource.blocks()
+        pacer = Pacer(self.realtime, self.speed)
+        batch = block_size * AUDIO_BATCH_BLOCKS
+        start = 0
+        while True:
+            samples = self.render(start, batch)
+            for i in range(AUDIO_BATCH_BLOCKS):
+                t = (start + (i + 1) * block_size) / self.sample_rate
+                if self.duration is not None and t > self.duration:
+                    return
+                pacer.wait(t)
+                yield t, samples[i * block_size:(i + 1) * block_size]
+            start += batch
+
+
+def _bounce(position, size):
+    # Position after travelling back and forth across [0, size]
+    position = np.mod(position, 2 * size)
+    return size - np.abs(position - size)
+
+
+class SyntheticVideoSource:
+    # Grayscale uint8 frames: a fixed texture lit by the scene's (ramped)
+    # light level, Gaussian blobs bouncing around and a little sensor noise
+    def __init__(self, seed=SYNTH_SEED, width=320, height=240, fps=SYNTH_FPS, realtime=True, speed=1.0, duration=None):
+        self.path = f"synthetic video (seed {seed})"
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.realtime = realtime
+        self.speed = speed
+        self.duration = duration
+        self.scenario = Scenario(seed)
+        rng = np.random.default_rng([seed, 2])
+        self.rng = rng
+
+        # Texture around 1.0, so brightness follows the scene's light level
+        texture = cv2.GaussianBlur(rng.uniform(0.8, 1.2, (height, width)).astype(np.float32), (9, 9), 0)
+        self.texture = texture / texture.mean()
+        self.noise = (SENSOR_NOISE * rng.standard_normal((NOISE_FRAMES, height, width))).astype(np.float32)
+        # Each blob starts somewhere and travels along its own direction
+        self.blob_start = rng.uniform(0, 1, (MAX_BLOBS, 2)) * [width, height]
+        angle = rng.uniform(0, 2 * np.pi, MAX_BLOBS)
+        self.blob_dir = np.stack([np.cos(angle), np.sin(angle)], axis=1) * (width / 320)
+        self.sigma = BLOB_SIGMA * width
+        self._xs = np.arange(width, dtype=np.float32)
+        self._ys = np.arange(height, dtype=np.float32)
+
+    def render(self, times):
+        # (len(times), height, width) uint8 frames at the given media times
+        s = self.scenario
+        t = np.asarray(times, dtype=np.float64)
+        p = s.lookup(t)
+        ramp = np.clip((t - s.start[p]) / LIGHT_RAMP, 0, 1)
+        light = s.prev_light[p] + (s.light[p] - s.prev_light[p]) * ramp
+
+        frames = light.astype(np.float32)[:, None, None] * self.texture
+        frames += self.noise[self.rng.integers(NOISE_FRAMES, size=len(t))]
+        if s.blobs[p].max() > 0:
+            travel = s.travel[p] + s.speed[p] * (t - s.start[p])
+            pos = self.blob_start + travel[:, None, None] * self.blob_dir
+            cx = _bounce(pos[..., 0], self.width).astype(np.float32)
+            cy = _bounce(pos[..., 1], self.height).astype(np.float32)
+            amp = BLOB_CONTRAST * (np.arange(MAX_BLOBS) < s.blobs[p][:, None])
+            # Separable Gaussians: (frame, blob, row) x (frame, blob, column)
+            gx = np.exp(-(self._xs - cx[..., None]) ** 2 / (2 * self.sigma ** 2))
+            gy = np.exp(-(self._ys - cy[..., None]) ** 2 / (2 * self.sigma ** 2)) * amp[..., None].astype(np.float32)
+            frames += np.einsum("nbh,nbw->nhw", gy, gx)
+        return np.clip(frames, 0, 255).astype(np.uint8)
+
+    def frames(self):
+        # Yields (media_time, gray_frame), like VideoFileSource.frames()
+        pacer = Pacer(self.realtime, self.speed)
+        index = 0
+        while True:
+            times = (index + np.arange(VIDEO_BATCH)) / self.fps
+            batch = self.render(times)
+            for t, frame in zip(times.tolist(), batch):
+                if self.duration is not None and t > self.duration:
+                    return
+                pacer.wait(t)
+                yield t, frame
+            index += VIDEO_BATCH
+
+
+def load_test(seconds, seed=SYNTH_SEED, width=320, height=240, motion="auto"):
+    # Unthrottled pass of `seconds` of scenario through the real sensors
+    audio = AudioSensor(source=SyntheticAudioSource(seed, realtime=False, duration=seconds))
+    video = VideoSensor(motion=motion, source=SyntheticVideoSource(seed, width, height, realtime=False, duration=seconds))
+    summary = {}
+    for name, sensor, count in (("audio", audio, "blocks_analyzed"), ("video", video, "frames_analyzed")):
+        start = time.perf_counter()
+        sensor.running = True
+        sensor._run_source_loop()
+        elapsed = time.perf_counter() - start
+        summary[name] = {
+            count: getattr(sensor, count),
+            "seconds": elapsed,
+            "realtime_x": seconds / elapsed,
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a seeded synthetic scenario through the real sensor pipeline")
+    parser.add_argument("--seconds", type=float, default=60.0, help="Media seconds to generate")
+    parser.add_argument("--seed", type=int, default=SYNTH_SEED)
+    parser.add_argument("--width", type=int, default=320)
+    parser.add_argument("--height", type=int, default=240)
+    parser.add_argument("--motion", default="auto")
+    args = parser.parse_args()
+
+    summary = load_test(args.seconds, args.seed, args.width, args.height, args.motion)
+    for name, stats in summary.items():
+        print(f"{name}: " + ", ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
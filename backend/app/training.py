@@ -0,0 +1,104 @@
+import argparse
+import csv
+import time
+import numpy as np
+from .ml import AUDIO_KEYS, VIDEO_KEYS, N_FEATURES, ModelStats
+
+# Rows parsed / accumulated per step when streaming training files
+TRAIN_CHUNK = 65536
+FEATURE_COLUMNS = AUDIO_KEYS + VIDEO_KEYS
+# CSV label column, first match wins ("state" makes replay.py output usable)
+LABEL_COLUMNS = ("label", "state")
+
+
+def iter_csv(path, chunk_rows=TRAIN_CHUNK):
+    # Yields (X, labels) chunks from a CSV with a header naming the feature
+    # columns and a label column; extra columns are ignored
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        missing = [c for c in FEATURE_COLUMNS if c not in header]
+        if missing:
+            raise ValueError(f"{path}: missing feature column(s) {', '.join(missing)}")
+        label_col = next((header.index(c) for c in LABEL_COLUMNS if c in header), None)
+        if label_col is None:
+            raise ValueError(f"{path}: no label column (one of {', '.join(LABEL_COLUMNS)})")
+        cols = [header.index(c) for c in FEATURE_COLUMNS]
+
+        X = np.empty((chunk_rows, N_FEATURES))
+        labels = []
+        for row in reader:
+            if not row:
+                continue
+            X[len(labels)] = [float(row[c]) for c in cols]
+            labels.append(row[label_col])
+            if len(labels) == chunk_rows:
+                yield X, np.array(labels)
+                X = np.empty((chunk_rows, N_FEATURES))
+                labels = []
+        if labels:
+            yield X[:len(labels)], np.array(labels)
+
+
+def iter_npy(features_path, labels_path, chunk_rows=TRAIN_CHUNK):
+    # (N, 8) feature array + (N,) label array, both memory-mapped
+    X = np.load(features_path, mmap_mode="r")
+    y = np.load(labels_path, mmap_mode="r")
+    if X.ndim != 2 or X.shape[1] != N_FEATURES:
+        raise ValueError(f"{features_path}: expected shape (N, {N_FEATURES}), got {X.shape}")
+    if len(y) != len(X):
+        raise ValueError(f"{labels_path}: {len(y)} labels for {len(X)} rows")
+    for start in range(0, len(X), chunk_rows):
+        yield X[start:start + chunk_rows], y[start:start + chunk_rows]
+
+
+def train(chunks, stats=None):
+    # One pass over any iterable of (X, labels) chunks
+    stats = stats or ModelStats()
+    for X, labels in chunks:
+        stats.update(X, labels)
+    return stats
+
+
+if __name__ == "__main__":
+    from .ml import EnvironmentClassifier, MODEL_PATH
+    from .knn import KNNClassifier, KNN_MODEL_PATH
+
+    parser = argparse.ArgumentParser(description="Train the SensoryNet classifier from labeled feature files")
+    parser.add_argument("--csv", nargs="*", default=[], help="CSV files with feature columns and a label/state column")
+    parser.add_argument("--npy", nargs=2, action="append", default=[], metavar=("FEATURES", "LABELS"),
+                        help="(N, 8) feature .npy and matching label .npy")
+    parser.add_argument("--backend", choices=("centroid", "knn"), default="centroid",
+                        help="centroid: per-class means; knn: every row is kept as an exemplar")
+    parser.add_argument("--out", default=None, help=f"Model path (default {MODEL_PATH} / {KNN_MODEL_PATH}; "
+                                                    ".json writes the legacy centroid format)")
+    parser.add_argument("--update", action="store_true", help="Add to the existing model at --out instead of replacing it")
+    args = parser.parse_args()
+
+    def chunks():
+        for path in args.csv:
+            yield from iter_csv(path)
+        for features, labels in args.npy:
+            yield from iter_npy(features, labels)
+
+    started = time.perf_counter()
+    if args.backend == "knn":
+        out = args.out or KNN_MODEL_PATH
+        classifier = KNNClassifier(out, load=args.update)
+        rows, labels = [], []
+        if args.update:
+            rows.append(np.asarray(classifier.exemplars, dtype=np.float64))
+            labels.append(np.asarray(classifier.labels)[classifier.codes])
+        for X, y in chunks():
+            rows.append(np.array(X, dtype=np.float64))
+            labels.append(np.asarray(y).astype(str))
+        classifier.fit(np.vstack(rows), np.concatenate(labels))
+        stats = classifier.stats
+    else:
+        out = args.out or MODEL_PATH
+        classifier = EnvironmentClassifier(out, load=args.update)
+        stats = train(chunks(), classifier.load_stats() if args.update else None)
+        classifier.set_stats(stats)
+    classifier.save()
+    elapsed = time.perf_counter() - started
+    print(f"Training: {stats.count} rows, {len(stats.labels)} classes in {elapsed:.1f} s -> {out}")
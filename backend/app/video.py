@@ -2,10 +2,37 @@ import cv2
 import numpy as np
 import threading
 import time
+from .capture import FrameGrabber
+from .motion import create_motion_estimator, motion_heatmap, HEATMAP_GRID
+from .snapshot import FeatureSnapshot
+from .discovery import DiscoveryProgress, discover_camera
+from . import metrics
+
+CAPTURE_TIME = metrics.stage("video_capture")
+RESIZE_TIME = metrics.stage("video_resize")
+MOTION_TIME = metrics.stage("video_motion")
+
+# Seconds for a cell of the motion heatmap to decay to half once motion
+# stops; 0 publishes each frame's heatmap as is
+HEATMAP_HALF_LIFE = 2.0
 
 class VideoSensor:
-    def __init__(self, camera_index=0):
+    def __init__(self, camera_index=0, motion="auto", source=None, device_cache=None, search=True, analyzer=None,
+                 heatmap_grid=HEATMAP_GRID, heatmap_half_life=HEATMAP_HALF_LIFE):
         self.camera_index = camera_index
+        # search=False opens exactly camera_index instead of scanning [1, 0, 2, 3]
+        self.search = search
+        # Optional rooms.RemoteAnalyzer: frames are analyzed in a worker process
+        self.analyzer = analyzer
+        # discovery.DeviceCache remembering the last working camera (optional)
+        self.device_cache = device_cache
+        self.discovery = DiscoveryProgress()
+        # Optional file-backed or synthetic source (replay.VideoFileSource,
+        # synthetic.SyntheticVideoSource) used instead of a camera
+        self.source = source
+        # synthetic.SyntheticVideoSource rendered when no camera is found
+        self.mock_source = None
+        self._mock_frames = None
         self.cap = None
         self.running = False
         self.latest_features = {
@@ -14,12 +41,51 @@ class VideoSensor:
             "motion_hotspots": 0
         }
         self.lock = threading.Lock()
+        # Immutable, sequence-numbered view of latest_features (see snapshot.py)
+        self.snapshot = FeatureSnapshot(0, time.time(), self.latest_features)
+        # Called (on the analysis thread) after every feature update
+        self.listeners = []
         self.prev_gray = None
+        # (resize, motion) seconds spent on the last frame; motion is None
+        # for the first frame
+        self.stage_times = (0.0, None)
+        # diff / pyramid / lk / farneback / auto (see motion.py)
+        self.motion = create_motion_estimator(motion)
+        self.motion_name = motion
+        self.motion_tier = None
+        # (columns, rows) of the motion heatmap published in snapshot.heatmap
+        self.heatmap_grid = tuple(heatmap_grid)
+        self.heatmap_half_life = heatmap_half_life
+        self.heatmap = None
+        self._heatmap_time = None
+
+        # Capture runs on its own thread; analysis only sees the newest frame
+        self.grabber = None
+        self._last_seq = 0
+        self.frames_analyzed = 0
+        self.dropped_frames = 0
+        self.frame_age = 0.0
+        self.dropped_fps = 0.0
+        self.fps = 0.0
+        self._rate_window_start = time.time()
+        self._rate_window_dropped = 0
+        self._rate_window_frames = 0
+        self._last_debug = 0.0
+
+        # Seconds between analyzed camera frames; lowered/raised by the
+        # governor. Setting rate_changed cuts the current wait short.
+        self.frame_interval = 0.2
+        self.rate_changed = threading.Event()
 
     def start(self):
         if self.running:
             return
         self.running = True
+
+        if self.source is not None:
+            self.thread = threading.Thread(target=self._run_source_loop, name="video-source")
+            self.thread.start()
+            return
         
         # Priority search order: 1 (DroidCam), 0 (Built-in), 2, 3
         # Users can hardcode an IP here if needed, e.g. "http://192.168.1.100:4747/video"
@@ -29,71 +95,64 @@ class VideoSensor:
         # self.camera_index can be set to a string
         if isinstance(self.camera_index, str):
              search_order = [self.camera_index] + search_order
+        if not self.search:
+            search_order = [self.camera_index]
 
-        found = False
-        print(f"VideoSensor: Starting camera search with order {search_order}")
-        
-        for idx in search_order:
-            print(f"VideoSensor: Trying camera source {idx}...")
-            cap = cv2.VideoCapture(idx)
-            if cap.isOpened():
-                ret, _ = cap.read()
-                if ret:
-                    self.cap = cap
-                    self.camera_index = idx
-                    print(f"VideoSensor: Successfully connected to camera source {idx}")
-                    found = True
-                    break
-                else:
-                    print(f"VideoSensor: Camera source {idx} opened but failed to read frame.")
-                    cap.release()
-            else:
-                print(f"VideoSensor: Failed to open camera source {idx}")
-        
-        if not found:
-             print("VideoSensor: No working camera found. Starting dummy loop.")
-        
-        self.thread = threading.Thread(target=self._process_loop)
+        # Probing can take seconds per dead index, so it runs on the sensor
+        # thread; features stay at their defaults until it finishes
+        self.thread = threading.Thread(target=self._discover_and_run, args=(search_order,), name="video-capture")
         self.thread.start()
 
+    def _discover_and_run(self, search_order):
+        print(f"VideoSensor: Starting camera search with order {search_order}")
+        source, cap = discover_camera(search_order, self.discovery, self.device_cache)
+        if not self.running:
+            # Stopped while probing
+            if cap is not None:
+                cap.release()
+            return
+
+        if cap is None:
+            print("VideoSensor: No working camera found. Starting dummy loop.")
+        else:
+            self.cap = cap
+            self.camera_index = source
+            print(f"VideoSensor: Successfully connected to camera source {source}")
+            self.grabber = FrameGrabber(self.cap)
+            self.grabber.start()
+
+        self._process_loop()
+
+    def set_frame_rate(self, fps):
+        interval = 1.0 / fps
+        if interval != self.frame_interval:
+            self.frame_interval = interval
+            self.rate_changed.set()
+
     def stop(self):
         self.running = False
+        self.rate_changed.set()
         if self.thread:
             self.thread.join()
+        if self.grabber:
+            self.grabber.stop()
+            self.grabber = None
         if self.cap:
             self.cap.release()
 
-    def _generate_mock_data(self):
-        # Generate data for "Good Lighting, Little Motion" (User Demo Scenario)
-        t = time.time()
-        
-        # Brightness: High and stable (Good lighting)
-        # Range: ~190-210
-        brightness = 200 + 10 * np.sin(t * 0.2) 
-        
-        # Motion: Mostly still, with very subtle movements (User sitting at laptop)
-        # Occasional small movements (typing, breathing)
-        base_motion = 1.0 + 0.5 * np.sin(t * 1.5)
-        noise = max(0, 0.5 * np.random.randn())
-        motion_mag = base_motion + noise
-        
-        hotspots = int(motion_mag * 0.5) 
-        
-        # Very rare larger movement (e.g. adjust position), but not chaotic
-        if int(t) % 15 == 0:
-            motion_mag += 5.0
-            hotspots += 2
-
-        # Debug print rarely
-        if int(t) % 5 == 0 and int(t * 10) % 10 == 0:
-             print(f"Video Mock: Brightness={brightness:.1f}, Motion={motion_mag:.1f} (Demo Mode)")
-
-        with self.lock:
-            self.latest_features = {
-                "brightness": float(brightness),
-                "motion_magnitude": float(motion_mag),
-                "motion_hotspots": int(hotspots)
-            }
+    def _analyze_mock_frame(self):
+        # No camera: analyze the synthetic scenario (see synthetic.py) like
+        # captured frames. frames() renders VIDEO_BATCH frames per call, as in
+        # load_test; this loop does the pacing, so the source runs unpaced and
+        # the scenario advances one frame (1 / SYNTH_FPS s) per analyzed frame.
+        if self.mock_source is None:
+            from .synthetic import SyntheticVideoSource
+            self.mock_source = SyntheticVideoSource(realtime=False)
+            self._mock_frames = self.mock_source.frames()
+            print(f"VideoSensor: Running MOCK DATA loop ({self.mock_source.path}).")
+        _, frame = next(self._mock_frames)
+        self._analyze(frame)
+        self._update_rates()
 
     def _process_loop(self):
         # SET TO TRUE FOR MOCK DATA (User Request)
@@ -101,52 +160,158 @@ class VideoSensor:
         
         while self.running:
             if FORCE_MOCK or self.cap is None or not self.cap.isOpened():
-                # Fallback: Process mock data if no camera is connected or forced
-                self._generate_mock_data()
-                time.sleep(0.1) # Simulate 10 FPS
+                # Fallback: synthetic frames if no camera is connected or forced
+                self._analyze_mock_frame()
+                self.rate_changed.wait(self.frame_interval)
+                self.rate_changed.clear()
                 continue
 
-            ret, frame = self.cap.read()
-            if not ret:
-                time.sleep(0.1)
+            with CAPTURE_TIME.time():
+                item = self.grabber.retrieve(self._last_seq)
+            if item is None:
+                time.sleep(0.01)
                 continue
+
+            frame, seq, grab_time = item
+            if self._last_seq:
+                self.dropped_frames += seq - self._last_seq - 1
+            self._last_seq = seq
+
+            self._analyze(frame)
+            self.frame_age = time.time() - grab_time
+            self._update_rates()
             
-            # Resize for performance and privacy (discard detail)
-            small_frame = cv2.resize(frame, (320, 240))
-            gray = cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY)
-            
-            # 1. Brightness
-            brightness = np.mean(gray)
-            
-            # 2. Optical Flow (Motion)
-            motion_mag = 0
-            hotspots = 0
-            
-            if self.prev_gray is not None:
-                flow = cv2.calcOpticalFlowFarneback(self.prev_gray, gray, None, 0.5, 3, 15, 3, 5, 1.2, 0)
-                mag, _ = cv2.cartToPolar(flow[..., 0], flow[..., 1])
-                motion_mag = np.mean(mag)
-                hotspots = np.sum(mag > 2.0) # Count pixels with significant motion
-            
-            self.prev_gray = gray
-            
-            # Debug: Print stats periodically
-            if int(time.time()) % 5 == 0:
-                 print(f"Video Debug: Brightness={brightness:.1f}, Motion={motion_mag:.1f}")
-
-            with self.lock:
-                self.latest_features = {
-                    "brightness": float(brightness),
-                    "motion_magnitude": float(motion_mag),
-                    "motion_hotspots": int(hotspots)
-                }
-            
-            # Sleep to reduce CPU usage (e.g., 5 FPS)
-            time.sleep(0.2)
+            # Sleep to reduce CPU usage (5 FPS unless the governor says otherwise)
+            self.rate_changed.wait(self.frame_interval)
+            self.rate_changed.clear()
 
-    def get_features(self):
+    def _run_source_loop(self):
+        # Recorded video: analyze every frame the source yields
+        print(f"VideoSensor: Replaying {self.source.path}")
+        for _, frame in self.source.frames():
+            if not self.running:
+                break
+            self._analyze(frame)
+            self._update_rates()
+        print("VideoSensor: Replay finished")
+
+    def _analyze(self, frame):
+        if self.analyzer is None:
+            self._analyze_frame(frame)
+            return
+        result = self.analyzer.analyze(frame)
+        if result is None:
+            # Worker unavailable or timed out; the frame counts as dropped
+            self.dropped_frames += 1
+            return
+        features, self.motion_tier, heatmap, (resize_time, motion_time) = result
+        # The worker's own stage histograms never reach this process's /metrics
+        RESIZE_TIME.observe(resize_time)
+        if motion_time is not None:
+            MOTION_TIME.observe(motion_time)
+        self.frames_analyzed += 1
+        self._set_features(features, heatmap)
+
+    def _analyze_frame(self, frame):
+        features = self._extract_features(frame)
+        self._set_features(features, self.heatmap)
+
+    def _extract_features(self, frame):
+        # Resize for performance and privacy (discard detail)
+        t0 = time.perf_counter()
+        small_frame = cv2.resize(frame, (320, 240))
+        # Synthetic sources already deliver grayscale
+        gray = small_frame if small_frame.ndim == 2 else cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY)
+        resize_time = time.perf_counter() - t0
+        RESIZE_TIME.observe(resize_time)
+        
+        # 1. Brightness
+        brightness = np.mean(gray)
+        
+        # 2. Optical Flow (Motion)
+        motion_mag = 0
+        hotspots = 0
+        cells = None
+        motion_time = None
+        
+        if self.prev_gray is not None:
+            t0 = time.perf_counter()
+            result = self.motion.estimate(self.prev_gray, gray)
+            # 3. Where it moved: the same field, block-averaged
+            cells = motion_heatmap(result.field, self.heatmap_grid)
+            motion_time = time.perf_counter() - t0
+            MOTION_TIME.observe(motion_time)
+            motion_mag = result.magnitude
+            hotspots = result.hotspots # Count pixels with significant motion
+            self.motion_tier = result.tier
+        
+        self.prev_gray = gray
+        self.frames_analyzed += 1
+        self.stage_times = (resize_time, motion_time)
+        
+        now = time.time()
+        self._update_heatmap(cells, now)
+
+        # Debug: Print stats periodically (at most every 5 s, even when replaying at max speed)
+        if now - self._last_debug >= 5:
+            self._last_debug = now
+            print(f"Video Debug: Brightness={brightness:.1f}, Motion={motion_mag:.1f}")
+
+        return {
+            "brightness": float(brightness),
+            "motion_magnitude": float(motion_mag),
+            "motion_hotspots": int(hotspots)
+        }
+
+    def _update_heatmap(self, cells, now):
+        # Exponential moving average over wall-clock time, so cells keep
+        # px/frame units and fade at the same speed whatever the frame rate
+        if cells is None:
+            cols, rows = self.heatmap_grid
+            cells = np.zeros((rows, cols), dtype=np.float32)
+        if self.heatmap is not None and self.heatmap_half_life:
+            keep = 0.5 ** ((now - self._heatmap_time) / self.heatmap_half_life)
+            cells = (keep * self.heatmap + (1 - keep) * cells).astype(np.float32)
+        self._heatmap_time = now
+        # Goes into snapshots as is: replaced, never modified in place
+        self.heatmap = cells
+
+    def _update_rates(self):
+        # Analyzed / dropped frames per second over ~1 s windows
+        now = time.time()
+        elapsed = now - self._rate_window_start
+        if elapsed >= 1.0:
+            self.fps = (self.frames_analyzed - self._rate_window_frames) / elapsed
+            self.dropped_fps = (self.dropped_frames - self._rate_window_dropped) / elapsed
+            self._rate_window_start = now
+            self._rate_window_frames = self.frames_analyzed
+            self._rate_window_dropped = self.dropped_frames
+
+    def _set_features(self, features, heatmap=None):
+        # `features` must be a fresh dict: readers hold on to it without copying
         with self.lock:
-            return self.latest_features.copy()
+            self.latest_features = features
+            self.snapshot = self.snapshot.next(features, heatmap)
+        for listener in self.listeners:
+            listener()
+
+    def get_snapshot(self):
+        return self.snapshot
+
+    def get_features(self):
+        # Mutable copy for callers that want one; hot paths use get_snapshot()
+        return self.snapshot.features.copy()
+
+    def get_stats(self):
+        return {
+            "frames_analyzed": self.frames_analyzed,
+            "fps": self.fps,
+            "frames_grabbed": self.grabber.seq if self.grabber else 0,
+            "dropped_frames": self.dropped_frames,
+            "dropped_fps": self.dropped_fps,
+            "frame_age": self.frame_age,
+            "motion_tier": self.motion_tier
+        }
 
 if __name__ == "__main__":
     sensor = VideoSensor()
@@ -0,0 +1,562 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+from app.audio import AudioSensor, SAMPLE_RATE
+from app.video import VideoSensor
+from app.motion import MOTION_TIERS, HEATMAP_GRID, create_motion_estimator, motion_heatmap
+from app.ml import EnvironmentClassifier, ModelStats, N_FEATURES
+from app.training import TRAIN_CHUNK
+from app import knn
+from app.knn import KNNClassifier
+from app.broadcast import BroadcastHub
+from app.protocol import BinaryEncoder
+from app.snapshot import SnapshotFusion
+from app.rooms import VideoWorkerPool
+from app.capture import CAPTURE_WIDTH, CAPTURE_HEIGHT, reduced_flag, scan_jpeg
+from app.synthetic import SyntheticAudioSource, SyntheticVideoSource, AUDIO_BATCH_BLOCKS, VIDEO_BATCH
+
+# Reproducible benchmarks for the hot paths, all on seeded synthetic data.
+#
+#   python benchmark.py --out results.json
+#   python benchmark.py --only audio,classifier --compare results.json
+#
+# Every result records per-call latency stats in seconds. --compare exits
+# non-zero if any median got slower than --threshold (relative).
+
+SEED = 1234
+RESOLUTIONS = [(320, 240), (640, 480), (1280, 720), (1920, 1080)]
+AUDIO_FFT_SIZES = [1024, 2048, 4096, 8192]
+BATCH_SIZES = [1, 100, 10000, 1000000]
+FANOUT_CLIENTS = [1, 10, 100, 1000]
+ROOM_COUNTS = [1, 2, 4, 8]
+TRAIN_ROWS = 1000000
+KNN_EXEMPLARS = [10000, 100000, 1000000]
+MJPEG_QUALITY = 75
+
+
+def measure(fn, min_time=1.0, min_calls=5, max_calls=100000, warmup=3):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < max_calls and (len(samples) < min_calls or time.perf_counter() < deadline):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples = np.array(samples)
+    return {
+        "calls": int(len(samples)),
+        "mean": float(samples.mean()),
+        "median": float(np.median(samples)),
+        "p95": float(np.percentile(samples, 95)),
+        "min": float(samples.min()),
+    }
+
+
+def demo_classifier():
+    # Demo model trained into a throwaway directory, so benchmarking never
+    # reads or replaces the app's model.npz in the working directory
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        return EnvironmentClassifier(os.path.join(tmp, "model.npz"))
+
+
+def synthetic_frames(width, height, count, rng):
+    # Textured background with a bright square drifting 3 px/frame (at 320 px wide)
+    background = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (7, 7), 0)
+    size = height // 4
+    step = max(1, 3 * width // 320)
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        x = (i * step) % (width - size)
+        frame[height // 3:height // 3 + size, x:x + size] = 230
+        frames.append(frame)
+    return frames
+
+
+def bench_audio(results, min_time):
+    rng = np.random.default_rng(SEED)
+    for n_fft in AUDIO_FFT_SIZES:
+        hop = n_fft // 4
+        sensor = AudioSensor(n_fft=n_fft, hop=hop)
+        blocks = (rng.standard_normal((64, hop)) * 0.1).astype(np.float32)
+        i = [0]
+
+        def step():
+            sensor._compute_features(blocks[i[0] % 64])
+            i[0] += 1
+
+        stats = measure(step, min_time)
+        stats["realtime_x"] = (hop / SAMPLE_RATE) / stats["median"]
+        results[f"audio.compute_features[n_fft={n_fft},hop={hop}]"] = stats
+
+
+def bench_video(results, min_time):
+    rng = np.random.default_rng(SEED)
+    for width, height in RESOLUTIONS:
+        frames = synthetic_frames(width, height, 16, rng)
+        small = [cv2.resize(f, (320, 240)) for f in frames]
+        grays = [cv2.cvtColor(f, cv2.COLOR_BGR2GRAY) for f in small]
+        tag = f"{width}x{height}"
+        i = [0]
+
+        def resize():
+            cv2.resize(frames[i[0] % 16], (320, 240))
+            i[0] += 1
+
+        def cvt():
+            cv2.cvtColor(small[i[0] % 16], cv2.COLOR_BGR2GRAY)
+            i[0] += 1
+
+        results[f"video.resize[{tag}]"] = measure(resize, min_time)
+        results[f"video.cvtcolor[{tag}]"] = measure(cvt, min_time)
+
+        for tier in ("farneback", "auto"):
+            sensor = VideoSensor(motion=tier)
+
+            def analyze():
+                sensor._analyze_frame(frames[i[0] % 16])
+                i[0] += 1
+
+            results[f"video.analyze_frame[{tag},motion={tier}]"] = measure(analyze, min_time)
+
+    # Optical flow itself only ever runs at the 320x240 analysis size
+    def farneback():
+        cv2.calcOpticalFlowFarneback(grays[0], grays[1], None, 0.5, 3, 15, 3, 5, 1.2, 0)
+
+    results["video.farneback[320x240]"] = measure(farneback, min_time)
+
+
+def bench_motion(results, min_time):
+    rng = np.random.default_rng(SEED)
+    moving = [cv2.cvtColor(f, cv2.COLOR_BGR2GRAY) for f in synthetic_frames(320, 240, 32, rng)]
+    static_bg = moving[0].copy()
+    static = [cv2.add(static_bg, rng.integers(0, 3, static_bg.shape, dtype=np.uint8)) for _ in range(32)]
+    # Textured patch drifting 4 px/frame: no flat interior, so every tier
+    # can see all of its motion (the fair comparison against farneback)
+    patch = cv2.GaussianBlur(rng.integers(0, 255, (70, 50), dtype=np.uint8), (5, 5), 0)
+    textured = []
+    for i in range(32):
+        frame = static_bg.copy()
+        x = (i * 4) % (320 - 50)
+        frame[100:170, x:x + 50] = patch
+        textured.append(frame)
+
+    for scene, frames in (("moving", moving), ("textured", textured), ("static", static)):
+        for tier in MOTION_TIERS:
+            estimator = create_motion_estimator(tier)
+            i = [0]
+            out = []
+
+            def step():
+                k = i[0] % 31
+                out.append(estimator.estimate(frames[k], frames[k + 1]))
+                i[0] += 1
+
+            cpu0 = time.process_time()
+            stats = measure(step, min_time)
+            stats["cpu_per_frame"] = (time.process_time() - cpu0) / (stats["calls"] + 3)
+            stats["magnitude"] = float(np.mean([r.magnitude for r in out]))
+            stats["hotspots"] = float(np.mean([r.hotspots for r in out]))
+            results[f"motion.{tier}[{scene}]"] = stats
+        # Each tier's readings relative to full-resolution dense flow
+        reference = results[f"motion.farneback[{scene}]"]
+        for tier in MOTION_TIERS:
+            stats = results[f"motion.{tier}[{scene}]"]
+            for key in ("magnitude", "hotspots"):
+                stats[f"{key}_vs_farneback"] = stats[key] / reference[key] if reference[key] else None
+
+    # Heatmap reduction on top of a full-resolution field
+    field = create_motion_estimator("farneback").estimate(moving[0], moving[1]).field
+    cols, rows = HEATMAP_GRID
+    results[f"motion.heatmap[{field.shape[1]}x{field.shape[0]}->{cols}x{rows}]"] = measure(lambda: motion_heatmap(field), min_time)
+
+
+def bench_decode(results, min_time):
+    # MJPEG frame -> 320x240 grayscale, the way cv2.VideoCapture delivers it
+    # (full BGR decode, resize, cvtColor) vs. capture.MjpegStream (reduced
+    # grayscale decode, resize)
+    rng = np.random.default_rng(SEED)
+    size = (CAPTURE_WIDTH, CAPTURE_HEIGHT)
+    for width, height in RESOLUTIONS:
+        # synthetic_frames' per-pixel texture compresses far worse than a
+        # camera picture; use a smooth scene with mild sensor noise at a
+        # typical streaming quality instead
+        scene = cv2.resize(rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8), (width, height),
+                           interpolation=cv2.INTER_CUBIC)
+        jpegs = []
+        for k in range(8):
+            frame = np.clip(scene + rng.normal(0, 1, scene.shape), 0, 255).astype(np.uint8)
+            x = (k * 3 * width // 320) % (width - height // 4)
+            frame[height // 3:height // 3 + height // 4, x:x + height // 4] = 230
+            jpegs.append(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, MJPEG_QUALITY])[1])
+        flag, factor = reduced_flag(width, height)
+        i = [0]
+
+        def full():
+            frame = cv2.imdecode(jpegs[i[0] % 8], cv2.IMREAD_COLOR)
+            i[0] += 1
+            return cv2.cvtColor(cv2.resize(frame, size), cv2.COLOR_BGR2GRAY)
+
+        def reduced():
+            frame = cv2.imdecode(jpegs[i[0] % 8], flag)
+            i[0] += 1
+            return cv2.resize(frame, size)
+
+        per_frame = {}
+        for name, fn in (("full", full), ("reduced", reduced)):
+            cpu0 = time.process_time()
+            stats = measure(fn, min_time)
+            stats["cpu_per_frame"] = (time.process_time() - cpu0) / (stats["calls"] + 3)
+            per_frame[name] = stats["cpu_per_frame"]
+            if name == "reduced":
+                stats["scale"] = 1.0 / factor
+                stats["cpu_saved_per_frame"] = per_frame["full"] - per_frame["reduced"]
+                stats["cpu_saved_fraction"] = 1.0 - per_frame["reduced"] / per_frame["full"]
+                # Same picture? Mean absolute gray-level difference
+                stats["mean_abs_diff"] = float(np.mean(cv2.absdiff(full(), reduced())))
+            stats["jpeg_bytes"] = int(np.mean([len(j) for j in jpegs]))
+            results[f"decode.{name}[{width}x{height}]"] = stats
+
+        data = jpegs[0].tobytes()
+        results[f"decode.scan_jpeg[{width}x{height}]"] = measure(lambda: scan_jpeg(data, 0), min_time)
+
+
+def bench_classifier(results, min_time):
+    rng = np.random.default_rng(SEED)
+    classifier = demo_classifier()
+    scale = np.array([0.5, 80, 500, 800, 500, 200, 5, 1000])
+    audio = {"rms": 0.2, "db": 60, "low_energy": 100, "mid_energy": 800, "high_energy": 100}
+    video = {"brightness": 100, "motion_magnitude": 2, "motion_hotspots": 1}
+
+    results["classifier.predict[single]"] = measure(lambda: classifier.predict(audio, video), min_time)
+
+    for n in BATCH_SIZES:
+        X = rng.random((n, N_FEATURES)) * scale
+        stats = measure(lambda: classifier.predict_batch(X), min_time, min_calls=3)
+        stats["rows_per_second"] = n / stats["median"]
+        results[f"classifier.predict_batch[n={n}]"] = stats
+
+
+def bench_training(results, min_time):
+    rng = np.random.default_rng(SEED)
+    X = rng.random((TRAIN_ROWS, N_FEATURES)) * np.array([0.5, 80, 500, 800, 500, 200, 5, 1000])
+    y = rng.choice(["Quiet", "Noisy", "Silent", "Conversation", "Sleepy"], size=TRAIN_ROWS)
+
+    def stream():
+        stats = ModelStats()
+        for start in range(0, TRAIN_ROWS, TRAIN_CHUNK):
+            stats.update(X[start:start + TRAIN_CHUNK], y[start:start + TRAIN_CHUNK])
+
+    stats = measure(stream, min_time, min_calls=3)
+    stats["rows_per_second"] = TRAIN_ROWS / stats["median"]
+    results[f"training.stream[n={TRAIN_ROWS}]"] = stats
+
+    with tempfile.TemporaryDirectory() as tmp:
+        classifier = EnvironmentClassifier(os.path.join(tmp, "model.npz"), load=False)
+        classifier.partial_fit(X[:10000], y[:10000])
+        results["training.partial_fit[single]"] = measure(lambda: classifier.partial_fit(X[:1], y[:1]), min_time)
+        for fmt in ("npz", "json"):
+            path = os.path.join(tmp, f"model.{fmt}")
+            classifier.save(path)
+            # Silence the "Loaded existing model" line printed per load
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[f"training.load[{fmt}]"] = measure(lambda: EnvironmentClassifier(path), min_time)
+
+
+def bench_knn(results, min_time):
+    # Clustered exemplars (40 modes), queries near the modes; every uncached
+    # query is a new vector so it misses the prediction cache
+    rng = np.random.default_rng(SEED)
+    spread = np.array([0.5, 80, 500, 800, 500, 200, 5, 10])
+    modes = rng.random((40, N_FEATURES)) * spread
+    queries = modes[rng.integers(0, 40, 1000)] + rng.normal(size=(1000, N_FEATURES)) * spread * 0.05
+    audio_keys = ["rms", "db", "low_energy", "mid_energy", "high_energy"]
+    video_keys = ["brightness", "motion_magnitude", "motion_hotspots"]
+    readings = [(dict(zip(audio_keys, q[:5])), dict(zip(video_keys, q[5:]))) for q in queries.tolist()]
+    backend = "scipy" if knn.cKDTree is not None else "numpy"
+
+    for n in KNN_EXEMPLARS:
+        codes = rng.integers(0, 40, n)
+        X = modes[codes] + rng.normal(size=(n, N_FEATURES)) * spread * 0.05
+        classifier = KNNClassifier(load=False)
+        t0 = time.perf_counter()
+        classifier.fit(X, codes.astype(str))
+        build = time.perf_counter() - t0
+
+        position = iter(range(10 ** 9))
+        def uncached():
+            audio, video = readings[next(position) % len(readings)]
+            classifier.cache.clear()
+            classifier.predict(audio, video)
+
+        stats = measure(uncached, min_time)
+        stats["build_seconds"] = build
+        stats["index"] = backend
+        results[f"knn.predict[n={n}]"] = stats
+        results[f"knn.predict_cached[n={n}]"] = measure(lambda: classifier.predict(*readings[0]), min_time)
+
+
+def bench_status(results, min_time):
+    # What one /status poll costs: copy + predict per request (the old path)
+    # vs. the memoized snapshot fusion, plus JSON serialization of the result
+    audio = AudioSensor()
+    video = VideoSensor()
+    classifier = demo_classifier()
+    fusion = SnapshotFusion(audio, video, classifier)
+    rng = np.random.default_rng(SEED)
+    audio._compute_features((rng.standard_normal(audio.engine.hop) * 0.1).astype(np.float32))
+
+    def uncached():
+        a = audio.get_features()
+        v = video.get_features()
+        return classifier.predict(a, v)
+
+    def status():
+        fused = fusion.current()
+        return json.dumps({"state": fused.state, "confidence": fused.confidence,
+                           "features": {"audio": fused.audio.features, "video": fused.video.features}})
+
+    results["status.predict[uncached]"] = measure(uncached, min_time)
+    results["status.predict[fused]"] = measure(fusion.current, min_time)
+    results["status.serialize[fused]"] = measure(status, min_time)
+
+
+def bench_fanout(results, min_time):
+    # Producer -> N subscribers through the real BroadcastHub, with each
+    # client task "sending" by awaiting a no-op (no network in the loop)
+    audio = AudioSensor()
+    video = VideoSensor()
+    classifier = demo_classifier()
+    fusion = SnapshotFusion(audio, video, classifier)
+    rng = np.random.default_rng(SEED)
+    audio._compute_features((rng.standard_normal(audio.engine.hop) * 0.1).astype(np.float32))
+
+    def build_payload():
+        fused = fusion.current()
+        return {"timestamp": time.time(), "state": fused.state, "confidence": fused.confidence,
+                "recommendation": "", "features": {"audio": fused.audio.features, "video": fused.video.features}}
+
+    async def run(n_clients, proto):
+        hub = BroadcastHub(build_payload)
+        delivered = [0]
+        sent_bytes = [0]
+
+        async def client():
+            encoder = BinaryEncoder(states=classifier.states) if proto == "binary" else None
+            sub = hub.subscribe(encoder)
+            while True:
+                message = await sub.get()
+                delivered[0] += 1
+                sent_bytes[0] += len(message)
+                await asyncio.sleep(0)
+
+        tasks = [asyncio.create_task(client()) for _ in range(n_clients)]
+        await asyncio.sleep(0)
+        ticks = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < min_time:
+            hub.publish(build_payload())
+            ticks += 1
+            await asyncio.sleep(0)
+        elapsed = time.perf_counter() - start
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        dropped = sum(s.dropped for s in hub.subscribers)
+        return ticks, delivered[0], sent_bytes[0], dropped, elapsed
+
+    for proto in ("json", "binary"):
+        for n in FANOUT_CLIENTS:
+            ticks, delivered, sent, dropped, elapsed = asyncio.run(run(n, proto))
+            results[f"ws.fanout[proto={proto},clients={n}]"] = {
+                "ticks_per_second": ticks / elapsed,
+                "messages_per_second": delivered / elapsed,
+                "bytes_per_message": sent / max(delivered, 1),
+                "tick_latency": elapsed / max(ticks, 1),
+                "dropped": dropped,
+            }
+
+
+def bench_rooms(results, min_time):
+    # Aggregate video analysis throughput for N rooms, each with its own
+    # sensor thread, analyzed in-thread vs. through the shared process pool
+    import threading
+    rng = np.random.default_rng(SEED)
+    frames = synthetic_frames(640, 480, 16, rng)
+
+    def run(n_rooms, analyze_for_room):
+        counts = [0] * n_rooms
+        deadline = time.perf_counter() + min_time
+
+        def room_loop(k):
+            analyze = analyze_for_room(k)
+            while time.perf_counter() < deadline:
+                analyze(frames[counts[k] % 16])
+                counts[k] += 1
+
+        threads = [threading.Thread(target=room_loop, args=(k,)) for k in range(n_rooms)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return sum(counts) / (time.perf_counter() - start)
+
+    for n in ROOM_COUNTS:
+        local = run(n, lambda k: VideoSensor()._analyze_frame)
+        results[f"rooms.analyze[rooms={n},mode=thread]"] = {"frames_per_second": local}
+
+        pool = VideoWorkerPool()
+        analyzers = [pool.register(f"room{k}", "auto") for k in range(n)]
+        if not pool.start():
+            continue
+        # Wait for the spawned workers to import and answer once
+        for a in analyzers:
+            while a.analyze(frames[0]) is None:
+                pass
+        pooled = run(n, lambda k: analyzers[k].analyze)
+        pool.stop()
+        results[f"rooms.analyze[rooms={n},mode=pool]"] = {
+            "frames_per_second": pooled,
+            "workers": len(set(a.worker for a in analyzers)),
+        }
+
+
+def bench_synthetic(results, min_time):
+    # Seeded scenario generators alone (one vectorized batch per call), and
+    # end to end through the real sensors with no pacing
+    audio_src = SyntheticAudioSource(SEED, realtime=False)
+    hop = AudioSensor().engine.hop
+    start = [0]
+
+    def render_audio():
+        audio_src.render(start[0], hop * AUDIO_BATCH_BLOCKS)
+        start[0] += hop * AUDIO_BATCH_BLOCKS
+
+    stats = measure(render_audio, min_time)
+    stats["realtime_x"] = (hop * AUDIO_BATCH_BLOCKS / SAMPLE_RATE) / stats["median"]
+    results[f"synthetic.render_audio[samples={hop * AUDIO_BATCH_BLOCKS}]"] = stats
+
+    sensor = AudioSensor(source=SyntheticAudioSource(SEED, realtime=False))
+    blocks = sensor.source.blocks(hop)
+
+    def audio_step():
+        sensor._compute_features(next(blocks)[1])
+
+    # Mean, not median: every AUDIO_BATCH_BLOCKS-th call renders a batch
+    stats = measure(audio_step, min_time)
+    stats["realtime_x"] = (hop / SAMPLE_RATE) / stats["mean"]
+    results[f"synthetic.audio_pipeline[hop={hop}]"] = stats
+
+    for width, height in RESOLUTIONS[:2]:
+        video_src = SyntheticVideoSource(SEED, width, height, realtime=False)
+        index = [0]
+
+        def render_video():
+            video_src.render((index[0] + np.arange(VIDEO_BATCH)) / video_src.fps)
+            index[0] += VIDEO_BATCH
+
+        stats = measure(render_video, min_time)
+        stats["frames_per_second"] = VIDEO_BATCH / stats["median"]
+        results[f"synthetic.render_video[{width}x{height},batch={VIDEO_BATCH}]"] = stats
+
+        sensor = VideoSensor(source=SyntheticVideoSource(SEED, width, height, realtime=False))
+        frames = sensor.source.frames()
+
+        def video_step():
+            sensor._analyze_frame(next(frames)[1])
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = measure(video_step, min_time)
+        stats["frames_per_second"] = 1.0 / stats["mean"]
+        results[f"synthetic.video_pipeline[{width}x{height}]"] = stats
+
+
+SUITES = {
+    "audio": bench_audio,
+    "video": bench_video,
+    "motion": bench_motion,
+    "decode": bench_decode,
+    "classifier": bench_classifier,
+    "training": bench_training,
+    "knn": bench_knn,
+    "status": bench_status,
+    "fanout": bench_fanout,
+    "rooms": bench_rooms,
+    "synthetic": bench_synthetic,
+}
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp": time.time(),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": SEED,
+    }
+
+
+def compare(current, baseline, threshold):
+    # Lower-is-better on median latency; returns regressed keys
+    regressions = []
+    for key, stats in current.items():
+        old = baseline.get(key)
+        if not old or "median" not in stats or "median" not in old:
+            continue
+        change = stats["median"] / old["median"] - 1.0
+        flag = "REGRESSION" if change > threshold else ""
+        print(f"{key:<55} {old['median'] * 1000:>10.3f} ms -> {stats['median'] * 1000:>10.3f} ms {change:>+8.1%} {flag}")
+        if flag:
+            regressions.append(key)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SensoryNet hot-path benchmarks")
+    parser.add_argument("--out", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--only", default="", help=f"Comma-separated subset of: {', '.join(SUITES)}")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Seconds per measurement")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative slowdown counted as a regression")
+    args = parser.parse_args()
+
+    selected = [s for s in args.only.split(",") if s] or list(SUITES)
+    results = {}
+    for name in selected:
+        print(f"Benchmark: {name}...", file=sys.stderr)
+        SUITES[name](results, args.min_time)
+
+    report = {"meta": metadata(), "results": results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Benchmark: Wrote {args.out}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Benchmark: {len(regressions)} regression(s) over {args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
@@ -0,0 +1,43 @@
+import cv2
+import numpy as np
+from app.capture import scan_jpeg
+
+
+def jpeg(width=64, height=48):
+    frame = (np.arange(width * height) % 251).astype(np.uint8).reshape(height, width)
+    return cv2.imencode(".jpg", frame)[1].tobytes()
+
+
+def test_finds_end_and_size():
+    data = jpeg()
+    buf = b"--frame\r\n\r\n" + data + b"\r\n--frame"
+    start = buf.find(b"\xff\xd8")
+    assert scan_jpeg(buf, start) == (start + len(data), 64, 48)
+
+
+def test_incomplete_jpeg():
+    data = jpeg()
+    end, width, height = scan_jpeg(data[:-2], 0)
+    assert end == -1
+    assert (width, height) == (64, 48)
+    # Headers cut short: size may be unknown yet
+    assert scan_jpeg(data[:10], 0)[0] == -1
+
+
+def test_skips_eoi_inside_header_segments():
+    data = jpeg()
+    # APP1 segment (like an EXIF thumbnail) whose payload holds an EOI
+    payload = b"Exif\x00\x00\xff\xd8\xff\xd9"
+    app1 = b"\xff\xe1" + (len(payload) + 2).to_bytes(2, "big") + payload
+    buf = data[:2] + app1 + data[2:]
+    assert scan_jpeg(buf, 0) == (len(buf), 64, 48)
+
+
+def test_search_from_resumes():
+    data = jpeg()
+    assert scan_jpeg(data, 0, search_from=len(data) - 2) == (len(data), 64, 48)
+
+
+def test_corrupt_frame_skips_soi():
+    buf = b"\xff\xd8\x00\x00\x00\x00\x00"
+    assert scan_jpeg(buf, 0) == (2, 0, 0)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from app.feature_log import DayLog, FeatureLog
+
+FIELDS = ["db", "brightness", "confidence"]
+# 2024-01-01T00:00:00Z
+DAY = 1704067200.0
+
+
+def logged(tmp_path, rows):
+    log = FeatureLog(str(tmp_path), fields=FIELDS)
+    for t, db, state in rows:
+        log.append(t, {"db": db}, {"brightness": 2 * db}, state, 1.0)
+    return log
+
+
+def test_rollups_match_raw_rows(tmp_path):
+    rng = np.random.default_rng(10)
+    times = DAY + np.sort(rng.uniform(0, 3 * 3600, 500))
+    dbs = rng.uniform(20, 80, 500)
+    states = rng.choice(["Quiet", "Noisy"], 500)
+    log = logged(tmp_path, zip(times, dbs, states))
+
+    for step in (1, 60, 600, 3600):
+        result = log.query(["db"], DAY, DAY + 3 * 3600, step, stats=("count", "mean", "min", "max", "std", "states"))
+        buckets = ((times - DAY) // step).astype(int)
+        assert result["count"] == np.bincount(buckets, minlength=len(result["t"])).tolist()
+        for b in np.unique(buckets):
+            selected = dbs[buckets == b].astype(np.float32).astype(np.float64)
+            assert result["series"]["db"]["mean"][b] == pytest.approx(selected.mean())
+            assert result["series"]["db"]["std"][b] == pytest.approx(selected.std(), abs=1e-6)
+            assert result["series"]["db"]["min"][b] == pytest.approx(selected.min())
+            assert result["series"]["db"]["max"][b] == pytest.approx(selected.max())
+            quiet = np.mean(states[buckets == b] == "Quiet")
+            assert result["states"]["Quiet"][b] == pytest.approx(quiet)
+    assert log.query(["db"], DAY, DAY + 3600, 3600)["resolution"] == "1h"
+
+
+def test_percentiles_stay_within_range(tmp_path):
+    rows = [(DAY + i, float(i % 60) + 20, "Quiet") for i in range(600)]
+    log = logged(tmp_path, rows)
+    result = log.query(["db"], DAY, DAY + 600, 60, stats=("p50", "min", "max"))
+    assert result["resolution"] == "1m"
+    for p50, low, high in zip(*(result["series"]["db"][s] for s in ("p50", "min", "max"))):
+        assert low <= p50 <= high
+        # 180 dB over 128 bins: about 1.4 dB per bin
+        assert p50 == pytest.approx(49.5, abs=2.0)
+
+
+def test_rotates_at_midnight_and_reads_back(tmp_path):
+    log = logged(tmp_path, [(DAY + 86400 - 1, 30.0, "Quiet"), (DAY + 86400 + 1, 50.0, "Noisy")])
+    log.close()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["2024-01-01", "2024-01-02"]
+
+    reader = FeatureLog(str(tmp_path), fields=FIELDS, writable=False)
+    result = reader.query(["db"], DAY, DAY + 2 * 86400, 86400)
+    assert result["count"] == [1, 1]
+    assert result["series"]["db"]["mean"] == [30.0, 50.0]
+
+    t, columns, state = DayLog(str(tmp_path / "2024-01-02"), DAY + 86400).raw(["db"])
+    assert t.tolist() == [DAY + 86400 + 1]
+    assert columns["db"].tolist() == [50.0]
+
+
+def test_query_validation(tmp_path):
+    log = logged(tmp_path, [(DAY, 30.0, "Quiet")])
+    with pytest.raises(ValueError):
+        log.query(["db"], DAY, DAY + 60, 30, stats=("p50",))
+    with pytest.raises(ValueError):
+        log.query(["db"], DAY, DAY + 60, 1, stats=("median",))
+    with pytest.raises(ValueError):
+        log.query(["nope"], DAY, DAY + 60, 1)
+    with pytest.raises(ValueError):
+        log.query(["db"], DAY, DAY + 60, 1.5)
@@ -0,0 +1,31 @@
+import pytest
+from app.governor import DEFAULT_POLICY, merge_policy
+
+
+def test_overrides_merge_per_mode():
+    policy = merge_policy(DEFAULT_POLICY, {"video_fps": {"idle": 0.2}, "stable_after": 5})
+    assert policy["video_fps"] == {"active": 5.0, "stable": 1.0, "idle": 0.2}
+    assert policy["stable_after"] == 5
+    # The base policy is copied, not modified
+    assert DEFAULT_POLICY["video_fps"]["idle"] == 0.5
+    assert merge_policy(DEFAULT_POLICY, None) == DEFAULT_POLICY
+
+
+@pytest.mark.parametrize("overrides", [
+    {"video_fps": {"idle": 0}},
+    {"video_fps": {"active": -1}},
+    {"video_fps": {"stable": "fast"}},
+    {"video_fps": {"stable": True}},
+    {"video_fps": 5},
+    {"audio_stride": {"idle": 0}},
+    {"audio_stride": {"active": None}},
+])
+def test_invalid_policies_are_rejected(overrides):
+    with pytest.raises(ValueError):
+        merge_policy(DEFAULT_POLICY, overrides)
+
+
+def test_missing_mode_is_rejected():
+    base = {"video_fps": {"active": 5.0}, "audio_stride": {"active": 1, "stable": 1, "idle": 1}}
+    with pytest.raises(ValueError, match="video_fps.stable"):
+        merge_policy(base, {})
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from app.history import STATS_BLOCK, FeatureHistory
+
+FIELDS = ["db", "brightness", "confidence"]
+
+
+def filled(capacity, n):
+    history = FeatureHistory(capacity, fields=FIELDS)
+    for i in range(n):
+        history.append(float(i), {"db": float(i)}, {"brightness": float(2 * i)}, "Quiet" if i % 2 else "Noisy", 0.5)
+    return history
+
+
+def test_query_buckets():
+    history = filled(100, 40)
+    result = history.query(window=20, points=4, fields=["db"])
+    # t >= 39 - 20 keeps samples 19..39: 21 samples over 4 buckets
+    assert result["t"][0] == 19.0
+    assert len(result["t"]) == 4
+    edges = np.linspace(0, 21, 5).astype(int)
+    samples = np.arange(19, 40, dtype=float)
+    for i, (a, b) in enumerate(zip(edges, edges[1:])):
+        assert result["series"]["db"]["mean"][i] == pytest.approx(samples[a:b].mean())
+        assert result["series"]["db"]["min"][i] == samples[a]
+        assert result["series"]["db"]["max"][i] == samples[b - 1]
+        assert result["state"][i] == ("Quiet" if (samples[b - 1] % 2) else "Noisy")
+    assert list(result["series"]) == ["db"]
+
+
+def test_query_across_wraparound():
+    history = filled(16, 50)
+    result = history.query(window=100, points=100)
+    # Only the last 16 samples survive, in order
+    assert result["t"] == list(np.arange(34, 50, dtype=float))
+    assert result["series"]["brightness"]["mean"] == list(np.arange(68, 100, 2, dtype=float))
+
+
+def test_query_empty_and_unknown_fields():
+    history = FeatureHistory(8, fields=FIELDS)
+    result = history.query(window=10, points=5, fields=["db", "nope"])
+    assert result == {"t": [], "state": [], "series": {"db": {"mean": [], "min": [], "max": []}}}
+
+
+def test_stats_after_eviction():
+    capacity = 2 * STATS_BLOCK
+    history = filled(capacity, 3 * STATS_BLOCK + 10)
+    stats = history.stats()
+    kept = np.arange(STATS_BLOCK + 10, 3 * STATS_BLOCK + 10, dtype=float)
+    assert stats["db"]["mean"] == pytest.approx(kept.mean())
+    assert stats["db"]["std"] == pytest.approx(kept.std(), rel=1e-4)
+    assert stats["db"]["max"] == kept.max()
+    # The block being overwritten restarted its min/max, so its older
+    # samples (up to one block) no longer count
+    assert kept.min() <= stats["db"]["min"] <= kept.min() + STATS_BLOCK
@@ -0,0 +1,73 @@
+import numpy as np
+from app.knn import KDTree, KNNClassifier
+from app.ml import AUDIO_KEYS, N_FEATURES, VIDEO_KEYS
+
+LABELS = ["Quiet", "Noisy", "Crowded"]
+
+
+def brute_force(classifier, X):
+    # Distance-weighted vote over the k nearest exemplars, no index
+    state = classifier.state
+    scaled_exemplars = (state.exemplars.astype(np.float64) - state.scaler_mean) / state.scaler_scale
+    scaled = (X - state.scaler_mean) / state.scaler_scale
+    labels = []
+    for row in scaled:
+        dist = np.sqrt(((scaled_exemplars - row) ** 2).sum(axis=1))
+        nearest = np.argsort(dist)[:classifier.k]
+        votes = np.zeros(len(state.labels))
+        np.add.at(votes, state.codes[nearest], 1.0 / (1.0 + dist[nearest]))
+        labels.append(state.labels[int(np.argmax(votes))])
+    return labels
+
+
+def training_data(seed, n):
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0, 100, (len(LABELS), N_FEATURES))
+    codes = rng.integers(len(LABELS), size=n)
+    X = centers[codes] + rng.normal(0, 15, (n, N_FEATURES))
+    return X, [LABELS[c] for c in codes]
+
+
+def test_kdtree_matches_brute_force():
+    rng = np.random.default_rng(4)
+    data = rng.normal(size=(3000, N_FEATURES))
+    tree = KDTree(data, leaf_size=32)
+    for x in rng.normal(size=(20, N_FEATURES)):
+        dist, idx = tree.query(x, 7)
+        expected = np.sort(np.sqrt(((data - x) ** 2).sum(axis=1)))[:7]
+        np.testing.assert_allclose(dist, expected)
+        np.testing.assert_allclose(np.sqrt(((data[idx] - x) ** 2).sum(axis=1)), expected)
+
+
+def test_predict_matches_brute_force():
+    X, labels = training_data(5, 2000)
+    classifier = KNNClassifier(load=False)
+    classifier.fit(X, labels)
+
+    queries, _ = training_data(6, 200)
+    predicted, confidences, _ = classifier.predict_batch(queries)
+    assert list(predicted) == brute_force(classifier, queries)
+    assert ((confidences > 0) & (confidences <= 1)).all()
+
+    row = queries[0]
+    single = classifier.predict(dict(zip(AUDIO_KEYS, row)), dict(zip(VIDEO_KEYS, row[len(AUDIO_KEYS):])))
+    assert single[0] == predicted[0]
+
+
+def test_pending_rows_are_searched():
+    X, labels = training_data(7, 1000)
+    classifier = KNNClassifier(load=False)
+    classifier.fit(X, labels)
+    extra, extra_labels = training_data(8, 100)
+    classifier.partial_fit(extra, extra_labels)
+    assert len(classifier.state.pending) == 100
+
+    queries, _ = training_data(9, 100)
+    # brute_force() only sees the indexed exemplars: fold pending in first
+    state = classifier.state
+    pending_raw = state.pending * state.scaler_scale + state.scaler_mean
+    reference = KNNClassifier(load=False)
+    reference.state = state._replace(
+        exemplars=np.vstack([state.exemplars, pending_raw]).astype(np.float32),
+        codes=np.concatenate([state.codes, state.pending_codes]))
+    assert list(classifier.predict_batch(queries)[0]) == brute_force(reference, queries)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from app.ml import N_FEATURES, ModelStats
+
+
+def test_chunked_updates_match_batch_fit():
+    rng = np.random.default_rng(2)
+    X = rng.normal(50, 20, (1000, N_FEATURES)) * rng.uniform(0.1, 100, N_FEATURES)
+    labels = rng.choice(["Quiet", "Noisy", "Crowded"], len(X))
+
+    batch = ModelStats()
+    batch.update(X, labels)
+    chunked = ModelStats()
+    bounds = [0, 1, 300, 301, 777, 1000]
+    for start, stop in zip(bounds, bounds[1:]):
+        chunked.update(X[start:stop], labels[start:stop])
+
+    assert chunked.count == batch.count == len(X)
+    np.testing.assert_allclose(chunked.mean, X.mean(axis=0), rtol=1e-10)
+    mean, scale = chunked.scaler()
+    np.testing.assert_allclose(mean, X.mean(axis=0), rtol=1e-10)
+    np.testing.assert_allclose(scale, X.std(axis=0), rtol=1e-10)
+
+    names, centroids = chunked.centroids()
+    for name, centroid in zip(names, centroids):
+        expected = (X[labels == name].mean(axis=0) - X.mean(axis=0)) / X.std(axis=0)
+        np.testing.assert_allclose(centroid, expected, rtol=1e-9, atol=1e-12)
+    assert sorted(names) == sorted(batch.centroids()[0])
+
+
+def test_arrays_round_trip():
+    rng = np.random.default_rng(3)
+    stats = ModelStats()
+    stats.update(rng.uniform(0, 1, (50, N_FEATURES)), ["a"] * 25 + ["b"] * 25)
+    restored = ModelStats.from_arrays(stats.to_arrays())
+    assert restored.count == stats.count
+    assert restored.labels == stats.labels
+    np.testing.assert_array_equal(restored.m2, stats.m2)
+    np.testing.assert_array_equal(restored.class_sums, stats.class_sums)
+
+
+def test_update_rejects_bad_shapes():
+    stats = ModelStats()
+    with pytest.raises(ValueError):
+        stats.update(np.zeros((3, N_FEATURES + 1)), ["a"] * 3)
+    with pytest.raises(ValueError):
+        stats.update(np.zeros((3, N_FEATURES)), ["a"] * 2)
@@ -0,0 +1,87 @@
+import json
+import numpy as np
+from app.protocol import DELTA, FIELDS, KEYFRAME, BinaryEncoder, decode_frame
+
+STATES = ["Quiet", "Noisy"]
+
+
+def payload(tick, values, state="Quiet"):
+    audio = {f: v for f, v in zip(FIELDS, values) if f not in ("brightness", "motion_magnitude", "motion_hotspots")}
+    video = {f: v for f, v in zip(FIELDS, values) if f in ("brightness", "motion_magnitude", "motion_hotspots")}
+    return {"state": state, "confidence": 0.5, "timestamp": 1000.0 + tick,
+            "features": {"audio": audio, "video": video}}
+
+
+def run(encoder, ticks):
+    # Feed (tick, values) pairs and decode what the client would see
+    schema = json.loads(encoder.schema())
+    decoded = None
+    frames = []
+    for tick, values in ticks:
+        for message in encoder.encode(payload(tick, values), {"tick": tick}):
+            if isinstance(message, bytes):
+                decoded = decode_frame(message, schema, decoded)
+                frames.append(decoded)
+    return frames
+
+
+def test_keyframe_then_deltas_round_trip():
+    rng = np.random.default_rng(1)
+    base = rng.uniform(0, 100, len(FIELDS)).astype(np.float32)
+    ticks = []
+    for tick in range(1, 8):
+        values = base.copy()
+        values[tick % len(FIELDS)] += tick
+        ticks.append((tick, values.tolist()))
+
+    frames = run(BinaryEncoder(states=STATES), ticks)
+    assert frames[0]["type"] == KEYFRAME
+    assert all(f["type"] == DELTA for f in frames[1:])
+    for frame, (tick, values) in zip(frames, ticks):
+        assert frame["seq"] == tick
+        assert frame["state"] == "Quiet"
+        assert frame["values"] == {f: float(np.float32(v)) for f, v in zip(FIELDS, values)}
+
+
+def test_unchanged_delta_has_empty_body():
+    encoder = BinaryEncoder(states=STATES)
+    values = [1.0] * len(FIELDS)
+    encoder.encode(payload(1, values), {"tick": 1})
+    frame = encoder.encode(payload(2, values), {"tick": 2})[-1]
+    decoded = decode_frame(frame, json.loads(encoder.schema()), {"values": {}})
+    assert decoded["type"] == DELTA
+    assert decoded["values"] == {}
+
+
+def test_keyframe_interval_counts_frames_sent():
+    # Rate-limited client that only sees odd ticks still gets a keyframe
+    # at least every keyframe_interval frames
+    encoder = BinaryEncoder(keyframe_interval=4)
+    types = []
+    for tick in range(1, 40, 2):
+        frame = encoder.encode(payload(tick, [float(tick)] * len(FIELDS)), {"tick": tick})[-1]
+        types.append(frame[0])
+    gaps = np.diff([i for i, t in enumerate(types) if t == KEYFRAME])
+    assert types[0] == KEYFRAME
+    assert gaps.max() <= 4
+
+
+def test_resync_sends_keyframe_and_state_again():
+    encoder = BinaryEncoder(states=STATES)
+    values = [2.0] * len(FIELDS)
+    encoder.encode(payload(1, values), {"tick": 1})
+    assert len(encoder.encode(payload(2, values), {"tick": 2})) == 1
+
+    encoder.resync()
+    messages = encoder.encode(payload(3, values), {"tick": 3})
+    assert json.loads(messages[0])["type"] == "recommendation"
+    decoded = decode_frame(messages[1], json.loads(encoder.schema()))
+    assert decoded["type"] == KEYFRAME
+    assert len(decoded["values"]) == len(FIELDS)
+
+
+def test_in_step_clients_share_frames():
+    first, second = BinaryEncoder(), BinaryEncoder()
+    values = [3.0] * len(FIELDS)
+    shared = {"tick": 1}
+    assert first.encode(payload(1, values), shared)[-1] is second.encode(payload(1, values), shared)[-1]
@@ -0,0 +1,36 @@
+import pytest
+from app import responses
+from app.responses import choose_encoding, etag, etag_matches
+
+
+def test_etag_weak_comparison():
+    tag = etag(42)
+    assert tag == 'W/"42"'
+    assert etag_matches('W/"42"', tag)
+    assert etag_matches('"42"', tag)
+    assert etag_matches('"1", W/"42"', tag)
+    assert etag_matches("*", tag)
+    assert not etag_matches('W/"4"', tag)
+    assert not etag_matches("", tag)
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("gzip", "gzip"),
+    ("gzip, deflate", "gzip"),
+    ("deflate", None),
+    ("", None),
+    ("gzip;q=0", None),
+    ("GZIP;q=0.5", "gzip"),
+    ("*", "gzip"),
+    ("*, gzip;q=0", None),
+    ("gzip;q=junk", None),
+])
+def test_choose_encoding_without_brotli(monkeypatch, accept, expected):
+    monkeypatch.setattr(responses, "brotli", None)
+    assert choose_encoding(accept) == expected
+
+
+def test_choose_encoding_prefers_brotli(monkeypatch):
+    monkeypatch.setattr(responses, "brotli", object())
+    assert choose_encoding("gzip, br") == "br"
+    assert choose_encoding("gzip, br;q=0") == "gzip"
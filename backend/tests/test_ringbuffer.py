@@ -0,0 +1,39 @@
+import numpy as np
+from app.ringbuffer import RingBuffer
+
+
+def test_write_read_wraps_around():
+    ring = RingBuffer(8)
+    out = np.zeros(3, dtype=np.float32)
+    value = 0
+    # Blocks of 3 through a ring of 8 cross the end on most passes
+    for _ in range(10):
+        block = np.arange(value, value + 3, dtype=np.float32)
+        value += 3
+        assert ring.write(block)
+        assert ring.read(out)
+        np.testing.assert_array_equal(out, block)
+    assert ring.available() == 0
+    assert ring.write_pos == ring.read_pos == 30
+
+
+def test_overrun_drops_incoming_block():
+    ring = RingBuffer(8)
+    assert ring.write(np.arange(6, dtype=np.float32))
+    assert not ring.write(np.arange(3, dtype=np.float32))
+    assert ring.overruns == 1
+    assert ring.dropped_samples == 3
+    assert ring.available() == 6
+
+    # Buffered samples are untouched by the dropped write
+    out = np.zeros(6, dtype=np.float32)
+    assert ring.read(out)
+    np.testing.assert_array_equal(out, np.arange(6))
+
+
+def test_read_needs_enough_samples():
+    ring = RingBuffer(8)
+    ring.write(np.ones(2, dtype=np.float32))
+    out = np.zeros(3, dtype=np.float32)
+    assert not ring.read(out)
+    assert ring.available() == 2
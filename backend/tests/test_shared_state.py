@@ -0,0 +1,71 @@
+import os
+from multiprocessing import resource_tracker
+import pytest
+from app.shared_state import HEADER, SeqlockReader, SeqlockWriter
+
+
+@pytest.fixture
+def region():
+    name = f"sensorynet_test_{os.getpid()}"
+    writer = SeqlockWriter(name, size=4096)
+    yield name, writer
+    # Readers in this process dropped the writer's tracker registration
+    # (Python < 3.13, see _attach); restore it so unlink() stays quiet
+    resource_tracker.register(writer.segment._name, "shared_memory")
+    writer.close()
+
+
+def test_reader_follows_writer(region):
+    name, writer = region
+    reader = SeqlockReader(name)
+    assert reader.read() is None
+
+    writer.publish(b'{"n": 1}')
+    assert reader.read() == {"n": 1}
+    seq = reader.seq
+    # Same seq: the cached document is returned without decoding again
+    assert reader.read() is reader.document
+    writer.publish(b'{"n": 2}')
+    assert reader.read() == {"n": 2}
+    assert reader.seq == seq + 2
+    reader.detach()
+
+
+def test_reader_keeps_document_during_write(region):
+    name, writer = region
+    reader = SeqlockReader(name)
+    writer.publish(b'{"n": 1}')
+    assert reader.read() == {"n": 1}
+
+    # Writer stopped mid-update: seq is odd, the body is half written
+    HEADER.pack_into(writer.buf, 0, writer.seq + 1, 0, 0)
+    writer.buf[HEADER.size:HEADER.size + 4] = b'{"n"'
+    assert reader.read() == {"n": 1}
+    assert reader.torn_reads > 0
+    reader.detach()
+
+
+def test_new_writer_resumes_from_even_seq(region):
+    name, writer = region
+    writer.publish(b"{}")
+    HEADER.pack_into(writer.buf, 0, writer.seq + 1, 0, 0)
+    resumed = SeqlockWriter(name, size=4096)
+    assert resumed.seq % 2 == 0
+    assert resumed.seq > writer.seq
+    resumed.close(unlink=False)
+
+
+def test_stale_reader_returns_nothing(region):
+    name, writer = region
+    reader = SeqlockReader(name)
+    writer.publish(b'{"n": 1}')
+    reader.read()
+    reader.mark_stale()
+    assert reader.read() is None
+    assert reader.segment is None
+
+
+def test_document_must_fit(region):
+    _, writer = region
+    with pytest.raises(ValueError):
+        writer.publish(b"x" * 5000)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from app.stft import DEFAULT_BANDS, StftEngine
+
+RATE = 44100
+N_FFT = 4096
+HOP = 1024
+
+
+def reference_features(frame, prev_mag):
+    # Straightforward numpy version of StftEngine.process()
+    win = np.hanning(N_FFT)
+    win = win / win.mean()
+    mag = np.abs(np.fft.rfft(frame * win))
+    freqs = np.fft.rfftfreq(N_FFT, 1.0 / RATE)
+    rms = np.sqrt(np.mean(frame ** 2))
+    features = {"rms": rms, "db": 20 * np.log10(rms)}
+    for name, (lo, hi) in DEFAULT_BANDS.items():
+        band = (freqs >= lo) & (freqs < hi if hi is not None else True)
+        features[name] = mag[band].sum()
+    features["spectral_centroid"] = np.sum(freqs * mag) / mag.sum()
+    power = np.cumsum(mag ** 2)
+    features["spectral_rolloff"] = freqs[np.searchsorted(power, 0.85 * power[-1])]
+    features["spectral_flux"] = np.sqrt(np.sum(np.maximum(mag - prev_mag, 0) ** 2)) / len(mag)
+    signs = np.signbit(frame)
+    features["zcr"] = np.count_nonzero(signs[1:] != signs[:-1]) / (N_FFT - 1)
+    return features, mag
+
+
+def test_features_match_reference():
+    rng = np.random.default_rng(0)
+    t = np.arange(N_FFT * 3) / RATE
+    signal = (0.3 * np.sin(2 * np.pi * 440 * t) + 0.05 * rng.standard_normal(len(t))).astype(np.float32)
+
+    engine = StftEngine(RATE, n_fft=N_FFT, hop=HOP)
+    frame = np.zeros(N_FFT, dtype=np.float32)
+    prev_mag = np.zeros(N_FFT // 2 + 1)
+    for start in range(0, len(signal), HOP):
+        block = signal[start:start + HOP]
+        features = engine.process(block)
+        frame = np.concatenate([frame[HOP:], block])
+        expected, prev_mag = reference_features(frame.astype(np.float64), prev_mag)
+
+    for name, value in expected.items():
+        assert features[name] == pytest.approx(value, rel=1e-3, abs=1e-6), name
+
+
+def test_silence_has_no_spectral_shape():
+    engine = StftEngine(RATE, n_fft=N_FFT, hop=HOP)
+    features = engine.process(np.zeros(HOP, dtype=np.float32))
+    assert features["db"] == -80
+    assert features["spectral_centroid"] == 0.0
+    assert features["spectral_rolloff"] == 0.0